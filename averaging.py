@@ -0,0 +1,55 @@
+"""Adaptive acquisition averaging.
+Measures the RMS voltage of a channel with the scope in averaging mode,
+doubling the number of averages until the estimated signal-to-noise ratio
+of the measurement reaches a target.
+
+Averaging reduces the power of the uncorrelated noise in proportion to the
+number of averages n, so that Vrms(n)^2 = S^2 + N^2/n. Comparing the readings
+for n and 2n averages gives estimates of the signal power S^2 and of the
+remaining noise power N^2/2n, and hence the SNR of the last reading."""
+
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+def averaged_vrms(scope, chan, count):
+    """Acquires 'count' averages and returns the RMS voltage of channel 'chan'."""
+    scope.write(':ACQuire:COUNt %d' % (count))
+    scope.write(':DIGitize CHAN%d' % (chan))
+    return float(scope.query(':MEAS:VRMS? CHAN%d' % (chan)))
+
+def snr_estimate(v1, v2):
+    """Estimated SNR (dB) of reading 'v2', taken with twice as many averages
+    as reading 'v1'."""
+    noise = v1**2 - v2**2
+    if (noise <= 0):
+        return inf
+    signal = max(2*v2**2 - v1**2, 0)
+    return 10*log10(signal/noise) if (signal > 0) else -inf
+
+def adaptive_vrms(scope, chan, snr_target=30, min_count=2, max_count=1024):
+    """Measures the RMS voltage of channel 'chan', doubling the average count
+    from 'min_count' until the SNR estimate reaches 'snr_target' (dB) or the
+    count reaches 'max_count'. Returns the voltage, the average count used
+    and the SNR estimate."""
+    scope.write(':ACQuire:TYPE AVERage')
+    count = min_count
+    v1 = averaged_vrms(scope, chan, count)
+    snr = -inf
+    while (count < max_count):
+        count *= 2
+        v2 = averaged_vrms(scope, chan, count)
+        snr = snr_estimate(v1, v2)
+        v1 = v2
+        if (snr >= snr_target):
+            break
+    return v1, count, snr
+
+def stop_averaging(scope):
+    """Returns the scope to normal, free-running acquisition."""
+    scope.write(':ACQuire:TYPE NORMal')
+    scope.write(':RUN')
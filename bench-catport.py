@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""CAT port discovery benchmark.
+Creates pseudo-terminals standing in for the serial ports of a bench: one
+transceiver, which only answers ID; at 'radio_baudrate', and other devices
+that never answer. Measures the time catport.py takes to find the
+transceiver probing one port at a time and all ports at once, and to
+re-validate the cached port on the next run. Linux and macOS only."""
+
+import os
+import pty
+import time
+import tempfile
+import termios
+import threading
+import catport
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+silent_ports = 7                # Devices that do not answer
+radio_baudrate = 38400          # Baud rate the transceiver is set to
+radio_delay = 5e-3              # Time the transceiver takes to answer (s)
+
+def standin(master, slave, answers):
+    """Answers ID; on the pseudo-terminal if 'answers' is True and the port
+    has been set to radio_baudrate, and sends noise if it has not."""
+    speed = getattr(termios, 'B%d' % (radio_baudrate))
+    pending = b''
+    while True:
+        try:
+            data = os.read(master, 256)
+        except OSError:
+            return
+        pending += data
+        while (answers and b';' in pending):
+            (cmd, pending) = pending.split(b';', 1)
+            time.sleep(radio_delay)
+            if (termios.tcgetattr(slave)[5] != speed):
+                os.write(master, b'\xf8\x80\x00\xfe')
+            elif (cmd.endswith(b'ID')):
+                os.write(master, catport.expected_id)
+
+def make_port(answers):
+    (master, slave) = pty.openpty()
+    threading.Thread(target=standin, args=(master, slave, answers), daemon=True).start()
+    return os.ttyname(slave)
+
+if __name__ == '__main__':
+    ports = [make_port(False) for k in range(silent_ports)]
+    ports.append(make_port(True))
+    catport.port_patterns = ports
+    catport.cache_file = os.path.join(tempfile.mkdtemp(), 'catport.json')
+    print('%d ports, transceiver on %s at %d baud' % (len(ports), ports[-1], radio_baudrate))
+
+    t0 = time.perf_counter()
+    found = catport.discover(ports, workers=1)
+    print('Search one port at a time: %.2f s, found %s' % (time.perf_counter() - t0, found))
+    t0 = time.perf_counter()
+    found = catport.find_port()
+    print('Search all ports at once:  %.2f s, found %s' % (time.perf_counter() - t0, found))
+    t0 = time.perf_counter()
+    found = catport.find_port()
+    print('Re-validate cached port:   %.3f s, found %s' % (time.perf_counter() - t0, found))
+    os.remove(catport.cache_file)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Live view latency benchmark.
+Measures the time added to each iteration of a sweep loop by the live view
+(with its viewer process running), compared to no display at all and to
+redrawing a plot inside the loop. Set MPLBACKEND to an interactive backend
+(e.g. TkAgg) to watch the live view while the benchmark runs; the default
+draws off-screen so it can run on a machine without a display."""
+
+import os
+import time
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+from liveview import LiveView
+
+N = 2000                        # Number of sweep points
+x = arange(N)/(N-1)*16e6 + 4e6
+y = 20*log10(1 + 0.5*sin(x/1e6))
+
+def run(update):
+    """Returns the time taken by 'update' at each point of a sweep."""
+    t = zeros(N, float)
+    for k in range(N):
+        t0 = time.perf_counter()
+        update(k)
+        t[k] = time.perf_counter() - t0
+    return t
+
+def report(name, t):
+    print('%-16s median %8.2f us, 99th percentile %8.2f us, max %8.2f us'
+          % (name, median(t)*1e6, percentile(t, 99)*1e6, max(t)*1e6))
+
+report('no display', run(lambda k: None))
+
+view = LiveView('Benchmark', x/1e6, ['Gain'], 'Frequency [MHz]', 'Gain [dB]')
+time.sleep(2)                   # Let the viewer start up
+report('live view', run(lambda k: view.update(k, y[k])))
+view.close()
+view.proc.wait()
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+fig, ax = plt.subplots()
+line, = ax.plot([], [])
+ax.set_xlim((x[0], x[-1]))
+ax.set_ylim((min(y), max(y)))
+def inline(k):
+    line.set_data(x[:k+1], y[:k+1])
+    fig.canvas.draw()
+report('plot in loop', run(inline))
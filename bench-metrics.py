@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Derived-quantity benchmark.
+Recalculates the derived quantities of every subsystem test for a batch of
+stored runs, in one vectorized pass over arrays of runs x points with
+metrics.py, and point by point for each run as the test scripts do during a
+sweep. A fraction of the readings are made invalid (zero, or the 9.9e37 the
+scope returns for a failed measurement) to exercise the masking. Prints the
+time taken both ways and checks that the results agree for the runs without
+invalid readings."""
+
+import time
+from numpy import *
+import metrics
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+runs = 2000                     # Stored runs of each test
+bad_fraction = 0.01             # Fraction of readings made invalid
+
+def readings(rng, shape, value):
+    x = value*(1 + 0.05*rng.standard_normal(shape))
+    bad = rng.random(shape) < bad_fraction
+    x[bad] = rng.choice([0, metrics.no_result], bad.sum())
+    return x
+
+def batch():
+    """Returns the derived quantities of every test for all runs at once."""
+    return {
+        'gain_dB': metrics.gain_dB(ampl_i, ampl_q, 50e-3),
+        'lpf_dB': metrics.normalized_dB(metrics.gain_dB(iq_i, iq_q, 50e-3)),
+        'balance_dB': metrics.balance_dB(iq_i, iq_q),
+        'rej_usb': metrics.rejection_dB(ampl_usb, ampl_lsb),
+        'freq_error': metrics.freq_error(meas_freq, freq_c),
+        'Prf': metrics.rf_power(Vout),
+        'THD': metrics.thd(A_dBV),
+        'eff': metrics.efficiency(metrics.harmonic_power(A_dBV[..., 0]), Pdc),
+    }
+
+def loop():
+    """Returns the same quantities calculated point by point for each run,
+    with the expressions the scripts used."""
+    out = {k: full(v.shape, nan) for (k, v) in reference.items()}
+    for r in range(runs):
+        for k in range(ampl_i.shape[1]):
+            out['gain_dB'][r, k] = 10*log10((ampl_i[r, k]/50e-3)**2 + (ampl_q[r, k]/50e-3)**2)
+        for k in range(iq_i.shape[1]):
+            out['lpf_dB'][r, k] = 10*log10((iq_i[r, k]/50e-3)**2 + (iq_q[r, k]/50e-3)**2)
+            out['balance_dB'][r, k] = 20*log10(iq_i[r, k]/iq_q[r, k])
+        out['lpf_dB'][r] -= max(out['lpf_dB'][r])
+        for k in range(ampl_usb.shape[1]):
+            out['rej_usb'][r, k] = 20*log10(ampl_usb[r, k]/ampl_lsb[r, k])
+        for k in range(meas_freq.shape[1]):
+            out['freq_error'][r, k] = meas_freq[r, k] - freq_c[k]
+        for k in range(Vout.shape[1]):
+            out['Prf'][r, k] = Vout[r, k]**2/50
+            A = 10**(A_dBV[r, k]/20)
+            out['THD'][r, k] = sqrt(nansum(A[1:]**2))/A[0]
+            out['eff'][r, k] = A[0]**2/50/Pdc[r, k]
+    return out
+
+if __name__ == '__main__':
+    rng = random.default_rng(1)
+    ampl_i = readings(rng, (runs, 51), 0.03)
+    ampl_q = readings(rng, (runs, 51), 0.03)
+    fm = logspace(3, 6, 61)
+    iq_i = readings(rng, (runs, 61), 0.05/sqrt(1 + (fm/3e4)**2))
+    iq_q = readings(rng, (runs, 61), 0.05/sqrt(1 + (fm/3e4)**2))
+    ampl_usb = readings(rng, (runs, 21), 0.5)
+    ampl_lsb = readings(rng, (runs, 21), 0.02)
+    freq_c = arange(17)/16*8e6 + 8e6
+    meas_freq = readings(rng, (runs, 17), freq_c)
+    Vout = readings(rng, (runs, 41), 10.0)
+    with errstate(divide='ignore'):
+        A_dBV = 20*log10(readings(rng, (runs, 41, 5), array([10, 0.3, 0.2, 0.1, 0.05])))
+    Pdc = readings(rng, (runs, 41), 4.0)
+
+    t0 = time.perf_counter()
+    reference = batch()
+    t_batch = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    with errstate(divide='ignore', invalid='ignore', over='ignore'):
+        looped = loop()
+    t_loop = time.perf_counter() - t0
+
+    points = sum([v.size for v in reference.values()])
+    print('%d runs, %d derived values: %.3f s vectorized, %.2f s point by point (%.0fx)'
+          % (runs, points, t_batch, t_loop, t_loop/t_batch))
+    for (name, v) in reference.items():
+        ok = isfinite(v)
+        clean_runs = ok.reshape(runs, -1).all(axis=1)
+        agree = allclose(v[clean_runs], looped[name][clean_runs], rtol=1e-9, atol=1e-9)
+        print('  %-11s %6.2f %% of values masked, %s' % (name, 100*(1 - ok.mean()),
+              'agrees' if (agree) else 'DISAGREES'))
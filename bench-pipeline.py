@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""Pipelined sweep benchmark.
+Measures the time per point of the sub-a-bpf.py and sub-f.py sweeps, run
+sequentially and pipelined (see pipeline.py), against simulated instruments
+that take a fixed time to handle each command. The sub-f.py sweep with its
+harmonics is compared with the original sweep, which only read the output
+voltage. All times are scaled down from the bench by
+the same factor so that the benchmark runs in a few seconds."""
+
+import time
+from numpy import *
+from pipeline import pipelined_sweep, digitize
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+N = 40                          # Number of sweep points
+scale = 0.1                     # Time scale of the benchmark relative to the bench
+settle_bpf = 0.5*scale          # Settling times of the sweeps (s)
+settle_f = 1*scale
+write_latency = 0.002*scale     # Time taken by a command (s)
+query_latency = 0.02*scale      # Time taken by a query (s)
+acquire_latency = 0.02*scale    # Time taken by a single acquisition (s)
+trace_latency = 0.05*scale      # Time taken to read the FFT trace (s)
+
+class FakeInstrument:
+    def write(self, cmd):
+        time.sleep(acquire_latency if cmd == ':DIGitize' else write_latency)
+
+    def query(self, cmd):
+        time.sleep(trace_latency if cmd == ':WAVeform:DATA?' else query_latency)
+        return '+1.0E+00'
+
+scope = FakeInstrument()
+fxngen = FakeInstrument()
+
+# sub-a-bpf.py: the LO comes from the scope's own generator
+def stim_async(k):
+    fxngen.write('SOUR1:FREQuency %e' % (k))
+    fxngen.write('SOUR2:FREQuency %e' % (k))
+
+def stim_sync(k):
+    scope.write(':WGEN:FREQ %e' % (k))
+
+def readback(k):
+    return (float(scope.query(':MEAS:VPP? CHAN1')),
+            float(scope.query(':MEAS:VPP? CHAN2')))
+
+def bpf_sequential():
+    for k in range(N):
+        stim_async(k)
+        stim_sync(k)
+        time.sleep(settle_bpf)
+        readback(k)
+
+def bpf_pipelined():
+    pipelined_sweep(N, settle_bpf, lambda k: digitize(scope), readback,
+                    stim_async, stim_sync, lambda k, r: None)
+
+# sub-f.py: all of the stimulus comes from the function generator, and the
+# harmonics are read from the FFT trace of each point
+def stim_f(k):
+    for cmd in range(6):
+        fxngen.write('SOUR1:FREQuency %e' % (k))
+
+def acquire_f(k):
+    digitize(scope)
+    scope.query(':MEAS:VRMS? CHAN1')
+    scope.write(':TIMebase:SCAL +1.0E-06')
+    digitize(scope)
+
+def readback_f(k):
+    scope.query(':WAVeform:PREamble?')
+    scope.query(':WAVeform:DATA?')
+    scope.write(':TIMebase:SCAL +5.0E-08')
+
+def f_original():
+    for k in range(N):
+        stim_f(k)
+        time.sleep(settle_f)
+        scope.query(':MEAS:VRMS? CHAN1')
+
+def f_sequential():
+    for k in range(N):
+        stim_f(k)
+        time.sleep(settle_f)
+        scope.query(':MEAS:VRMS? CHAN1')
+        scope.write(':TIMebase:SCAL +1.0E-06')
+        readback_f(k)
+
+def f_pipelined():
+    pipelined_sweep(N, settle_f, acquire_f, readback_f, stim_f,
+                    analyze=lambda k, r: None)
+
+for (name, sweep) in (('sub-a-bpf sequential', bpf_sequential),
+                      ('sub-a-bpf pipelined', bpf_pipelined),
+                      ('sub-f original', f_original),
+                      ('sub-f sequential', f_sequential),
+                      ('sub-f pipelined', f_pipelined)):
+    t0 = time.perf_counter()
+    sweep()
+    t = (time.perf_counter() - t0)/N/scale
+    print('%-20s %.0f ms per point on the bench' % (name, t*1e3))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""Session recovery benchmark.
+Runs a sweep against local TCP stand-ins for the function generator and the
+oscilloscope that inject faults: a dropped connection, a stalled instrument
+(which makes the request time out) or a reboot (a dropped connection, the
+instrument unreachable for 'down_time' and its settings lost). The sweep is
+run without faults and then with them, plain and pipelined, and the number
+of faults, the time lost per fault and the number of points measured wrongly
+(which would show a setup that was not restored) are printed."""
+
+import socket
+import threading
+import time
+from numpy import *
+import bench
+from bench import Instrument
+from sweep import Sweep, Commands, Query, Digitize
+import planner
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+N = 200                         # Points in the sweep
+fault_rate = 0.01               # Probability of a fault at each request
+down_time = 1.0                 # Time the instruments are unreachable after a reboot (s)
+timeout = 300                   # Instrument timeout (ms)
+
+fxngen_setup = ['SOUR1:FUNCtion SIN', 'SOUR1:VOLTage %e' % (2.0)]
+scope_setup = [':CHANnel1:SCALe %e' % (0.5)]
+
+class Standin:
+    """Function generator and oscilloscope, with the generator output on
+    channel 1 of the scope through a low-pass filter."""
+
+    def __init__(self):
+        self.faults = {'drop': 0, 'stall': 0, 'reboot': 0}
+        self.rate = 0
+        self.rng = random.default_rng(1)
+        self.state = {}
+        self.t_up = {}
+        self.ports = {}
+        for name in ('fxngen', 'scope'):
+            self.reboot(name)
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.bind(('127.0.0.1', 0))
+            server.listen(4)
+            self.ports[name] = server.getsockname()[1]
+            threading.Thread(target=self.accept, args=(server, name), daemon=True).start()
+
+    def reboot(self, name):
+        """Puts instrument 'name' back in its power-on state."""
+        if (name == 'fxngen'):
+            self.state[name] = {'SOUR1:VOLTage': 0.1, 'SOUR1:FREQuency': 1e3}
+        else:
+            self.state[name] = {'CHANnel1:SCALe': 0, 'captured': nan}
+        self.t_up[name] = 0
+
+    def accept(self, server, name):
+        while True:
+            conn, addr = server.accept()
+            if (time.monotonic() < self.t_up[name]):
+                conn.close()
+            else:
+                threading.Thread(target=self.serve, args=(conn, name), daemon=True).start()
+
+    def fault(self, name):
+        if (self.rng.random() >= self.rate):
+            return None
+        fault = ['drop', 'stall', 'reboot'][self.rng.integers(3)]
+        self.faults[fault] += 1
+        if (fault == 'reboot'):
+            self.reboot(name)
+            self.t_up[name] = time.monotonic() + down_time
+        return fault
+
+    def answer(self, name, cmd):
+        state = self.state[name]
+        header, _, value = cmd.lstrip(':').partition(' ')
+        if (value):
+            state[header] = float(value) if (value[0] in '+-.0123456789') else value
+        elif (header == '*IDN?'):
+            return 'Stand-in,BENCH-RECOVERY,0,1.0'
+        elif (header == '*OPC?'):
+            return '1'
+        elif (header == 'DIGitize'):
+            f = self.state['fxngen']['SOUR1:FREQuency']
+            v = self.state['fxngen']['SOUR1:VOLTage']/sqrt(1 + (f/1e6)**2)
+            # The capture is clipped unless the channel scale has been set up
+            state['captured'] = v if (state['CHANnel1:SCALe'] > 0) else 9.9e37
+        elif (header == 'MEASure:VAMPlitude?'):
+            return '%.9e' % (state['captured'])
+        return None
+
+    def serve(self, conn, name):
+        pending = b''
+        with conn:
+            while True:
+                try:
+                    data = conn.recv(65536)
+                except OSError:
+                    return
+                if (not data):
+                    return
+                lines = (pending + data).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    fault = self.fault(name)
+                    if (fault == 'stall'):
+                        time.sleep(2*timeout/1000)
+                        return
+                    if (fault is not None):
+                        return
+                    for cmd in line.decode().split(';'):
+                        r = self.answer(name, cmd.strip())
+                        if (r is not None):
+                            conn.sendall(r.encode() + b'\n')
+
+def run(standin, pipelined, rate):
+    """Runs the sweep and returns the time taken and the points measured wrongly."""
+    standin.rate = 0
+    standin.reboot('fxngen')
+    standin.reboot('scope')
+    fxngen = Instrument('fxngen', 'TCPIP0::127.0.0.1::%d::SOCKET' % (standin.ports['fxngen']),
+                        'function generator', timeout)
+    scope = Instrument('scope', 'TCPIP0::127.0.0.1::%d::SOCKET' % (standin.ports['scope']),
+                       'oscilloscope', timeout)
+    for (inst, setup) in ((fxngen, fxngen_setup), (scope, scope_setup)):
+        for cmd in setup:
+            inst.write(cmd)
+        inst.baseline(lambda inst=inst, setup=setup: [inst.write(cmd) for cmd in setup])
+    freq = linspace(1e5, 1e7, N)
+    sweep = Sweep(None, freq,
+                  stimulus=[Commands(fxngen, 'SOUR1:FREQuency %e')],
+                  measure=[Query(scope, ':MEASure:VAMPlitude?', 'V')],
+                  acquire=Digitize(scope),
+                  pipelined=pipelined)
+    standin.rate = rate
+    t0 = time.perf_counter()
+    sweep.run()
+    t = time.perf_counter() - t0
+    standin.rate = 0
+    fxngen.close()
+    scope.close()
+    expected = 2.0/sqrt(1 + (freq/1e6)**2)
+    return t, sum(abs(sweep['V'] - expected) > 1e-6*expected)
+
+if __name__ == '__main__':
+    standin = Standin()
+    bench.reconnect_tries = 8
+    planner.enabled = False         # Timing the stand-ins, with faults, means nothing
+    results = []
+    for pipelined in (False, True):
+        mode = 'pipelined' if (pipelined) else 'plain'
+        t_clean, wrong_clean = run(standin, pipelined, 0)
+        faults = dict(standin.faults)
+        t, wrong = run(standin, pipelined, fault_rate)
+        n = {f: standin.faults[f] - faults[f] for f in faults}
+        total = n['drop'] + n['stall'] + n['reboot']
+        results.append('%-9s %d points in %.2f s without faults, %.2f s with %d faults '
+                       '(%d drops, %d stalls, %d reboots): %.2f s lost per fault, %d points wrong'
+                       % (mode, N, t_clean, t, total, n['drop'], n['stall'], n['reboot'],
+                          (t - t_clean)/total if (total) else 0, wrong + wrong_clean))
+    print()
+    for line in results:
+        print(line)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Raw-socket transport benchmark.
+Compares rawsocket.py with pyvisa on a local TCP stand-in for an instrument
+on a SOCKET resource: the median latency of a short query, and the time to
+send a setup burst (the function generator setup of sub-f.py followed by
+*OPC?) together with the number of packets the stand-in received for it.
+The stand-in takes 'packet_cost' seconds to handle each packet it receives,
+as the instruments do. Requires a VISA backend that can open TCPIP SOCKET
+resources (e.g. pyvisa-py)."""
+
+import socket
+import threading
+import time
+from numpy import *
+import rawsocket
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+queries = 500                   # Queries timed in each mode
+bursts = 50                     # Setup bursts timed in each mode
+packet_cost = 200e-6            # Time the stand-in takes per packet (s)
+
+setup = [
+    'OUTPUT1:LOAD INF',
+    'OUTPUT2:LOAD INF',
+    'UNIT:ANGL DEG',
+    'SOUR1:FUNCtion SIN',
+    'SOUR1:FREQuency %e' % (14e6),
+    'SOUR1:VOLTage %e' % (1.0),
+    'SOUR1:VOLTage:OFFSet +0.0',
+    'SOUR1:PHASe:SYNC',
+    'SOUR1:PHASe +0.0',
+    'SOUR2:FUNCtion SIN',
+    'SOUR2:FREQuency %e' % (14e6),
+    'SOUR2:VOLTage %e' % (1.0),
+    'SOUR2:VOLTage:OFFSet +0.0',
+    'SOUR2:PHASe:SYNC',
+    'OUTPut2:POL INV',
+]
+
+packets = 0                     # Packets received by the stand-in
+
+def standin(server):
+    """Answers *IDN?, *OPC? and SOUR1:FREQ? and accepts any other command."""
+    global packets
+    while True:
+        conn, addr = server.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        pending = b''
+        while True:
+            try:
+                data = conn.recv(65536)
+            except OSError:
+                break
+            if (not data):
+                break
+            packets += 1
+            time.sleep(packet_cost)
+            lines = (pending + data).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                if (line == b'*IDN?'):
+                    conn.sendall(b'Stand-in,BENCH-SOCKET,0,1.0\n')
+                elif (line == b'*OPC?'):
+                    conn.sendall(b'1\n')
+                elif (line == b'SOUR1:FREQ?'):
+                    conn.sendall(b'+1.40000000000000E+07\n')
+        conn.close()
+
+def run(name, inst):
+    """Times the queries and bursts on 'inst' and prints the results."""
+    global packets
+    inst.query('*IDN?')
+    t = zeros(queries)
+    for k in range(queries):
+        t0 = time.perf_counter()
+        inst.query('SOUR1:FREQ?')
+        t[k] = time.perf_counter() - t0
+    tb = zeros(bursts)
+    packets = 0
+    for k in range(bursts):
+        t0 = time.perf_counter()
+        for cmd in setup:
+            inst.write(cmd)
+        inst.query('*OPC?')
+        tb[k] = time.perf_counter() - t0
+    print('%-10s query %6.3f ms, setup burst %6.3f ms in %4.1f packets'
+          % (name, median(t)*1e3, median(tb)*1e3, packets/bursts), flush=True)
+    inst.close()
+
+if __name__ == '__main__':
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    port = server.getsockname()[1]
+    threading.Thread(target=standin, args=(server,), daemon=True).start()
+
+    import pyvisa
+    inst = pyvisa.ResourceManager('@py').open_resource('TCPIP0::127.0.0.1::%d::SOCKET' % (port))
+    inst.write_termination = '\n'
+    inst.read_termination = '\n'
+    run('pyvisa', inst)
+    run('rawsocket', rawsocket.SocketResource('127.0.0.1', port))
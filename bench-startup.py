@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Start-up time benchmark.
+Measures the time from launching a Python process to the arrival of its
+first SCPI command at a local TCP stand-in for a 5025 socket instrument,
+for the lazy start-up of bench.py and for the original script preamble
+(star imports of numpy and matplotlib.pyplot, then pyvisa). Requires a VISA
+backend that can open TCPIP SOCKET resources (e.g. pyvisa-py)."""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+runs = 5                        # Number of runs of each start-up mode
+
+lazy = """
+from bench import Instrument
+import bench
+bench.report_startup = True
+from numpy import *
+inst = Instrument('standin', 'TCPIP0::127.0.0.1::%d::SOCKET')
+inst.write('*RST')
+"""
+
+eager = """
+import pyvisa
+from numpy import *
+from matplotlib.pyplot import *
+rm = pyvisa.ResourceManager()
+inst = rm.open_resource('TCPIP0::127.0.0.1::%d::SOCKET')
+inst.write_termination = '\\n'
+inst.read_termination = '\\n'
+print(inst.query('*IDN?'))
+"""
+
+def standin(server, t_first):
+    """Answers *IDN? on each connection and records the time at which the
+    first bytes of each connection arrive."""
+    while True:
+        conn, addr = server.accept()
+        f = conn.makefile('rwb')
+        first = True
+        for line in f:
+            if (first):
+                t_first.append(time.perf_counter())
+                first = False
+            if (line.strip() == b'*IDN?'):
+                f.write(b'Stand-in,BENCH-STARTUP,0,1.0\n')
+                f.flush()
+        conn.close()
+
+server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+server.bind(('127.0.0.1', 0))
+server.listen(1)
+port = server.getsockname()[1]
+t_first = []
+threading.Thread(target=standin, args=(server, t_first), daemon=True).start()
+
+for (mode, code) in (('lazy', lazy), ('eager', eager)):
+    t = zeros(runs, float)
+    for k in range(runs):
+        n = len(t_first)
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', code % (port)],
+                             capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        if (len(t_first) == n):
+            print(out.stderr)
+            sys.exit('The %s start-up did not reach the stand-in.' % (mode))
+        t[k] = t_first[n] - t0
+        if (mode == 'lazy' and k == runs-1):
+            print(out.stdout)
+    print('%-5s time to first SCPI command: median %.3f s, min %.3f s, max %.3f s'
+          % (mode, median(t), min(t), max(t)))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Two-tone analysis benchmark.
+Synthesizes captures of a weakly nonlinear amplifier (y = a1 x + a3 x^3 +
+a5 x^5) driven by two tones at several levels, with noise and 8-bit
+quantization as from the scope, and the tones off the FFT bin centres.
+Checks the fundamentals, IM3 products and intercept point found by
+twotone.py and metrics.py against their exact values, and times the
+analysis of all captures at once against a loop over the captures and
+products."""
+
+import time
+from numpy import *
+import twotone
+from metrics import tone_power_dBm, intercept_dBm
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+a1, a3, a5 = 10, -40, 20        # Amplifier coefficients
+f1, f2 = 13.95e6 + 1234, 14.05e6 + 1234
+fs = 500e6                      # Sample rate
+points = 100000                 # Points in each capture
+levels = array([0.01, 0.02, 0.04, 0.08]) # Peak amplitude of each tone (V)
+repeat = 20                     # Times each analysis is timed
+
+def captures(rng):
+    t = arange(points)/fs
+    x = levels[:, newaxis]*(cos(2*pi*f1*t) + cos(2*pi*f2*t + 1))
+    y = a1*x + a3*x**3 + a5*x**5
+    y += 1e-3*rng.standard_normal(y.shape)
+    full_scale = 1.2*abs(y).max(axis=-1, keepdims=True)
+    return rint(y/full_scale*127)*full_scale/127
+
+def loop(v, dt):
+    """Finds each product of each capture in turn."""
+    A = zeros((len(v), 6))
+    for i in range(len(v)):
+        (S, df) = twotone.spectrum(v[i], dt)
+        for (j, f) in enumerate(twotone.products(f1, f2)):
+            (a, fp) = twotone.peaks(S, df, [f])
+            A[i, j] = a[0]
+    return A
+
+if __name__ == '__main__':
+    rng = random.default_rng(1)
+    v = captures(rng)
+    dt = 1/fs
+
+    t0 = time.perf_counter()
+    for k in range(repeat):
+        (A, f) = twotone.analyze(v, dt, f1, f2)
+    t_batch = (time.perf_counter() - t0)/repeat
+    t0 = time.perf_counter()
+    for k in range(repeat):
+        A_loop = loop(v, dt)
+    t_loop = (time.perf_counter() - t0)/repeat
+    print('%d captures of %d points: %.1f ms at once, %.1f ms in a loop (results %s)'
+          % (len(v), points, t_batch*1e3, t_loop*1e3,
+             'agree' if (allclose(A, A_loop)) else 'DISAGREE'))
+
+    # Exact amplitudes of the fundamentals and IM3 (to third order)
+    fund = a1*levels + 9/4*a3*levels**3 + 25/4*a5*levels**5
+    im3 = abs(3/4*a3*levels**3 + 25/8*a5*levels**5)
+    print('Level   fund error  IM3 error  freq error')
+    for k in range(len(levels)):
+        print('%5.3f V %8.3f dB %8.3f dB %8.1f Hz'
+              % (levels[k], 20*log10(A[k, :2].mean()/fund[k]),
+                 20*log10(A[k, 2:4].mean()/im3[k]), abs(f[k, :2] - [f1, f2]).max()))
+
+    Pin = tone_power_dBm(levels)
+    (iip3, oip3) = intercept_dBm(Pin, tone_power_dBm(A[:, :2].mean(axis=-1)),
+                                 tone_power_dBm(A[:, 2:4].max(axis=-1)))
+    exact = tone_power_dBm(sqrt(4/3*abs(a1/a3)))
+    print('IIP3 from %d captures: %.2f dBm (exact %.2f dBm), OIP3 %.2f dBm'
+          % (len(levels), iip3, exact, oip3))
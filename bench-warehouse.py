@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""Results warehouse benchmark.
+Generates a corpus of synthetic runs of every subsystem test, laid out as
+<bench>/<board>/<date>/ directories, and measures the time to ingest it into
+the warehouse (with one worker process and with a pool) and to answer a
+query and compute aggregate statistics across the whole corpus. The query is
+also answered the way a hand-written script would, by reading every
+demod.txt file, for comparison."""
+
+import os
+import time
+import shutil
+import tempfile
+from numpy import *
+import warehouse
+from render import save_params
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+benches = 20                    # Benches in the lab
+boards = 25                     # Boards tested on each bench
+dates = 4                       # Test sessions of each board
+
+def make_run(d, rng):
+    """Writes the data files of one run of every test to directory 'd'."""
+    os.makedirs(d)
+    def noisy(x):
+        return x*(1 + 0.05*rng.standard_normal(shape(x)))
+    freq = arange(51)/50*16e6 + 4e6
+    savetxt(os.path.join(d, 'bpf.txt'), (freq, noisy(0.03 + 0*freq), noisy(0.03 + 0*freq)))
+    save_params(os.path.join(d, 'bpf.txt'), stim_ampl=50e-3)
+    fm = logspace(3, 6, 61)
+    H = 1/sqrt(1 + (fm/3e4)**2)
+    savetxt(os.path.join(d, 'iq.txt'), (fm, noisy(0.05*H), noisy(0.05*H), noisy(90 + 0*fm)))
+    freq = arange(21)*300 + 100
+    rej = 10**(rng.uniform(15, 40)/20)
+    savetxt(os.path.join(d, 'demod.txt'), (freq, noisy(0.5/rej + 0*freq), noisy(0.5 + 0*freq)))
+    freq = arange(17)/16*8e6 + 8e6
+    savetxt(os.path.join(d, 'freq.txt'), (freq, freq + rng.normal(0, 50, 17),
+                                          freq + rng.normal(0, 50, 17), noisy(90 + 0*freq)))
+    freq = arange(40)*100 + 100
+    savetxt(os.path.join(d, 'mod_iq.txt'), (freq, noisy(0.4 + 0*freq), noisy(0.4 + 0*freq),
+                                            noisy(90 + 0*freq)))
+    freq = arange(41)/40*14e6 + 4e6
+    savetxt(os.path.join(d, 'pout.txt'), (freq, noisy(2 + 0*freq)))
+    save_params(os.path.join(d, 'pout.txt'), drive_amplitude=1.0)
+
+def demod_loop(root):
+    """Answers the query by reading every demod.txt file in turn."""
+    found = []
+    for (d, dirs, files) in os.walk(root):
+        if ('demod.txt' in files):
+            freq, ampl_lsb, ampl_usb = loadtxt(os.path.join(d, 'demod.txt'))
+            k = argmin(abs(freq - 5e3))
+            if (20*log10(ampl_usb[k]/ampl_lsb[k]) < 20):
+                found.append(d)
+    return found
+
+if __name__ == '__main__':
+    root = tempfile.mkdtemp()
+    try:
+        corpus = os.path.join(root, 'runs')
+        store = os.path.join(root, 'warehouse')
+        rng = random.default_rng(1)
+        print('Writing %d runs of each test...' % (benches*boards*dates), flush=True)
+        for b in range(benches):
+            for k in range(boards):
+                for t in range(dates):
+                    make_run(os.path.join(corpus, 'bench%02d' % (b+1), 'board%03d' % (b*boards + k + 1),
+                                          '2025-%02d-%02d' % (t+1, 10)), rng)
+        warehouse.path_pattern = r'(?P<bench>[^/]+)/(?P<board>[^/]+)/(?P<date>[-0-9]+)'
+
+        for workers in (1, None):
+            t0 = time.perf_counter()
+            n = warehouse.ingest([corpus], store, workers)
+            print('Ingest with %-8s %6d files in %6.2f s'
+                  % ('1 worker' if (workers == 1) else '%d workers' % (os.cpu_count()), n,
+                     time.perf_counter() - t0))
+
+        t0 = time.perf_counter()
+        ws = warehouse.Warehouse(store)
+        run, rej = ws.at('rej_usb', 5e3, subsystem='sub-b')
+        boards_failed = {ws.runs[k]['board'] for k in run[rej < 20]}
+        t_query = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        groups, count, mean, std, vmin, vmax = ws.stats('gain_dB', by='board')
+        t_stats = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        found = demod_loop(corpus)
+        t_loop = time.perf_counter() - t0
+        print('Query "rej_usb < 20 dB at 5 kHz": %d runs, %d boards in %.3f s (%d runs in %.2f s reading each file)'
+              % (len(run[rej < 20]), len(boards_failed), t_query, len(found), t_loop))
+        print('Statistics of gain_dB for %d boards (%d values) in %.3f s'
+              % (len(groups), count.sum(), t_stats))
+    finally:
+        shutil.rmtree(root)
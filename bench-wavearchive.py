@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""Waveform archive benchmark.
+Generates synthetic deep-memory scope captures (a two-tone RF signal at 36
+samples per cycle and an audio tone, with noise, as BYTE codes and as WORD
+codes whose low bits are noise) and measures, for each codec with and without delta encoding, the compression
+ratio and write throughput of wavearchive.py. Then fills an archive with
+the captures of several runs and measures the latency of reading one whole
+record and a short window of one record, against decompressing the whole
+archive as a single compressed file would require. Every read is checked
+against the codes written."""
+
+import os
+import time
+import shutil
+import tempfile
+from numpy import *
+import wavearchive
+from waveform import Preamble
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+points = 2000000                # Points per capture
+fs = 500e6                      # Sample rate
+runs = 3                        # Runs in the archive
+run_points = 4                  # Points of each run
+window = 10000                  # Samples in a window read
+repeat = 20                     # Times each read is timed
+
+def capture(rng, fmt, signal='RF'):
+    """Returns the codes of a synthetic capture of 'signal' in format 'fmt'."""
+    t = arange(points)/fs
+    if (signal == 'RF'):
+        v = 0.4*(cos(2*pi*13.95e6*t + rng.uniform(0, 2*pi)) + cos(2*pi*14.05e6*t))
+    else:
+        v = 0.8*cos(2*pi*1e3*t*fs/2e6 + rng.uniform(0, 2*pi))
+    v += 0.004*rng.standard_normal(points)
+    if (fmt == 'BYTE'):
+        return clip(rint(128 + v/2*127), 0, 255).astype(uint8)
+    return clip(rint(32768 + v/2*32767), 0, 65535).astype(uint16)
+
+def preamble(fmt):
+    return Preamble(0 if (fmt == 'BYTE') else 1, 0, points, 1, 1/fs, 0, 0,
+                    2/(255 if (fmt == 'BYTE') else 65535), 0, 128 if (fmt == 'BYTE') else 32768)
+
+if __name__ == '__main__':
+    rng = random.default_rng(1)
+    root = tempfile.mkdtemp()
+    try:
+        print('Compression of a %d-point capture:' % (points))
+        for (signal, fmt) in [(s, f) for s in ('RF', 'audio') for f in ('BYTE', 'WORD')]:
+            raw = capture(rng, fmt, signal)
+            for codec in ('none', 'zlib', 'bz2', 'lzma'):
+                for delta in (False, True):
+                    if (codec == 'none' and delta):
+                        continue
+                    wavearchive.codec = codec
+                    path = os.path.join(root, 'ratio.m3w')
+                    t0 = time.perf_counter()
+                    with wavearchive.Archive(path, 'w') as archive:
+                        archive.write('run', 0, 1, raw, preamble(fmt), delta)
+                    t_write = time.perf_counter() - t0
+                    with wavearchive.Archive(path) as archive:
+                        ok = array_equal(archive.read('run', 0, 1)[0], raw)
+                    print('  %-5s %s %-5s %-8s ratio %5.2f, write %6.1f MB/s%s'
+                          % (signal, fmt, codec, 'delta' if (delta) else 'no delta',
+                             raw.nbytes/os.path.getsize(path), raw.nbytes/t_write/1e6,
+                             '' if (ok) else ', WRONG'))
+
+        wavearchive.codec = 'zlib'
+        path = os.path.join(root, 'waveforms.m3w')
+        kept = {}
+        t0 = time.perf_counter()
+        for r in range(runs):
+            with wavearchive.Archive(path, 'a') as archive:
+                for k in range(run_points):
+                    for chan in (1, 2):
+                        kept[('run%d' % (r), k, chan)] = raw = capture(rng, 'WORD')
+                        archive.write('run%d' % (r), k, chan, raw, preamble('WORD'))
+        t_fill = time.perf_counter() - t0
+        size = os.path.getsize(path)
+        print('Archive of %d WORD records: %.1f MB (%.1f MB raw), written in %.1f s'
+              % (len(kept), size/1e6, len(kept)*2*points/1e6, t_fill))
+
+        keys = list(kept)
+        with wavearchive.Archive(path) as archive:
+            t0 = time.perf_counter()
+            for i in range(repeat):
+                key = keys[rng.integers(len(keys))]
+                ok = array_equal(archive.read(*key)[0], kept[key])
+            t_record = (time.perf_counter() - t0)/repeat
+            t0 = time.perf_counter()
+            for i in range(repeat):
+                key = keys[rng.integers(len(keys))]
+                start = int(rng.integers(points - window))
+                ok &= array_equal(archive.read(*key, start, start + window)[0],
+                                  kept[key][start:start + window])
+            t_window = (time.perf_counter() - t0)/repeat
+            t0 = time.perf_counter()
+            for key in keys:
+                archive.read(*key)
+            t_all = time.perf_counter() - t0
+        print('Read one record: %.1f ms, a %d-sample window: %.2f ms, every record: %.0f ms%s'
+              % (t_record*1e3, window, t_window*1e3, t_all*1e3, '' if (ok) else ' (WRONG)'))
+
+        # An archive whose index was never written is rebuilt from the records
+        with open(path, 'r+b') as f:
+            f.truncate(f.seek(0, os.SEEK_END) - wavearchive.footer.size)
+        t0 = time.perf_counter()
+        with wavearchive.Archive(path) as archive:
+            ok = array_equal(archive.read(*keys[-1])[0], kept[keys[-1]])
+        print('Rebuilt the index in %.1f ms%s' % ((time.perf_counter() - t0)*1e3,
+                                                  '' if (ok) else ' (WRONG)'))
+    finally:
+        shutil.rmtree(root)
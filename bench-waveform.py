@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""Waveform transfer benchmark.
+Measures the throughput (MB/s) and peak memory use (RSS) of reading a deep
+capture with waveform.py, in BYTE and WORD formats, held in memory and
+spilled to memory-mapped files, compared with reading the same block with
+query_binary_values() into a list. The capture is served by a local TCP
+stand-in for the scope, opened with the transport bench.py selects for
+SOCKET resources, and each mode is run in a separate process so that its
+peak RSS can be measured. With bench.raw_sockets False, requires a VISA
+backend that can open TCPIP SOCKET resources (e.g. pyvisa-py); the RSS is
+only reported on systems with the resource module (Linux and macOS)."""
+
+import os
+import sys
+import socket
+import subprocess
+import threading
+import time
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+points = 8000000                # Points per capture
+runs = 3                        # Captures read in each mode
+
+modes = ['BYTE', 'WORD', 'BYTE spill', 'WORD spill', 'query_binary_values']
+
+def peak_rss():
+    """Returns the peak resident set size of this process (MB)."""
+    try:
+        import resource
+    except ImportError:
+        return nan
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss/2**20 if (sys.platform == 'darwin') else rss/2**10
+
+def standin(server):
+    """Serves a capture of 'points' random samples in the format last selected."""
+    data = random.randint(0, 256, 2*points, dtype=uint8).tobytes()
+    while True:
+        conn, addr = server.accept()
+        width = 1
+        try:
+            for line in conn.makefile('rb'):
+                cmd = line.strip().decode()
+                if (cmd == '*IDN?'):
+                    conn.sendall(b'Stand-in,BENCH-WAVEFORM,0,1.0\n')
+                elif (cmd.startswith(':WAVeform:FORMat')):
+                    width = 2 if (cmd.endswith('WORD')) else 1
+                elif (cmd == ':WAVeform:PREamble?'):
+                    codes = 256**width
+                    conn.sendall(b'%d,0,%d,1,1.0E-9,-4.0E-3,0,%e,0.0,%d\n'
+                                 % (width-1, points, 0.256/codes, codes//2))
+                elif (cmd == ':WAVeform:DATA?'):
+                    n = width*points
+                    conn.sendall(b'#8%08d' % (n))
+                    conn.sendall(memoryview(data)[:n])
+                    conn.sendall(b'\n')
+        except OSError:
+            pass
+        conn.close()
+
+def client(mode, port):
+    """Reads 'runs' captures in 'mode' and prints the results."""
+    from bench import Instrument
+    import waveform
+    scope = Instrument('scope', 'TCPIP0::127.0.0.1::%d::SOCKET' % (port))
+    scope.open()
+    rss0 = peak_rss()
+    t = zeros(runs, float)
+    for k in range(runs):
+        t0 = time.perf_counter()
+        if (mode == 'query_binary_values'):
+            waveform.configure(scope, 1, 'BYTE')
+            pre = waveform.preamble(scope)
+            raw = scope.query_binary_values(':WAVeform:DATA?', datatype='B')
+            v = (array(raw) - pre.yreference)*pre.yincrement + pre.yorigin
+            nbytes = len(raw)
+        else:
+            fmt = mode.split()[0]
+            v, pre = waveform.read_waveform(scope, 1, fmt, spill=mode.endswith('spill'))
+            nbytes = len(v)*waveform.formats[fmt].itemsize
+        t[k] = time.perf_counter() - t0
+        del v
+    print('%-20s %7.1f MB/s, peak RSS %7.1f MB (%.1f MB above start-up)'
+          % (mode, nbytes/median(t)/1e6, peak_rss(), peak_rss() - rss0), flush=True)
+
+if __name__ == '__main__':
+    if (len(sys.argv) > 1):
+        client(sys.argv[1], int(sys.argv[2]))
+        sys.exit()
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    port = server.getsockname()[1]
+    threading.Thread(target=standin, args=(server,), daemon=True).start()
+
+    print('Reading %d points per capture' % (points))
+    for mode in modes:
+        subprocess.run([sys.executable, os.path.abspath(__file__), mode, str(port)],
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
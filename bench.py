@@ -0,0 +1,260 @@
+"""Instrument connections for the subsystem test scripts.
+Each instrument on the bench is represented by an Instrument object, which
+only imports pyvisa, opens the VISA session and queries *IDN? the first time
+the instrument is actually used. Scripts therefore get to their first SCPI
+command without waiting for instruments they do not need yet.
+
+The time spent in each start-up phase (measured from the import of this
+module, which is the first import of every test script) is recorded, and a
+breakdown is printed after the first SCPI command if report_startup is True
+or the environment variable M3_STARTUP_REPORT is set.
+
+If a session is lost (a timeout or a broken connection), the instrument is
+reconnected, with a growing delay between attempts, and sent a device clear;
+its setup is then restored (see baseline()) and SessionLost is raised, so
+that the operation in progress can be retried (the sweep engine retries the
+point being measured, see sweep.py).
+
+If the environment variable M3_BROKER is set, the instruments are reached
+through the local instrument broker instead (see broker.py)."""
+
+import time
+t_start = time.perf_counter()
+import os
+import scpilog
+import timeline
+import rawsocket
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+report_startup = bool(os.environ.get('M3_STARTUP_REPORT'))
+startup_target = 1.0            # Target time to first SCPI command (s)
+
+# Instruments on raw TCP sockets are reached through rawsocket.py rather
+# than pyvisa
+raw_sockets = True
+#raw_sockets = False
+
+reconnect_tries = 6             # Attempts to re-open a lost session (0: none)
+reconnect_delay = 0.25          # Delay before the second attempt (s), doubled each time
+reconnect_delay_max = 4         # Longest delay between attempts (s)
+
+# Commands that take an action rather than change a setting, so are not
+# sent again after reconnecting (short and long form of each header)
+actions = [('DIG', 'DIGITIZE'), ('RUN', 'RUN'), ('STOP', 'STOP'), ('SING', 'SINGLE'),
+           ('AUT', 'AUTOSCALE'), ('TRIG:FORC', 'TRIGGER:FORCE')]
+
+# Last octet of the IP address, VISA resource suffix and description of
+# each bench instrument
+addresses = {
+    'scope': (253, 'hislip0::INSTR', 'oscilloscope'),
+    'fxngen': (254, '5025::SOCKET', 'function generator'),
+    'supply': (251, '5025::SOCKET', 'power supply'),
+}
+
+phases = []                     # (phase, duration) pairs
+t_mark = t_start
+t_first = None                  # Time of the first SCPI command
+rm = None
+
+def is_action(header):
+    """Returns True if SCPI command 'header' is one of 'actions'."""
+    parts = header.lstrip(':').upper().split(':')
+    for (short, long) in actions:
+        forms = list(zip(short.split(':'), long.split(':')))
+        if (len(forms) == len(parts)
+            and all([l.startswith(p) and len(p) >= len(s) for (p, (s, l)) in zip(parts, forms)])):
+            return True
+    return False
+
+def mark(phase):
+    """Records the time elapsed since the previous mark as 'phase'."""
+    global t_mark
+    t = time.perf_counter()
+    phases.append((phase, t - t_mark))
+    t_mark = t
+
+def print_startup():
+    print('Start-up time breakdown:')
+    for (phase, dt) in phases:
+        print('  %-24s %7.3f s' % (phase, dt))
+    print('  Time to first SCPI command: %.3f s (target %.3f s)' % (t_first - t_start, startup_target))
+
+def resource_manager():
+    global rm
+    if (rm is None):
+        mark('script start-up')
+        import pyvisa
+        mark('pyvisa import')
+        rm = pyvisa.ResourceManager()
+        mark('resource manager')
+    return rm
+
+class SessionLost(IOError):
+    """The session with an instrument was lost during an operation, which
+    was not completed. The session has been re-established and the setup
+    of the instrument restored."""
+
+def session_error(e):
+    """Returns True if exception 'e' means that the session was lost."""
+    if (isinstance(e, OSError)):
+        return True
+    if (rm is not None):
+        import pyvisa
+        return isinstance(e, pyvisa.errors.VisaIOError)
+    return False
+
+class Instrument:
+    """VISA instrument at address 'resource', opened on first use. Reads and
+    writes are passed straight through to the pyvisa resource, and the
+    session is re-established if it is lost."""
+
+    def __init__(self, name, resource, descr=None, timeout=10000):
+        self.name = name
+        self.resource = resource
+        self.descr = name if (descr is None) else descr
+        self.timeout = timeout
+        self.inst = None
+        self.id = None
+        self.restore = None
+        self.settings = {}          # Settings written since the setup, by header
+        self.recovering = False
+
+    def open(self):
+        global t_first
+        if (self.inst is None):
+            if (scpilog.replay is not None):
+                inst = scpilog.ReplayResource(self.name)
+            elif (os.environ.get('M3_BROKER')):
+                import broker
+                inst = broker.BrokerResource(self.resource)
+                if (scpilog.journal is not None):
+                    inst = scpilog.RecordingResource(inst, self.name)
+            else:
+                address = rawsocket.parse_resource(self.resource) if (raw_sockets) else None
+                if (address is not None):
+                    if (not phases):
+                        mark('script start-up')
+                    inst = rawsocket.SocketResource(*address, timeout=self.timeout)
+                else:
+                    inst = resource_manager().open_resource(self.resource)
+                    inst.write_termination = '\n'
+                    inst.read_termination = '\n'
+                    inst.timeout = self.timeout
+                if (scpilog.journal is not None):
+                    inst = scpilog.RecordingResource(inst, self.name)
+            if (timeline.tracer is not None):
+                inst = timeline.TracedResource(inst, self.name)
+            mark('open ' + self.name)
+            self.id = inst.query('*IDN?').strip().split(',')
+            self.inst = inst
+            mark('*IDN? ' + self.name)
+            if (t_first is None):
+                t_first = time.perf_counter()
+                if (report_startup):
+                    print_startup()
+            print('Connected to %s:' % (self.descr), self.id[1], flush=True)
+        return self.inst
+
+    @property
+    def idn(self):
+        """*IDN? response, split into fields. This remains available after
+        the instrument has been closed."""
+        if (self.id is None):
+            self.open()
+        return self.id
+
+    def baseline(self, restore):
+        """Sets the function 'restore' that puts the instrument back in its
+        initial setup after reconnecting. The settings (commands with a
+        value, other than 'actions') written from now on are sent again
+        after it."""
+        self.restore = restore
+        self.settings = {}
+
+    def remember(self, msg):
+        for cmd in msg.split(';'):
+            cmd = cmd.strip()
+            header = cmd.split(' ')[0]
+            if (header != cmd and not header.startswith('*') and not is_action(header)):
+                self.settings.pop(header, None)
+                self.settings[header] = cmd
+
+    def call(self, op, *args, **kw):
+        """Performs operation 'op' of the resource, reconnecting if the
+        session is lost."""
+        inst = self.open()
+        try:
+            return getattr(inst, op)(*args, **kw)
+        except Exception as e:
+            if (reconnect_tries == 0 or self.recovering or scpilog.replay is not None
+                or os.environ.get('M3_BROKER') or not session_error(e)):
+                raise
+            self.reconnect(e)
+            raise SessionLost('%s: %s' % (self.descr, e)) from e
+
+    def reconnect(self, error):
+        """Re-opens the session, sends a device clear and restores the setup."""
+        print('Lost connection to %s (%s), reconnecting' % (self.descr, error), flush=True)
+        delay = reconnect_delay
+        self.recovering = True
+        try:
+            for attempt in range(reconnect_tries):
+                if (attempt > 0):
+                    time.sleep(delay)
+                    delay = min(2*delay, reconnect_delay_max)
+                self.close()
+                try:
+                    inst = self.open()
+                    inst.clear()
+                    if (self.restore is not None):
+                        self.restore()
+                    for cmd in self.settings.values():
+                        inst.write(cmd)
+                    return
+                except Exception as e:
+                    if (not session_error(e)):
+                        raise
+                    error = e
+            self.close()
+            raise SessionLost('%s: could not reconnect (%s)' % (self.descr, error))
+        finally:
+            self.recovering = False
+
+    def write(self, cmd):
+        if (not self.recovering):
+            self.remember(cmd)
+        return self.call('write', cmd)
+
+    def query(self, cmd):
+        return self.call('query', cmd)
+
+    def __getattr__(self, attr):
+        a = getattr(self.open(), attr)
+        if (not callable(a)):
+            return a
+        return lambda *args, **kw: self.call(attr, *args, **kw)
+
+    def close(self):
+        if (self.inst is not None):
+            inst, self.inst = self.inst, None
+            try:
+                inst.close()
+            except Exception as e:
+                if (not session_error(e)):
+                    raise
+
+def open_instruments(school_ip, *names):
+    """Returns an Instrument for each bench instrument in 'names', on the
+    school network (192.168.0.x) or the alternate one (192.168.2.x)."""
+    subnet = 0 if (school_ip) else 2
+    insts = []
+    for name in names:
+        host, suffix, descr = addresses[name]
+        resource = 'TCPIP0::192.168.%d.%d::%s' % (subnet, host, suffix)
+        insts.append(Instrument(name, resource, descr))
+    return insts[0] if (len(insts) == 1) else insts
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""Local instrument broker.
+Run this file as a script to hold persistent connections to the bench
+instruments and share them between test scripts and other tools:
+    python broker.py
+While the broker is running, any script started with the environment
+variable M3_BROKER set (to 1, or to the port or host:port of the broker)
+sends its instrument traffic through the broker instead of opening its own
+VISA sessions. Each instrument is opened once, on first use, and its *IDN?
+response is cached, so scripts no longer pay for the connection and the
+handshake.
+
+Requests for each instrument are queued and served one at a time by a
+thread per instrument, lowest priority value first (in order of arrival
+for equal priorities). A client can lock an instrument to make a series of
+requests without interruption (e.g. for a sweep, while a monitor waits),
+and after a query sent with write() the instrument is reserved for the
+client that sent it until it has read the response.
+
+Clients talk to the broker over a local TCP connection, one JSON list per
+line: [resource, operation, argument, keyword arguments, priority], answered
+with [result] or ["error", message]."""
+
+import os
+import json
+import time
+import socket
+import threading
+import socketserver
+from scpilog import encode, decode
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+broker_host = '127.0.0.1'
+broker_port = 5295              # Default port of the broker
+default_priority = 10           # Priority of requests (lower is served first)
+reserve_timeout = 10            # Longest reservation for an unread response (s)
+
+class BrokerError(IOError):
+    """The broker or the instrument reported an error."""
+
+def broker_address():
+    """Returns the (host, port) given by M3_BROKER, or None if not set."""
+    value = os.environ.get('M3_BROKER')
+    if (not value):
+        return None
+    host, _, port = value.rpartition(':')
+    if (not port.isdigit() or port == '1'):
+        return (broker_host, broker_port)
+    return (host or broker_host, int(port))
+
+## Client side
+
+class BrokerResource:
+    """Stands in for the pyvisa resource 'resource', passing each operation
+    to the broker. Requests are sent with priority 'priority' (by default,
+    the value of M3_BROKER_PRIORITY if set)."""
+
+    def __init__(self, resource, address=None, priority=None):
+        self.resource = resource
+        if (priority is None):
+            priority = int(os.environ.get('M3_BROKER_PRIORITY', default_priority))
+        self.priority = priority
+        self.sock = socket.create_connection(address or broker_address())
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.f = self.sock.makefile('rwb')
+
+    def request(self, op, arg=None, **kw):
+        msg = [self.resource, op, encode(arg), kw, self.priority]
+        self.f.write(json.dumps(msg).encode() + b'\n')
+        self.f.flush()
+        line = self.f.readline()
+        if (not line):
+            raise BrokerError('Connection to the broker lost')
+        reply = json.loads(line)
+        if (len(reply) == 2):
+            raise BrokerError(reply[1])
+        return decode(reply[0])
+
+    def write(self, cmd):
+        return self.request('write', cmd)
+
+    def read(self):
+        return self.request('read')
+
+    def query(self, cmd):
+        return self.request('query', cmd)
+
+    def read_bytes(self, count, **kw):
+        return self.request('read_bytes', count)
+
+    def query_binary_values(self, cmd, container=list, **kw):
+        return container(self.request('query_binary_values', cmd, **kw))
+
+    def write_binary_values(self, cmd, values, **kw):
+        return self.request('write_binary_values', cmd, values=list(values), **kw)
+
+    def lock(self):
+        """Serves only this client's requests until unlock() is called."""
+        self.request('lock')
+
+    def unlock(self):
+        self.request('unlock')
+
+    def close(self):
+        self.sock.close()
+
+## Broker
+
+class Station:
+    """An instrument held open by the broker, with its request queue."""
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.inst = None
+        self.queue = []
+        self.cond = threading.Condition()
+        self.owner = None           # Client holding the lock
+        self.reserved = None        # Client with a response still to read
+        self.deadline = 0
+        self.seq = 0
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def submit(self, client, op, arg, kw, priority):
+        """Queues a request and waits for its result."""
+        req = {'client': client, 'op': op, 'arg': arg, 'kw': kw,
+               'done': threading.Event()}
+        with self.cond:
+            self.seq += 1
+            self.queue.append((priority, self.seq, req))
+            self.cond.notify()
+        req['done'].wait()
+        if ('error' in req):
+            raise BrokerError(req['error'])
+        return req['result']
+
+    def eligible(self, client):
+        if (self.owner is not None):
+            return client is self.owner
+        if (self.reserved is not None and time.monotonic() < self.deadline):
+            return client is self.reserved
+        return True
+
+    def next_request(self):
+        with self.cond:
+            while True:
+                ready = [q for q in self.queue if self.eligible(q[2]['client'])]
+                if (ready):
+                    q = min(ready, key=lambda q: q[:2])
+                    self.queue.remove(q)
+                    return q[2]
+                self.cond.wait(0.1)
+
+    def serve(self):
+        while True:
+            req = self.next_request()
+            try:
+                req['result'] = self.execute(req['client'], req['op'], req['arg'], req['kw'])
+            except Exception as e:
+                req['error'] = '%s: %s' % (self.resource, e)
+            with self.cond:
+                self.cond.notify_all()
+            req['done'].set()
+
+    def execute(self, client, op, arg, kw):
+        if (op == 'lock'):
+            self.owner = client
+            return None
+        if (op == 'unlock'):
+            if (self.owner is client):
+                self.owner = None
+            if (self.reserved is client):
+                self.reserved = None
+            return None
+        if (self.inst is None):
+            from bench import Instrument
+            self.inst = Instrument(self.resource, self.resource)
+            self.inst.open()
+        if (op == 'query' and arg.strip() == '*IDN?'):   # Cached by Instrument
+            return ','.join(self.inst.idn)
+        if (op == 'write'):
+            self.inst.write(arg)
+            if ('?' in arg):
+                self.reserved = client
+                self.deadline = time.monotonic() + reserve_timeout
+            return None
+        if (op not in ('read', 'read_bytes') and self.reserved is client):
+            self.reserved = None
+        if (op == 'query_binary_values'):
+            return self.inst.query_binary_values(arg, container=list, **kw)
+        if (op == 'write_binary_values'):
+            values = kw.pop('values')
+            return self.inst.write_binary_values(arg, values, **kw)
+        return getattr(self.inst, op)(*([] if (arg is None) else [arg]))
+
+    def release(self, client):
+        """Drops the lock and reservation of a client that has disconnected."""
+        with self.cond:
+            if (self.owner is client):
+                self.owner = None
+            if (self.reserved is client):
+                self.reserved = None
+            self.queue = [q for q in self.queue if q[2]['client'] is not client]
+            self.cond.notify_all()
+
+stations = {}
+stations_lock = threading.Lock()
+
+def station(resource):
+    with stations_lock:
+        if (resource not in stations):
+            stations[resource] = Station(resource)
+        return stations[resource]
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = object()
+        used = set()
+        try:
+            for line in self.rfile:
+                (resource, op, arg, kw, priority) = json.loads(line)
+                st = station(resource)
+                used.add(st)
+                try:
+                    reply = [encode(st.submit(client, op, decode(arg), kw, priority))]
+                except BrokerError as e:
+                    reply = ['error', str(e)]
+                self.wfile.write(json.dumps(reply).encode() + b'\n')
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            for st in used:
+                st.release(client)
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def serve(address=None):
+    address = address or broker_address() or (broker_host, broker_port)
+    os.environ.pop('M3_BROKER', None)   # The broker opens the instruments itself
+    server = Server(address, Handler)
+    print('Instrument broker listening on %s:%d' % server.server_address, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for st in stations.values():
+            if (st.inst is not None):
+                st.inst.close()
+
+if __name__ == '__main__':
+    serve()
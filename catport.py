@@ -0,0 +1,132 @@
+"""CAT serial port discovery.
+Finds the serial port the transceiver is connected to, instead of relying on
+a hard-coded COM port. Every candidate port (those listed by pyserial, and
+on Linux the /dev/ttyUSB* and /dev/ttyACM* devices) is probed at the same
+time: each probe opens its port at each supported baud rate in turn, sends
+the CAT query ID; and waits briefly for the transceiver's answer ID0650;.
+
+The port and baud rate found are cached per machine in cache_file, and on
+the next run that port alone is re-validated with a single ID; query, so
+the full search only happens when the transceiver has been moved or
+re-plugged. Ports given in port_patterns can also be pseudo-terminals,
+which is how a stand-in transceiver is probed in bench-catport.py."""
+
+import os
+import glob
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import serial
+import scpilog
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+expected_id = b'ID0650;'        # Answer of the transceiver to ID;
+baudrates = [9600, 38400, 115200, 19200, 4800] # Tried in this order
+probe_timeout = 0.3             # Time to wait for the answer (s)
+port_patterns = ['/dev/ttyUSB*', '/dev/ttyACM*'] # Ports probed besides those pyserial lists
+cache_file = os.path.join(os.path.expanduser('~'), '.m3-catport.json')
+
+def raw_serial():
+    """Returns pyserial's Serial class, without the wrappers that record or
+    trace the script's own I/O, so the probes are kept out of both."""
+    Serial = serial.Serial
+    while (Serial.__module__ in ('scpilog', 'timeline')):
+        Serial = Serial.__bases__[0]
+    return Serial
+
+def candidates():
+    """Returns the names of the serial ports to probe."""
+    ports = []
+    for pattern in port_patterns:
+        ports += sorted(glob.glob(pattern))
+    try:
+        from serial.tools import list_ports
+        ports += [p.device for p in list_ports.comports()]
+    except ImportError:
+        pass
+    return list(dict.fromkeys(ports))
+
+def probe(port, baudrate, stop=None):
+    """Returns True if the transceiver answers ID; on 'port' at 'baudrate'."""
+    if (stop is not None and stop.is_set()):
+        return False
+    try:
+        ser = raw_serial()(port=port, baudrate=baudrate, timeout=probe_timeout,
+                           write_timeout=probe_timeout)
+    except (serial.SerialException, OSError, ValueError):
+        return False
+    try:
+        ser.reset_input_buffer()
+        ser.write(b'ID;')
+        return ser.read_until(b';', 32).endswith(expected_id)
+    except (serial.SerialException, OSError):
+        return False
+    finally:
+        ser.close()
+
+def probe_port(port, stop):
+    """Tries each baud rate on 'port', returning the one the transceiver
+    answers at, or None."""
+    for baudrate in baudrates:
+        if (probe(port, baudrate, stop)):
+            return baudrate
+    return None
+
+def discover(ports=None, workers=None):
+    """Probes 'ports' (default: all candidates) concurrently, and returns the
+    (port, baudrate) of the first that answers, or None."""
+    if (ports is None):
+        ports = candidates()
+    if (not ports):
+        return None
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(workers or len(ports))
+    try:
+        futures = {pool.submit(probe_port, port, stop): port for port in ports}
+        for f in as_completed(futures):
+            if (f.result() is not None):
+                stop.set()
+                return futures[f], f.result()
+        return None
+    finally:
+        pool.shutdown(wait=True)
+
+def load_cache():
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(port, baudrate):
+    cache = load_cache()
+    cache[socket.gethostname()] = {'port': port, 'baudrate': baudrate}
+    try:
+        with open(cache_file, 'w') as f:
+            json.dump(cache, f, indent=1)
+    except OSError:
+        pass
+
+def find_port():
+    """Returns the (port, baudrate) of the transceiver: the cached port if it
+    still answers, otherwise the result of a full search, which is cached.
+    Raises serial.SerialException if the transceiver is not found."""
+    if (scpilog.replay is not None):
+        return None, baudrates[0]
+    cached = load_cache().get(socket.gethostname())
+    if (cached is not None and probe(cached['port'], cached['baudrate'])):
+        return cached['port'], cached['baudrate']
+    ports = candidates()
+    print('Searching %d serial ports for the transceiver...' % (len(ports)), flush=True)
+    found = discover(ports)
+    if (found is None):
+        raise serial.SerialException('transceiver not found on ' + (', '.join(ports) or 'any port'))
+    print('Transceiver found on %s at %d baud' % found)
+    save_cache(*found)
+    return found
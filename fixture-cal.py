@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Fixture calibration script.
+This script measures the amplitude of the oscilloscope wave generator
+output, through the test cabling, at every frequency swept by sub-a-bpf.py,
+sub-a-mixer.py and sub-d.py, and stores it for use by those scripts."""
+
+from sweep import Test, Sweep, Commands, Query
+from numpy import *
+from fixturecal import save_cal, cal_path
+from scheduler import schedule, timebase
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+# Open instrument connection(s). Each instrument is connected the first
+# time it is used (see bench.py).
+school_ip = True
+#school_ip = False
+test = Test('fixture-cal', school_ip, 'scope', off=[('scope', ':WGEN:OUTP OFF')])
+scope = test['scope']
+
+# Union of the stimulus frequencies of the subsystem scripts, with the
+# nominal amplitude each script uses
+freq_rf = concatenate((arange(51)/50*16e6 + 4e6 + 1e3,   # sub-a-bpf.py
+                       14e6 + logspace(3, 6, 61)))       # sub-a-mixer.py
+freq_af = arange(40)*100 + 100                            # sub-d.py
+freq = concatenate((freq_rf, freq_af))
+nominal = concatenate((full(freq_rf.shape, 50e-3), full(freq_af.shape, 0.316*sqrt(2))))
+
+# Setup scope
+scope.write('CHANnel1:PROBe +1.0')
+scope.write(':CHAN1:COUP AC')
+scope.write(':TRIG:SWEep AUTO')
+scope.write(':TRIG:EDGE:SOURce CHAN1')
+scope.write(':TRIG:EDGE:LEVel +0.0')
+scope.write(':WGEN:FUNC SIN')
+
+test.prompt('Connect the wave generator output to CH1 using the cable normally',
+            'connected to the input of your subsystem. Disconnect your subsystem.')
+
+# Each point sets the amplitude, frequency and scales (see sweep.py). The
+# timebase is rounded up to the 1-2-5 sequence, so that points in the
+# same range share it, and the points are grouped by amplitude and
+# timebase so that each is only set once (see scheduler.py).
+tb = timebase(freq)             # 3 cycles on screen
+(order, groups) = schedule(list(zip(nominal, tb)), freq)
+sweep = Sweep(test, freq, axes={'nominal': nominal, 'timebase': tb}, order=order,
+              stimulus=[Commands(scope, ':WGEN:VOLT %e', axis='nominal'),
+                        Commands(scope, ':WGEN:FREQ %e'),
+                        Commands(scope, ':CHAN1:SCAL %e', axis='nominal', scale=1/6),
+                        Commands(scope, ':TIMebase:SCAL %e', axis='timebase')],
+              measure=[Query(scope, ':MEAS:VPP? CHAN1', 'vpp')],
+              settle=0.5,
+              derived={'MHz': lambda p: p['x']/1e6, 'ratio': lambda p: p['vpp']/p['nominal']},
+              report='Frequency point %(n)d/%(N)d, f=%(MHz).4f MHz: %(ratio)f')
+
+scope.write(':WGEN:OUTP ON')
+sweep.run()
+
+print('Done')
+
+test.finish()
+
+save_cal(freq, sweep['ratio'], scope.idn)
+print('Calibration saved to', cal_path(scope.idn))
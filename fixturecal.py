@@ -0,0 +1,70 @@
+"""Fixture calibration cache.
+The gain calculations in the subsystem scripts divide by the nominal
+amplitude of the stimulus, which assumes the oscilloscope wave generator and
+the cabling are flat over frequency. The fixture-cal.py script measures the
+stimulus actually delivered through the fixture once per bench, and stores the
+ratio of measured to nominal amplitude versus frequency in the 'fixturecal'
+directory. The file is keyed by the serial numbers of the instruments
+involved, and is ignored once it is older than max_age.
+
+Alternatively, the stimulus can be teed to a spare scope channel and
+measured in the same acquisition as the outputs of the subsystem, so that
+each gain is the ratio of amplitudes measured together at that point, with
+no calibration run and no extra sweep time."""
+
+import os
+import time
+import hashlib
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+cal_dir = 'fixturecal'          # Directory where calibrations are stored
+max_age = 30*24*3600            # Calibrations older than this (s) are ignored
+
+def cal_path(*ids):
+    """Returns the calibration file name for the instruments whose split *IDN?
+    responses are given in 'ids'."""
+    serials = ','.join(sorted(idn[2].strip() for idn in ids))
+    key = hashlib.sha1(serials.encode()).hexdigest()[:16]
+    return os.path.join(cal_dir, key + '.npz')
+
+def save_cal(freq, ratio, *ids):
+    os.makedirs(cal_dir, exist_ok=True)
+    order = argsort(freq)
+    savez(cal_path(*ids), freq=asarray(freq)[order],
+          ratio=asarray(ratio)[order], time=time.time())
+
+def load_cal(*ids):
+    """Returns the frequency and amplitude ratio vectors of the calibration,
+    or None if there is no usable calibration for these instruments."""
+    try:
+        cal = load(cal_path(*ids))
+    except OSError:
+        return None
+    if (time.time() - float(cal['time']) > max_age):
+        print('Fixture calibration has expired; re-run fixture-cal.py.')
+        return None
+    return cal['freq'], cal['ratio']
+
+def stimulus_ampl(freq, input_ampl, *ids):
+    """Returns the stimulus amplitude delivered at each frequency in 'freq'
+    for a nominal amplitude of 'input_ampl'. Without a calibration, the
+    nominal amplitude is returned at every frequency."""
+    freq = asarray(freq, float)
+    cal = load_cal(*ids)
+    if (cal is None):
+        print('No fixture calibration found; using nominal stimulus amplitude.')
+        return full(freq.shape, input_ampl)
+    print('Applying fixture calibration.')
+    return input_ampl*interp(log10(freq), log10(cal[0]), cal[1])
+
+def reference_setup(chan, input_ampl):
+    """Returns the command that sets up scope channel 'chan' to measure a
+    stimulus of nominal amplitude 'input_ampl' (Vpp) teed to it."""
+    return (':CHAN%d:DISP ON;:CHAN%d:PROBe +1.0;:CHAN%d:COUP AC;:CHAN%d:SCAL %e'
+            % (chan, chan, chan, chan, input_ampl/6))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""Live display of a sweep while it is being measured.
+The measurement script writes each point into a small memory-mapped buffer
+(a plain store of the values followed by an increment of an update counter,
+with no locks or inter-process messages), so adding the live view costs the
+sweep loop next to nothing. The plot is drawn by a separate viewer process
+(this file run as a script), which polls the update counter and redraws
+only the curves, using blitting, when new points have arrived.
+
+The buffer is an array of shape (N+1, ncurves+1). Row 0 holds the update
+counter and a flag set when the sweep is finished; row k+1 holds the
+x value of point k followed by the value of each curve (nan until
+measured)."""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+poll_interval = 0.05            # Viewer polling interval (s)
+
+class LiveView:
+    """Live plot of the curves named in 'labels' against the sweep points
+    'x'. If 'enabled' is False, updates are ignored and no viewer is started."""
+
+    def __init__(self, title, x, labels, xlabel='', ylabel='', logx=False,
+                 enabled=True):
+        self.enabled = enabled
+        if (not enabled):
+            return
+        fd, self.path = tempfile.mkstemp(suffix='.live')
+        os.close(fd)
+        shape = (len(x)+1, len(labels)+1)
+        self.buf = memmap(self.path, float64, 'w+', shape=shape)
+        self.buf[:] = nan
+        self.buf[0, :2] = 0
+        self.buf[1:, 0] = x
+        with open(self.path + '.json', 'w') as f:
+            json.dump({'title': title, 'labels': labels, 'xlabel': xlabel,
+                       'ylabel': ylabel, 'logx': logx, 'shape': shape}, f)
+        self.proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.path])
+
+    def update(self, k, *values):
+        """Sets the values of the first len(values) curves at point k."""
+        if (self.enabled):
+            self.buf[k+1, 1:len(values)+1] = values
+            self.buf[0, 0] += 1
+
+    def close(self):
+        """Marks the sweep as finished. The viewer window stays open until
+        it is closed by the user."""
+        if (self.enabled):
+            self.buf[0, 1] = 1
+            self.buf[0, 0] += 1
+            del self.buf
+            self.enabled = False
+
+def viewer(path):
+    with open(path + '.json') as f:
+        p = json.load(f)
+    buf = memmap(path, float64, 'r', shape=tuple(p['shape']))
+
+    import matplotlib
+    try:
+        matplotlib.use(os.environ.get('MPLBACKEND', 'TkAgg'))
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+    except Exception as e:
+        print('Live view not available:', e)
+        return
+
+    x = array(buf[1:, 0])
+    lines = [ax.plot([], [], animated=True)[0] for label in p['labels']]
+    if (p['logx']):
+        ax.set_xscale('log')
+    ax.set_xlim((min(x), max(x)))
+    ax.set_ylim((0, 1))
+    ax.set_xlabel(p['xlabel'])
+    ax.set_ylabel(p['ylabel'])
+    ax.set_title(p['title'])
+    ax.legend(lines, p['labels'])
+    ax.grid(True)
+
+    # The background (everything but the curves) is saved whenever the
+    # figure is fully redrawn, and restored before each incremental update.
+    state = {'bg': None}
+    def save_background(event):
+        state['bg'] = fig.canvas.copy_from_bbox(fig.bbox)
+        for line in lines:
+            ax.draw_artist(line)
+    fig.canvas.mpl_connect('draw_event', save_background)
+    plt.show(block=False)
+    fig.canvas.draw()
+
+    count = 0
+    while (plt.fignum_exists(fig.number)):
+        if (buf[0, 0] != count):
+            count = buf[0, 0]
+            data = array(buf[1:, 1:])
+            for (i, line) in enumerate(lines):
+                ok = isfinite(data[:, i])
+                line.set_data(x[ok], data[ok, i])
+            y = data[isfinite(data)]
+            (ylo, yhi) = ax.get_ylim()
+            if (len(y) > 0 and (min(y) < ylo or max(y) > yhi)):
+                margin = 0.1*(max(y) - min(y)) + 1e-9
+                ax.set_ylim((min(y) - margin, max(y) + margin))
+                fig.canvas.draw()
+            else:
+                fig.canvas.restore_region(state['bg'])
+                for line in lines:
+                    ax.draw_artist(line)
+                fig.canvas.blit(fig.bbox)
+            if (buf[0, 1] == 1):
+                break
+        fig.canvas.flush_events()
+        time.sleep(poll_interval)
+
+    # Sweep finished: leave the final plot up until the window is closed
+    for line in lines:
+        line.set_animated(False)
+    fig.canvas.draw()
+    plt.show()
+
+if __name__ == '__main__':
+    path = sys.argv[1]
+    try:
+        viewer(path)
+    finally:
+        for f in (path, path + '.json'):
+            try:
+                os.remove(f)
+            except OSError:
+                pass
@@ -0,0 +1,149 @@
+"""Derived quantities of the subsystem tests.
+The quantities calculated from the raw measurements of each test: the gain
+of the BPF (sub-a-bpf.py), the conversion gain and I/Q balance of the
+mixers and modulator (sub-a-mixer.py, sub-d.py), the sideband rejection of
+the demodulator (sub-b.py), the frequency error of the LO (sub-c.py) and the
+output power, efficiency and harmonic distortion of the PA (sub-f.py), and
+the intermodulation and intercept points of the two-tone test (sub-imd.py).
+
+Every function works element by element on arrays of any shape, so the
+same code serves a single point during a sweep, a whole sweep, and a batch
+of stored runs (runs x points, e.g. from Warehouse.matrix()) in one pass.
+Readings that are not valid measurements (zero, negative, not finite, or
+the 9.9e37 the scope returns when it cannot make a measurement) give nan
+instead of a warning or an infinite result."""
+
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+no_result = 9.9e37              # Returned by the scope for a failed measurement
+
+def valid(x, positive=True):
+    """Returns True where 'x' is a valid reading (and positive, if
+    'positive' is True)."""
+    x = asarray(x, float)
+    ok = isfinite(x) & (abs(x) < no_result)
+    return ok & (x > 0) if (positive) else ok
+
+def clean(x, positive=True):
+    """Returns 'x' as floats, with nan in place of invalid readings."""
+    x = asarray(x, float)
+    return where(valid(x, positive), x, nan)
+
+def dB(x):
+    """Power ratio 'x' in dB."""
+    return 10*log10(clean(x))
+
+def dBV(v):
+    """Voltage 'v' in dBV."""
+    return 20*log10(clean(v))
+
+## Subsystem A and D
+
+def gain_dB(ampl_i, ampl_q, stim_ampl):
+    """Total gain (dB) of the I and Q outputs, with amplitudes 'ampl_i' and
+    'ampl_q', for a stimulus of amplitude 'stim_ampl'."""
+    stim_ampl = clean(stim_ampl)
+    return dB((clean(ampl_i)/stim_ampl)**2 + (clean(ampl_q)/stim_ampl)**2)
+
+def conversion_gain_dB(ampl, stim_ampl):
+    """Gain (dB) of an output of amplitude 'ampl'."""
+    return dB((clean(ampl)/clean(stim_ampl))**2)
+
+def normalized_dB(x_dB, axis=-1):
+    """Response 'x_dB' relative to its maximum along 'axis' (the points of
+    each run)."""
+    x_dB = asarray(x_dB, float)
+    peak = where(isnan(x_dB), -inf, x_dB).max(axis=axis, keepdims=True)
+    return x_dB - where(isfinite(peak), peak, nan)
+
+def balance_dB(ampl_i, ampl_q):
+    """Amplitude balance (dB) between the I and Q outputs."""
+    return dB((clean(ampl_i)/clean(ampl_q))**2)
+
+def phase_difference(phase1, phase2):
+    """Phase difference (deg) between two outputs, from their phases."""
+    return clean(phase1, False) - clean(phase2, False)
+
+## Subsystem B
+
+def rejection_dB(ampl_usb, ampl_lsb):
+    """Rejection (dB) of the LSB relative to the USB, from the demodulated
+    amplitudes."""
+    return dB((clean(ampl_usb)/clean(ampl_lsb))**2)
+
+## Subsystem C
+
+def freq_error(meas_freq, freq):
+    """Error (Hz) of measured frequency 'meas_freq' for command 'freq'."""
+    return clean(meas_freq) - asarray(freq, float)
+
+## Subsystem F
+
+def rf_power(Vout, R=50):
+    """Power (W) of RF amplitude 'Vout' into 'R' ohms."""
+    return clean(Vout)**2/R
+
+def harmonic_power(A_dBV, R=50):
+    """Power (W) into 'R' ohms of harmonics with amplitudes 'A_dBV' (dBV)."""
+    return (10**(clean(A_dBV, False)/20))**2/R
+
+def efficiency(P1, Pdc):
+    """DC-to-RF efficiency for RF output power 'P1' and DC input power 'Pdc'."""
+    return clean(P1)/clean(Pdc)
+
+def thd(A_dBV):
+    """Total harmonic distortion from harmonic amplitudes in dBV. The last axis
+    of 'A_dBV' runs over the harmonics, so a whole sweep can be passed at once;
+    harmonics that were not measured (nan) are left out."""
+    A = 10**(clean(A_dBV, False)/20)
+    with errstate(invalid='ignore'):
+        return sqrt(nansum(A[..., 1:]**2, axis=-1))/A[..., 0]
+
+## Two-tone intermodulation
+
+def tone_power_dBm(A, R=50):
+    """Power (dBm) into 'R' ohms of a tone of peak amplitude 'A'."""
+    return dB(clean(A)**2/(2*R)) + 30
+
+def imd_dBc(P_im, P_fund):
+    """Level (dBc) of an intermodulation product of power 'P_im' relative to
+    the fundamentals of power 'P_fund' (both dBm)."""
+    return asarray(P_im, float) - asarray(P_fund, float)
+
+def oip3_dBm(P_fund, P_im3):
+    """Output third-order intercept (dBm) from a single capture, with the
+    fundamentals and IM3 products at powers 'P_fund' and 'P_im3' (dBm)."""
+    P_fund = asarray(P_fund, float)
+    return P_fund + (P_fund - asarray(P_im3, float))/2
+
+def intercept_dBm(Pin, Pout, P_im, order=3):
+    """Input and output intercept points (dBm) of the products of 'order',
+    from fundamentals 'Pout' and products 'P_im' (dBm) measured at several
+    input powers 'Pin' (dBm, along the last axis). Lines of slope 1 and
+    'order' are fitted to the fundamentals and products, ignoring nan."""
+    Pin = asarray(Pin, float)
+    a = nanmean(asarray(Pout, float) - Pin, axis=-1)
+    b = nanmean(asarray(P_im, float) - order*Pin, axis=-1)
+    iip = (a - b)/(order - 1)
+    return iip, iip + a
+
+def slope(Pin, P):
+    """Slope (dB/dB) of the line fitted to powers 'P' against input powers
+    'Pin' (along the last axis), ignoring nan: 1 for the fundamentals and 3
+    for the IM3 products below compression."""
+    Pin = asarray(Pin, float)
+    P = asarray(P, float)
+    ok = isfinite(Pin) & isfinite(P)
+    n = ok.sum(axis=-1)
+    x = where(ok, Pin, 0)
+    y = where(ok, P, 0)
+    mx = x.sum(axis=-1, keepdims=True)/n[..., newaxis]
+    my = y.sum(axis=-1, keepdims=True)/n[..., newaxis]
+    dx = where(ok, x - mx, 0)
+    return (dx*(y - my)).sum(axis=-1)/(dx**2).sum(axis=-1)
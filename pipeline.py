@@ -0,0 +1,77 @@
+"""Pipelined frequency sweeps.
+In a plain sweep loop, the stimulus for point k+1 is only programmed once
+the results of point k have been read back, and the settling time is then
+waited out on top of that. Here each point is captured with an explicit
+single acquisition (:DIGitize), after which the stimulus can safely be moved
+on: the commands for point k+1 are sent to the other instruments on a
+separate thread, and to the instrument being read back just before the
+results of point k are read back from the stopped acquisition. The settling
+time for point k+1 runs from the moment its stimulus is complete, so it
+overlaps the readback. Any analysis of the results is done on a worker
+thread so that it never delays the instruments.
+
+A sweep is described by the following functions of the point index k:
+- stim_async(k): stimulus commands for instruments other than the one
+  being read back (sent in parallel with the readback of point k-1);
+- stim_sync(k): stimulus commands for the instrument being read back (sent
+  after the acquisition and before the readback of point k-1);
+- acquire(k): explicit acquisition of point k. The stimulus of point k is
+  guaranteed not to change until this returns;
+- readback(k): reads the results of point k from the stopped acquisition
+  and returns them;
+- analyze(k, result): processes the results of point k (worker thread).
+Each instrument is only ever used by one thread at a time."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+def digitize(scope):
+    """Takes a single acquisition and waits for it to complete."""
+    scope.write(':DIGitize')
+    scope.query('*OPC?')
+
+def nothing(k):
+    pass
+
+def timed(f, k):
+    f(k)
+    return time.monotonic()
+
+def pipelined_sweep(N, settle, acquire, readback, stim_async=nothing,
+                    stim_sync=nothing, analyze=None):
+    """Runs the sweep over points 0..N-1, waiting 'settle' seconds after the
+    stimulus of each point is complete. Returns the list of results."""
+    results = [None]*N
+    stim = ThreadPoolExecutor(1)
+    worker = ThreadPoolExecutor(1)
+    analyses = []
+
+    try:
+        stim_async(0)
+        stim_sync(0)
+        t_ready = time.monotonic() + settle
+        for k in range(N):
+            time.sleep(max(0, t_ready - time.monotonic()))
+            acquire(k)
+            if (k+1 < N):
+                pending = stim.submit(timed, stim_async, k+1)
+                t_sync = timed(stim_sync, k+1)
+            results[k] = readback(k)
+            if (k+1 < N):
+                t_ready = max(pending.result(), t_sync) + settle
+            if (analyze is not None):
+                analyses.append(worker.submit(analyze, k, results[k]))
+    finally:
+        # Even if the sweep fails, the points read back are analyzed
+        stim.shutdown()
+        worker.shutdown()
+
+    for a in analyses:
+        a.result()
+    return results
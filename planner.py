@@ -0,0 +1,180 @@
+"""Sweep time planner.
+Predicts how long a sweep will take before it starts, and checks the
+prediction once it has finished. The time of a point is modelled from the
+backends of the sweep (see sweep.py): a round trip to the instrument for
+each Commands message that changes from point to point, Query and Call,
+the acquisition time of a Digitize, and the settling time, overlapped as in
+pipeline.py for pipelined sweeps. The round-trip time of each instrument is
+measured with a few *OPC? queries when the prediction is made. After each
+sweep, the ratio of the actual to the modelled time per point is kept in
+'history_file', keyed by the test and the quantities measured, and scales
+the model the next time that sweep is run on the bench, so that slow Call
+backends (e.g. adaptive averaging) are accounted for from the second run on.
+
+Given a time budget, fit() chooses the points of a sweep instead of the
+operator: as many points as fit in the budget, up to the number asked for,
+then as many averages as fit in the time left. The points are placed with
+a density that follows the curvature of the response measured on the
+previous run (e.g. around the corners of a filter), with a fraction of them
+spread uniformly so that nothing is missed if the response has changed."""
+
+import json
+import time
+from numpy import *
+import scpilog
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+enabled = True                  # Predict and check the time of every sweep
+history_file = '.planner.json'  # Actual/modelled time of previous sweeps
+probes = 3                      # *OPC? queries timed on each instrument
+uniform = 0.3                   # Fraction of the points placed uniformly
+n_min = 5                       # Fewest points fit() will plan
+
+latencies = {}                  # Round-trip time of each instrument (s)
+
+def load_history():
+    try:
+        with open(history_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_history(history):
+    try:
+        with open(history_file, 'w') as f:
+            json.dump(history, f, indent=1)
+    except OSError:
+        pass
+
+def sweep_key(test, measure):
+    """Identifies a sweep by its test (if any) and the quantities it measures."""
+    return '%s/%s' % ('' if (test is None) else test.name, ','.join(n for m in measure for n in m.names))
+
+def round_trip(inst):
+    """Returns the median *OPC? round-trip time (s) of 'inst'."""
+    if (inst is None):
+        return 0
+    if (inst.name not in latencies):
+        t = []
+        for k in range(probes):
+            t0 = time.perf_counter()
+            inst.query('*OPC?')
+            t.append(time.perf_counter() - t0)
+        latencies[inst.name] = median(t)
+    return latencies[inst.name]
+
+def backend_time(b, acq_time=0, averages=1):
+    """Modelled time (s) of one stimulus or measurement backend at a point."""
+    kind = type(b).__name__
+    if (kind == 'Commands'):
+        if (not any('%' in t for t in b.templates)):
+            return 0            # Sent once only
+        return round_trip(b.inst)
+    if (kind == 'Digitize'):
+        return round_trip(b.inst) + averages*acq_time
+    return round_trip(b.inst)
+
+def point_time(stimulus, measure, acquire=None, settle=0, pipelined=False,
+               acq_time=0, averages=1):
+    """Modelled time (s) of a point of a sweep with these backends, with
+    acquisitions of 'acq_time' seconds averaged 'averages' times."""
+    t_acq = 0 if (acquire is None) else backend_time(acquire, acq_time, averages)
+    t_meas = sum([backend_time(m) for m in measure])
+    if (not pipelined):
+        t_stim = sum([backend_time(s) for s in stimulus])
+        return t_stim + settle + t_acq + t_meas
+    # The stimulus of the next point and its settling time overlap the
+    # readback of this one (see pipeline.py)
+    inst = measure[0].inst
+    t_sync = sum([backend_time(s) for s in stimulus if (s.inst is inst)])
+    t_async = sum([backend_time(s) for s in stimulus if (s.inst is not inst)])
+    return t_acq + t_sync + (settle if (settle > t_meas + t_async) else t_meas + t_async)
+
+def correction(key):
+    """Ratio of the actual to the modelled time of previous runs of sweep 'key'."""
+    h = load_history().get(key)
+    return 1 if (h is None) else h['actual']/h['model']
+
+def predict(sweep, points):
+    """Prints the predicted time of 'points' points of 'sweep', and returns
+    the modelled time of a point (s), or 0 if the planner is not enabled."""
+    if (not enabled):
+        return 0
+    t_point = point_time(sweep.stimulus, sweep.measure, sweep.acquire, sweep.settle,
+                         sweep.pipelined, sweep.acq_time, sweep.averages)
+    c = correction(sweep_key(sweep.test, sweep.measure))
+    print('Predicted sweep time: %d points x %.3f s = %.1f s%s'
+          % (points, t_point*c, points*t_point*c,
+             '' if (c == 1) else ' (corrected from previous runs)'), flush=True)
+    return t_point
+
+def check(sweep, t_point, elapsed, points):
+    """Prints the actual time 'elapsed' of 'points' points of 'sweep'
+    against the prediction from the modelled time 't_point' of a point, and
+    keeps it for the next prediction (unless the session was replayed, and
+    so not timed by the bench; see scpilog.py)."""
+    if (points == 0 or t_point <= 0):
+        return
+    key = sweep_key(sweep.test, sweep.measure)
+    predicted = points*t_point*correction(key)
+    print('Sweep took %.1f s (predicted %.1f s, %+.0f%%)'
+          % (elapsed, predicted, 100*(elapsed/predicted - 1)))
+    if (scpilog.replay is not None):
+        return
+    history = load_history()
+    history[key] = {'model': t_point, 'actual': elapsed/points}
+    save_history(history)
+
+## Planning to a budget
+
+def previous(data_file, f):
+    """Returns the frequencies and response f(data, params) of the previous
+    run saved in 'data_file' (see render.py), or None if there is none."""
+    from render import load_data
+    try:
+        (data, params) = load_data(data_file)
+        (x, y) = (data[0], f(data, params))
+    except (OSError, ValueError, IndexError, KeyError):
+        return None
+    ok = isfinite(x) & isfinite(y)
+    return (x[ok], y[ok]) if (ok.sum() >= 3) else None
+
+def place(lo, hi, N, prior=None, log=False):
+    """Returns N points from 'lo' to 'hi', denser where the response 'prior'
+    (frequencies, values) curves most. Without a prior, the points are
+    uniform (in log scale if 'log')."""
+    if (log):
+        return 10**place(log10(lo), log10(hi), N, None if (prior is None) else
+                         (log10(prior[0]), prior[1]))
+    if (prior is None or N < 3):
+        return linspace(lo, hi, N)
+    g = linspace(lo, hi, 1000)
+    y = interp(g, *prior)
+    curv = sqrt(abs(gradient(gradient(y, g), g)))
+    density = uniform + (1 - uniform)*curv/(curv.mean() if (curv.mean() > 0) else 1)
+    cdf = concatenate(([0], cumsum((density[1:] + density[:-1])/2)))
+    return interp(linspace(0, cdf[-1], N), cdf, g)
+
+def fit(test, budget, lo, hi, N, stimulus, measure, acquire=None, settle=0,
+        pipelined=False, acq_time=0, max_averages=1, prior=None, log=False):
+    """Plans a sweep of at most N points from 'lo' to 'hi' to take 'budget'
+    seconds, with up to 'max_averages' averages (powers of 2) of acquisitions
+    of 'acq_time' seconds. Returns the points and the number of averages."""
+    c = correction(sweep_key(test, measure))
+    def t_point(averages):
+        return c*point_time(stimulus, measure, acquire, settle, pipelined, acq_time, averages)
+    n = N if (t_point(1) <= 0) else int(budget/t_point(1))
+    n = N if (n > N) else (n_min if (n < n_min) else n)
+    averages = 1
+    while (averages*2 <= max_averages and n*t_point(averages*2) <= budget):
+        averages *= 2
+    x = place(lo, hi, n, prior, log)
+    print('Plan for a %.0f s budget: %d points%s, %d average%s, predicted %.1f s'
+          % (budget, n, ', placed by the previous response' if (prior is not None) else '',
+             averages, '' if (averages == 1) else 's', n*t_point(averages)), flush=True)
+    return x, averages
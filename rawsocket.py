@@ -0,0 +1,196 @@
+"""Raw-socket SCPI transport.
+A lightweight replacement for pyvisa on the instruments reached through a
+plain TCP socket (TCPIP0::<host>::5025::SOCKET resources, i.e. the function
+generator and the power supply). Nagle's algorithm is disabled so that each
+query goes out at once, and responses are received into a reusable buffer.
+
+Commands sent with write() are coalesced: they are held for up to
+'coalesce_delay' seconds, or until the next read or query, and then sent
+together in one packet, so a burst of commands such as a setup block costs
+one round trip through the network stack instead of one per command.
+
+SocketResource provides the parts of the pyvisa resource interface used by
+the scripts: write(), read(), query(), read_bytes(),
+query_binary_values(), write_binary_values(), the terminations and the
+timeout (in ms). It also has read_into(), which receives a given number of
+bytes straight into a buffer supplied by the caller (see waveform.py)."""
+
+import socket
+import threading
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+coalesce_delay = 0.002          # Longest time a command is held back (s)
+coalesce_max = 4096             # Commands are sent once this many bytes are held
+buffer_size = 65536             # Size of the receive buffer (bytes)
+
+def parse_resource(resource):
+    """Returns the host and port of a TCPIP SOCKET resource string, or None
+    if 'resource' is not one."""
+    fields = resource.split('::')
+    if (len(fields) == 4 and fields[0].upper().startswith('TCPIP')
+        and fields[3].upper() == 'SOCKET'):
+        return fields[1], int(fields[2])
+    return None
+
+class SocketResource:
+    """SCPI instrument on TCP port 'port' of 'host'."""
+
+    def __init__(self, host, port, timeout=10000):
+        self.sock = socket.create_connection((host, port), timeout/1000)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.write_termination = '\n'
+        self.read_termination = '\n'
+        self.buf = bytearray(buffer_size)
+        self.view = memoryview(self.buf)
+        self.start = 0              # Received data not yet read is in
+        self.end = 0                # buf[start:end]
+        self.out = bytearray()      # Commands held back
+        self.lock = threading.Lock()
+        self.held = threading.Event()
+        self.closed = threading.Event()
+        threading.Thread(target=self.flusher, daemon=True).start()
+
+    @property
+    def timeout(self):
+        return self.sock.gettimeout()*1000
+
+    @timeout.setter
+    def timeout(self, ms):
+        self.sock.settimeout(ms/1000)
+
+    ## Writing
+
+    def flush(self):
+        """Sends the commands held back."""
+        with self.lock:
+            if (self.out):
+                self.sock.sendall(self.out)
+                self.out.clear()
+
+    def flusher(self):
+        while (not self.closed.is_set()):
+            self.held.wait()
+            self.held.clear()
+            self.closed.wait(coalesce_delay)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def write(self, cmd):
+        with self.lock:
+            self.out += (cmd + self.write_termination).encode()
+            full = len(self.out) >= coalesce_max
+        if (full):
+            self.flush()
+        else:
+            self.held.set()
+        return len(cmd)
+
+    def write_raw(self, data):
+        self.flush()
+        self.sock.sendall(data)
+
+    def write_binary_values(self, cmd, values, datatype='f', is_big_endian=False, **kw):
+        """Sends command 'cmd' followed by 'values' as a definite-length block."""
+        from numpy import asarray, dtype
+        data = asarray(values, dtype(('>' if (is_big_endian) else '<') + datatype)).tobytes()
+        n = b'%d' % (len(data))
+        self.write_raw(cmd.encode() + b'#%d' % (len(n)) + n + data
+                       + self.write_termination.encode())
+        return len(data)
+
+    ## Reading
+
+    def fill(self):
+        """Receives more data into the buffer."""
+        if (self.end == len(self.buf)):
+            # Move the unread data to the start, growing the buffer if full
+            n = self.end - self.start
+            if (n == len(self.buf)):
+                self.buf.extend(bytearray(len(self.buf)))
+                self.view = memoryview(self.buf)
+            self.buf[:n] = self.buf[self.start:self.end]
+            self.start, self.end = 0, n
+        n = self.sock.recv_into(self.view[self.end:])
+        if (n == 0):
+            raise ConnectionError('Connection closed by instrument')
+        self.end += n
+
+    def read_raw(self):
+        """Reads up to and including the read termination."""
+        self.flush()
+        term = self.read_termination.encode()
+        while True:
+            i = self.buf.find(term, self.start, self.end)
+            if (i >= 0):
+                data = bytes(self.view[self.start:i+len(term)])
+                self.start = i + len(term)
+                return data
+            self.fill()
+
+    def read(self):
+        return self.read_raw().decode()[:-len(self.read_termination)]
+
+    def query(self, cmd):
+        self.write(cmd)
+        return self.read()
+
+    def read_bytes(self, count, **kw):
+        self.flush()
+        data = bytearray()
+        while (len(data) < count):
+            if (self.start == self.end):
+                self.start = self.end = 0
+                self.fill()
+            n = min(count - len(data), self.end - self.start)
+            data += self.view[self.start:self.start+n]
+            self.start += n
+        return bytes(data)
+
+    def read_into(self, view):
+        """Reads len(view) bytes into the writable buffer 'view'. Only the
+        data already received is copied; the rest is received directly."""
+        self.flush()
+        view = memoryview(view).cast('B')
+        n = min(len(view), self.end - self.start)
+        view[:n] = self.view[self.start:self.start+n]
+        self.start += n
+        while (n < len(view)):
+            k = self.sock.recv_into(view[n:])
+            if (k == 0):
+                raise ConnectionError('Connection closed by instrument')
+            n += k
+        return n
+
+    def query_binary_values(self, cmd, datatype='f', is_big_endian=False,
+                            container=list, **kw):
+        """Reads the definite-length block returned by query 'cmd'."""
+        self.write(cmd)
+        head = self.read_bytes(2)
+        n = int(self.read_bytes(int(head[1:2])))
+        data = self.read_bytes(n)
+        self.read_bytes(len(self.read_termination))
+        if (container is bytes):
+            return data
+        from numpy import frombuffer, dtype
+        values = frombuffer(data, dtype(('>' if (is_big_endian) else '<') + datatype))
+        return container(values.tolist())
+
+    def clear(self):
+        """Discards any unread data."""
+        self.start = self.end = 0
+
+    def close(self):
+        try:
+            self.flush()
+        except OSError:
+            pass
+        self.closed.set()
+        self.held.set()
+        self.sock.close()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""Figure rendering for the subsystem test scripts.
+The test scripts only save their measurements (in the text files written
+with savetxt, plus a JSON file of plotting parameters alongside each one)
+and then hand over to this script, which draws the figures in a pool of
+worker processes. A figure is only redrawn if its data, its parameters, this
+script, metrics.py or the matplotlibrc file have changed since it was last
+drawn.
+
+Usage: python render.py [figure.png ...]
+With no arguments, every figure whose data file exists is (re)drawn."""
+
+import os
+import sys
+import json
+import hashlib
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from numpy import *
+from metrics import (dB, gain_dB, normalized_dB, conversion_gain_dB, balance_dB,
+                     rejection_dB, freq_error, intercept_dBm)
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+cache_file = '.render_cache.json'   # Content hashes of the figures drawn
+metrics_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics.py')
+
+def params_file(data_file):
+    return os.path.splitext(data_file)[0] + '.json'
+
+def save_params(data_file, **params):
+    """Saves the parameters needed to plot 'data_file', besides the data
+    itself, to a JSON file of the same name."""
+    with open(params_file(data_file), 'w') as f:
+        json.dump({k: asarray(v).tolist() for (k, v) in params.items()}, f)
+
+def load_data(data_file):
+    data = loadtxt(data_file)
+    try:
+        with open(params_file(data_file)) as f:
+            params = json.load(f)
+    except OSError:
+        params = {}
+    return data, params
+
+## Subsystem A
+
+def plot_bpf(ax, data, p):
+    freq, ampl_i, ampl_q = data
+    stim_ampl = asarray(p.get('stim_ampl', 50e-3))
+    ax.plot(freq/1e6, gain_dB(ampl_i, ampl_q, stim_ampl))
+    ax.set_xlabel('Frequency [MHz]');
+    ax.set_ylabel('Subsystem gain [dB]');
+    ax.grid(True)
+    ax.set_title('Frequency response of BPF')
+
+def plot_lpf(ax, data, p):
+    fm, ampl_i, ampl_q, phdiff = data
+    stim_ampl = asarray(p.get('stim_ampl', 50e-3))
+    ax.semilogx(fm, normalized_dB(gain_dB(ampl_i, ampl_q, stim_ampl)))
+    ax.set_xlabel('Message frequency [Hz]');
+    ax.set_ylabel('Normalized LPF transfer function [dB]');
+    ax.grid(True)
+    ax.set_title('Frequency response of LPF')
+
+def plot_iq_compare(ax, data, p):
+    fm, ampl_i, ampl_q, phdiff = data
+    stim_ampl = asarray(p.get('stim_ampl', 50e-3))
+    ax.semilogx(fm, conversion_gain_dB(ampl_i, stim_ampl))
+    ax.semilogx(fm, conversion_gain_dB(ampl_q, stim_ampl))
+    ax.set_xlabel('Message frequency [Hz]');
+    ax.set_ylabel('Conversion gain [dB]');
+    ax.legend(('I', 'Q'))
+    ax.grid(True)
+
+def plot_balance_ampl(ax, data, p):
+    fm, ampl_i, ampl_q, phdiff = data
+    ax.set_xlabel('Message frequency [Hz]')
+    ax.set_ylabel('Amplitude balance I/Q [dB]')
+    ax.semilogx(fm, balance_dB(ampl_i, ampl_q))
+    ax.grid(True)
+
+def plot_balance_phase(ax, data, p):
+    fm, ampl_i, ampl_q, phdiff = data
+    ax.set_xlabel('Message frequency [Hz]')
+    ax.set_ylabel('Phase shift between I and Q [deg]')
+    ax.semilogx(fm, phdiff)
+    ax.grid(True)
+    ax.set_ylim((-200, 200))
+
+## Subsystem B
+
+def plot_demod(ax, data, p):
+    freq, ampl_lsb, ampl_usb = data
+    ax.plot(freq/1e3, ampl_usb)
+    ax.plot(freq/1e3, ampl_lsb)
+    ax.set_xlabel('Frequency [kHz]');
+    ax.set_ylabel('Output amplitude [V]');
+    ax.grid(True)
+    ax.legend(('USB', 'LSB'))
+    ax.set_title('Frequency response of demodulator')
+
+def plot_rejection(ax, data, p):
+    freq, ampl_lsb, ampl_usb = data
+    #rej_lsb = 20*log10(ampl_lsb / ampl_usb)
+    rej_usb = rejection_dB(ampl_usb, ampl_lsb)
+    #ax.plot(freq/1e3, rej_lsb)
+    ax.plot(freq/1e3, rej_usb)
+    ax.set_xlabel('Frequency [kHz]');
+    ax.set_ylabel('Sideband rejection ratio [dB]');
+    ax.grid(True)
+    ax.set_title('SSB demodulation performance')
+
+## Subsystem C
+
+def plot_freq(ax, data, p):
+    freq, meas_freq_0, meas_freq_90 = data[:3]
+    ax.plot(freq/1e6, meas_freq_0/1e6)
+    ax.plot(freq/1e6, meas_freq_90/1e6)
+    ax.set_xlabel('Command frequency [MHz]');
+    ax.set_ylabel('Actual frequency [MHz]');
+    ax.grid(True)
+    ax.legend(('LO_0', 'LO_90'))
+    ax.set_title('Frequency output of Subsystem C')
+
+def plot_freq_error(ax, data, p):
+    freq, meas_freq_0, meas_freq_90 = data[:3]
+    freq_error_0 = freq_error(meas_freq_0, freq)
+    freq_error_90 = freq_error(meas_freq_90, freq)
+    ax.plot(freq/1e6, freq_error_0)
+    ax.plot(freq/1e6, freq_error_90)
+    ax.set_xlabel('Command frequency [MHz]');
+    ax.set_ylabel('Frequency error [Hz]');
+    ax.grid(True)
+    ax.legend(('LO_0', 'LO_90'))
+    ax.set_title('Frequency error of Subsystem C')
+
+def plot_phase(ax, data, p):
+    if (len(data) < 4):
+        raise ValueError('no phase in the data (measured before it was saved)')
+    freq, meas_freq_0, meas_freq_90, phdiff = data[:4]
+    ax.plot(freq/1e6, phdiff)
+    ax.set_xlabel('Command frequency [MHz]');
+    ax.set_ylabel('Phase shift [deg]');
+    ax.grid(True)
+    ax.set_title('Phase of Subsystem C')
+
+## Subsystem D
+
+def plot_mod_iq_compare(ax, data, p):
+    freq, ampl_i, ampl_q, phdiff = data
+    stim_ampl = asarray(p.get('stim_ampl', 0.316*sqrt(2)))
+    ax.plot(freq, conversion_gain_dB(ampl_i, stim_ampl))
+    ax.semilogx(freq, conversion_gain_dB(ampl_q, stim_ampl))
+    ax.set_xlabel('Message frequency [Hz]');
+    ax.set_ylabel('|I|, |Q| [dB]');
+    ax.legend(('I', 'Q'))
+    ax.grid(True)
+
+def plot_mod_balance_ampl(ax, data, p):
+    freq, ampl_i, ampl_q, phdiff = data
+    ax.set_xlabel('Message frequency [Hz]')
+    ax.set_ylabel('Amplitude balance I/Q [dB]')
+    ax.plot(freq, balance_dB(ampl_i, ampl_q))
+    ax.grid(True)
+
+def plot_mod_balance_phase(ax, data, p):
+    freq, ampl_i, ampl_q, phdiff = data
+    ax.set_xlabel('Message frequency [Hz]')
+    ax.set_ylabel('Phase shift between I and Q [deg]')
+    ax.plot(freq, phdiff)
+    ax.grid(True)
+    ax.set_ylim((-200, 200))
+
+## Subsystem F
+
+def plot_pout_dBW(ax, data, p):
+    freq, Prf = data
+    ax.plot(freq/1e6, dB(Prf))
+    ax.set_xlabel('Frequency [MHz]')
+    ax.set_ylabel('RF output power [dBW]')
+    ax.grid(True)
+    ax.set_title('PA Frequency Response for Vin = %.1f Vpp' % (p['drive_amplitude']))
+
+def plot_pout(ax, data, p):
+    freq, Prf = data
+    ax.plot(freq/1e6, Prf)
+    ax.set_xlabel('Frequency [MHz]')
+    ax.set_ylabel('RF output power [W]')
+    ax.set_yscale('log')
+    ax.set_ylim((1e-3, 10))
+    ax.grid(True)
+    ax.set_title('PA Frequency Response for Vin = %.1f Vpp' % (p['drive_amplitude']))
+
+def plot_spectrum(ax, data, p):
+    n, Pcoeffs = data
+    ax.stem(n, Pcoeffs)
+    ax.set_ylabel('RF output power [W]')
+    ax.set_yscale('log')
+    ax.grid(True)
+    ax.set_title('PA Output Spectrum: f = %.1f MHz, eff=%.1f %%, THD=%.1f %%' % (p['f0']/1e6, p['eff']*100, p['THD']*100))
+
+def plot_eff(ax, data, p):
+    freq, Idc, P1, eff, THD = data
+    ax.plot(freq/1e6, eff*100)
+    ax.set_xlabel('Frequency [MHz]')
+    ax.set_ylabel('DC-to-RF efficiency [%]')
+    ax.grid(True)
+    ax.set_title('PA Efficiency for Vin = %.1f Vpp' % (p['drive_amplitude']))
+
+def plot_thd(ax, data, p):
+    freq, Idc, P1, eff, THD = data
+    ax.plot(freq/1e6, THD*100)
+    ax.set_xlabel('Frequency [MHz]')
+    ax.set_ylabel('THD [%]')
+    ax.grid(True)
+    ax.set_title('PA Harmonic Distortion for Vin = %.1f Vpp' % (p['drive_amplitude']))
+
+## Two-tone intermodulation
+
+def plot_imd(ax, data, p):
+    level, Pin, Pout, P_im3, P_im5 = data
+    iip3, oip3 = intercept_dBm(Pin, Pout, P_im3)
+    ax.plot(Pin, Pout, 'o', label='Fundamental')
+    ax.plot(Pin, P_im3, 's', label='IM3')
+    ax.plot(Pin, P_im5, '^', label='IM5')
+    x = array([nanmin(Pin) - 10, iip3])
+    ax.plot(x, x + oip3 - iip3, 'C0--', lw=0.8)
+    ax.plot(x, 3*(x - iip3) + oip3, 'C1--', lw=0.8)
+    ax.set_xlabel('Input power per tone [dBm]')
+    ax.set_ylabel('Output power per tone [dBm]')
+    ax.legend()
+    ax.grid(True)
+    ax.set_title('Two-tone test at %.3f/%.3f MHz: IIP3 = %.1f dBm, OIP3 = %.1f dBm'
+                 % (p['f1']/1e6, p['f2']/1e6, iip3, oip3))
+
+# Figure name: (plotting function, data file)
+figures = {
+    'bpf.png': (plot_bpf, 'bpf.txt'),
+    'lpf.png': (plot_lpf, 'iq.txt'),
+    'iq_compare.png': (plot_iq_compare, 'iq.txt'),
+    'balance_ampl.png': (plot_balance_ampl, 'iq.txt'),
+    'balance_phase.png': (plot_balance_phase, 'iq.txt'),
+    'demod.png': (plot_demod, 'demod.txt'),
+    'rejection.png': (plot_rejection, 'demod.txt'),
+    'freq.png': (plot_freq, 'freq.txt'),
+    'freq_error.png': (plot_freq_error, 'freq.txt'),
+    'phase.png': (plot_phase, 'freq.txt'),
+    'mod_iq_compare.png': (plot_mod_iq_compare, 'mod_iq.txt'),
+    'mod_balance_ampl.png': (plot_mod_balance_ampl, 'mod_iq.txt'),
+    'mod_balance_phase.png': (plot_mod_balance_phase, 'mod_iq.txt'),
+    'pout_dBW.png': (plot_pout_dBW, 'pout.txt'),
+    'pout.png': (plot_pout, 'pout.txt'),
+    'spectrum.png': (plot_spectrum, 'spectrum.txt'),
+    'eff.png': (plot_eff, 'harmonics.txt'),
+    'thd.png': (plot_thd, 'harmonics.txt'),
+    'imd.png': (plot_imd, 'imd.txt'),
+}
+
+def figure_hash(name):
+    """Hash of everything that determines the content of figure 'name'."""
+    h = hashlib.sha1()
+    for path in (figures[name][1], params_file(figures[name][1]),
+                 os.path.abspath(__file__), metrics_file, 'matplotlibrc'):
+        try:
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        except OSError:
+            pass
+    return h.hexdigest()
+
+def draw(name):
+    """Draws figure 'name' (runs in a worker process). Returns None, or
+    the error that prevented it from being drawn, so that one bad data file
+    does not stop the other figures."""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.pyplot import subplots, close
+    plot, data_file = figures[name]
+    fig, ax = subplots()
+    try:
+        data, p = load_data(data_file)
+        plot(ax, data, p)
+        fig.savefig(name)
+    except Exception as e:
+        return '%s: %s' % (type(e).__name__, e)
+    finally:
+        close(fig)
+
+def render(names=None, workers=None):
+    """Draws the figures in 'names' (all figures with data if None) that
+    are out of date, in parallel."""
+    if (names is None):
+        names = [name for name in figures if os.path.exists(figures[name][1])]
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    hashes = {name: figure_hash(name) for name in names}
+    todo = [name for name in names
+            if (cache.get(name) != hashes[name] or not os.path.exists(name))]
+    failed = 0
+    if (len(todo) > 0):
+        with ProcessPoolExecutor(workers) as pool:
+            for (name, error) in zip(todo, pool.map(draw, todo)):
+                if (error is None):
+                    cache[name] = hashes[name]
+                    print('Saved', name, flush=True)
+                else:
+                    failed += 1
+                    print('Could not draw %s (%s)' % (name, error), flush=True)
+    print('%d figure(s) drawn, %d unchanged, %d failed.'
+          % (len(todo)-failed, len(names)-len(todo), failed))
+
+    with open(cache_file, 'w') as f:
+        json.dump(cache, f, indent=1)
+
+def render_figures(names, background=False):
+    """Called by the test scripts to draw 'names' once their data is saved.
+    The figures are drawn by a separate render.py process, so that the
+    worker processes never re-import the test script itself; with
+    'background' the script does not wait for it to finish."""
+    from timeline import span
+    cmd = [sys.executable, os.path.abspath(__file__)] + list(names)
+    with span('render', 'render_figures'):
+        if (background):
+            print('Drawing figures in the background.')
+            subprocess.Popen(cmd)
+        else:
+            subprocess.run(cmd)
+
+if __name__ == '__main__':
+    render(sys.argv[1:] if (len(sys.argv) > 1) else None)
@@ -0,0 +1,59 @@
+"""Range-aware ordering of sweep points.
+Over a sweep covering decades, changing the timebase or vertical range of
+the scope (which forces a fresh acquisition, and often a prompt to the
+operator) costs far more than changing frequency. Each point is given the
+instrument configuration it needs (e.g. its timebase, from timebase()), and
+schedule() orders the points so that each configuration is set up only
+once: the points are grouped by configuration, the groups are visited in
+sorted order so that consecutive configurations are close, and within a
+group the points are taken in increasing frequency, so that the generator
+moves in small steps. Sweep (see sweep.py) measures the points in this
+order but keeps the results in the order of the points, so they are
+saved and plotted as requested."""
+
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+def step_125(x):
+    """Returns the smallest value of the 1-2-5 sequence (e.g. of scope
+    timebases or vertical scales) that is at least 'x'."""
+    x = asarray(x, float)
+    decade = 10**floor(log10(x))
+    m = x/decade*(1 - 1e-9)
+    return decade*where(m <= 1, 1, where(m <= 2, 2, where(m <= 5, 5, 10)))
+
+def timebase(f, cycles=3, divisions=10):
+    """Timebase (s/div) that shows at least 'cycles' cycles of frequency 'f'."""
+    return step_125(cycles/(divisions*asarray(f, float)))
+
+def changes(configs, order):
+    """Number of times the configuration changes when the points are
+    measured in 'order'."""
+    c = [configs[k] for k in order]
+    return sum([1 for (a, b) in zip(c[:-1], c[1:]) if (a != b)])
+
+def schedule(configs, values=None):
+    """Returns the order in which to measure points that need the instrument
+    configurations 'configs' (numbers or tuples), with values 'values' (e.g.
+    frequencies; by default, their index), and the (start, stop) positions
+    in that order of each group of points sharing a configuration. Prints
+    the number of reconfigurations saved over measuring the points as given."""
+    configs = [tuple(c) if (ndim(c) > 0) else c for c in configs]
+    N = len(configs)
+    values = arange(N) if (values is None) else asarray(values)
+    order = sorted(range(N), key=lambda k: (configs[k], values[k]))
+    groups = []
+    start = 0
+    for i in range(1, N+1):
+        if (i == N or configs[order[i]] != configs[order[start]]):
+            groups.append((start, i))
+            start = i
+    (n_given, n_sched) = (changes(configs, range(N)), changes(configs, order))
+    print('Scheduled %d points in %d configurations: %d reconfigurations instead of %d (%d saved)'
+          % (N, len(groups), n_sched, n_given, n_given - n_sched), flush=True)
+    return array(order, int), groups
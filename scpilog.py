@@ -0,0 +1,266 @@
+"""SCPI session recording and replay.
+When the environment variable M3_RECORD is set to a file name, everything a
+test script exchanges with the bench is logged to that journal: every
+command sent to and response received from the VISA instruments and the CAT
+serial port, and every answer typed by the operator, each with its time
+stamp. When M3_REPLAY is set to a journal file instead, no instruments are
+opened: the recorded responses are served back to the (unmodified) script
+in order, so a bench session can be re-run and re-analyzed anywhere. With
+M3_REPLAY_TIMING=recorded each response is delayed until the time at which
+it originally arrived; by default the session is replayed as fast as
+possible, and time.sleep() calls are skipped.
+
+The journal is a gzip-compressed file with one JSON list per line:
+[time (s), device, operation, argument, result]."""
+
+import os
+import sys
+import json
+import gzip
+import time
+import base64
+import builtins
+import threading
+from collections import deque
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+journal = None                  # Journal being recorded, if any
+replay = None                   # Session being replayed, if any
+
+class ReplayError(Exception):
+    """The script did something different from the recorded session."""
+
+def encode(x):
+    if (isinstance(x, (bytes, bytearray))):
+        return {'b': base64.b64encode(x).decode()}
+    if (hasattr(x, 'tolist')):
+        return x.tolist()
+    return x
+
+def decode(x):
+    if (isinstance(x, dict) and 'b' in x):
+        return base64.b64decode(x['b'])
+    return x
+
+class Journal:
+    def __init__(self, path):
+        self.f = gzip.open(path, 'wt')
+        self.t0 = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def log(self, dev, op, arg, result=None):
+        t = round(time.perf_counter() - self.t0, 6)
+        line = json.dumps([t, dev, op, encode(arg), encode(result)])
+        with self.lock:
+            self.f.write(line + '\n')
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+class Replay:
+    def __init__(self, path, timing='fast'):
+        self.queues = {}
+        with gzip.open(path, 'rt') as f:
+            for line in f:
+                (t, dev, op, arg, result) = json.loads(line)
+                self.queues.setdefault(dev, deque()).append((t, op, decode(arg), decode(result)))
+        self.timing = timing
+        self.t0 = time.perf_counter()
+
+    def next(self, dev, op, arg):
+        """Returns the recorded result of the next operation on 'dev', which
+        must be 'op' with argument 'arg'."""
+        try:
+            (t, rec_op, rec_arg, result) = self.queues[dev].popleft()
+        except (KeyError, IndexError):
+            raise ReplayError('%s: no recorded response left for %s %r' % (dev, op, arg))
+        if (rec_op != op or (arg is not None and rec_arg != arg)):
+            raise ReplayError('%s: script sent %s %r, session recorded %s %r'
+                              % (dev, op, arg, rec_op, rec_arg))
+        if (self.timing == 'recorded'):
+            wait = self.t0 + t - time.perf_counter()
+            if (wait > 0):
+                real_sleep(wait)
+        return result
+
+## VISA instruments
+
+class RecordingResource:
+    """Passes operations through to the pyvisa resource 'inst', logging them."""
+
+    def __init__(self, inst, dev):
+        self.inst = inst
+        self.dev = dev
+
+    def write(self, cmd):
+        r = self.inst.write(cmd)
+        journal.log(self.dev, 'w', cmd)
+        return r
+
+    def read(self):
+        r = self.inst.read()
+        journal.log(self.dev, 'r', None, r)
+        return r
+
+    def query(self, cmd):
+        r = self.inst.query(cmd)
+        journal.log(self.dev, 'q', cmd, r)
+        return r
+
+    def read_bytes(self, count, **kw):
+        r = self.inst.read_bytes(count, **kw)
+        journal.log(self.dev, 'rb', count, r)
+        return r
+
+    def read_into(self, view):
+        import waveform
+        n = waveform.read_into(self.inst, view)
+        journal.log(self.dev, 'rb', len(view), bytes(view[:n]))
+        return n
+
+    def query_binary_values(self, cmd, **kw):
+        r = self.inst.query_binary_values(cmd, **kw)
+        journal.log(self.dev, 'qb', cmd, r)
+        return r
+
+    def write_binary_values(self, cmd, values, **kw):
+        r = self.inst.write_binary_values(cmd, values, **kw)
+        journal.log(self.dev, 'wb', cmd)
+        return r
+
+    def __getattr__(self, attr):
+        return getattr(self.inst, attr)
+
+class ReplayResource:
+    """Stands in for the pyvisa resource of 'dev', serving recorded responses."""
+
+    def __init__(self, dev):
+        self.dev = dev
+
+    def write(self, cmd):
+        replay.next(self.dev, 'w', cmd)
+
+    def read(self):
+        return replay.next(self.dev, 'r', None)
+
+    def query(self, cmd):
+        return replay.next(self.dev, 'q', cmd)
+
+    def read_bytes(self, count, **kw):
+        return replay.next(self.dev, 'rb', count)
+
+    def read_into(self, view):
+        r = replay.next(self.dev, 'rb', len(view))
+        view[:len(r)] = r
+        return len(r)
+
+    def query_binary_values(self, cmd, container=list, **kw):
+        r = replay.next(self.dev, 'qb', cmd)
+        return container(r)
+
+    def write_binary_values(self, cmd, values, **kw):
+        replay.next(self.dev, 'wb', cmd)
+
+    def close(self):
+        pass
+
+## CAT serial port
+
+def recording_serial(Serial):
+    """Returns a subclass of pyserial's Serial that logs reads and writes."""
+    class RecordingSerial(Serial):
+        def write(self, data):
+            r = Serial.write(self, data)
+            journal.log('serial', 'sw', bytes(data))
+            return r
+
+        def readline(self, *args):
+            r = Serial.readline(self, *args)
+            journal.log('serial', 'sr', None, r)
+            return r
+
+        def read(self, size=1):
+            r = Serial.read(self, size)
+            journal.log('serial', 'sr', None, r)
+            return r
+    return RecordingSerial
+
+class SerialException(IOError):
+    pass
+
+class ReplaySerial:
+    """Stands in for pyserial's Serial, serving recorded responses."""
+
+    def __init__(self, port=None, baudrate=9600, timeout=None, **kw):
+        self.port = port
+        self.is_open = True
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def write(self, data):
+        replay.next('serial', 'sw', bytes(data))
+        return len(data)
+
+    def readline(self, *args):
+        return replay.next('serial', 'sr', None)
+
+    def read(self, size=1):
+        return replay.next('serial', 'sr', None)
+
+class ReplaySerialModule:
+    """Replaces the serial module during replay, so pyserial is not needed."""
+    Serial = ReplaySerial
+    SerialException = SerialException
+
+    @staticmethod
+    def to_bytes(seq):
+        return bytes(seq)
+
+## Operator input
+
+real_input = builtins.input
+real_sleep = time.sleep
+
+def recording_input(prompt=''):
+    answer = real_input(prompt)
+    journal.log('operator', 'input', prompt, answer)
+    return answer
+
+def replay_input(prompt=''):
+    answer = replay.next('operator', 'input', prompt)
+    print(prompt + answer)
+    return answer
+
+def start():
+    """Starts recording or replay according to the environment."""
+    global journal, replay
+    if (os.environ.get('M3_REPLAY')):
+        replay = Replay(os.environ['M3_REPLAY'], os.environ.get('M3_REPLAY_TIMING', 'fast'))
+        builtins.input = replay_input
+        sys.modules['serial'] = ReplaySerialModule
+        if (replay.timing != 'recorded'):
+            time.sleep = lambda t: None
+        print('Replaying session', os.environ['M3_REPLAY'], flush=True)
+    elif (os.environ.get('M3_RECORD')):
+        import atexit
+        journal = Journal(os.environ['M3_RECORD'])
+        atexit.register(journal.close)
+        builtins.input = recording_input
+        try:
+            import serial
+            serial.Serial = recording_serial(serial.Serial)
+        except ImportError:
+            pass
+        print('Recording session to', os.environ['M3_RECORD'], flush=True)
+
+start()
@@ -0,0 +1,189 @@
+"""Saved instrument setup profiles.
+The first time a script configures an instrument, the explicit list of setup
+commands is sent and the resulting instrument state is captured and stored on
+disk under the name of the subsystem test. On later runs the stored state is
+restored in a single transfer instead of sending the commands one at a time.
+If the profile is stale (the command list has changed, it was captured on a
+different instrument, it is too old, or the instrument rejects it), the
+explicit command list is sent again and the profile is re-captured.
+
+The scope learn block holds the entire state of the scope, so the scope is
+reset (*RST) before the commands are sent. The profile then holds only the
+state the commands define, not whatever earlier runs or the front panel
+left on the scope.
+
+Three capture methods are supported:
+- 'setup': binary learn block from :SYSTem:SETup? (InfiniiVision scopes);
+- 'lrn': ASCII learn string from *LRN? (33500 series generators);
+- 'sav': state saved in the instrument itself with *SAV/*RCL.
+
+The memory slots of an instrument are shared by every test that runs on it,
+so each 'sav' profile claims a slot of its own, recorded in 'slots.json' in
+'profile_dir'. A slot is only taken over from another profile once that
+profile is too old to be recalled, and a profile is only recalled from a
+slot it still owns.
+
+While a session is recorded or replayed (see scpilog.py), profiles are
+neither recalled nor saved, and the command list is always sent, so that
+what is exchanged with the instruments does not depend on the profiles
+stored on the machine."""
+
+import os
+import json
+import time
+import hashlib
+import scpilog
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+profile_dir = 'setups'          # Directory where profiles are stored
+max_age = 7*24*3600             # Profiles older than this (s) are re-captured
+sav_slots = range(1, 5)         # Memory slots available for 'sav' profiles
+
+def profile_path(test, name):
+    """Returns the path of the profile for instrument 'name' in 'test',
+    without an extension."""
+    return os.path.join(profile_dir, test, name)
+
+def slots_path():
+    return os.path.join(profile_dir, 'slots.json')
+
+def read_slots():
+    """Returns the owners of the memory slots used for 'sav' profiles, as
+    {instrument id: {slot: 'test/name'}}."""
+    try:
+        with open(slots_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def released(owner):
+    """Checks whether profile 'owner' ('test/name') is missing or too old
+    to be recalled, so that its slot can be reused."""
+    try:
+        with open(profile_path(*owner.split('/', 1)) + '.json') as f:
+            return time.time() - json.load(f)['time'] > max_age
+    except (OSError, ValueError, KeyError, TypeError):
+        return True
+
+def claim_slot(inst_id, test, name, slot=None):
+    """Claims a memory slot of instrument 'inst_id' for the profile of
+    'name' in 'test': 'slot' if given, or else the slot the profile already
+    owns, or a free one. Returns the slot, or None if it is owned by another
+    profile (or none is free)."""
+    owner = test + '/' + name
+    slots = read_slots()
+    owners = slots.setdefault(inst_id, {})
+    if (slot is None):
+        mine = [int(s) for (s, o) in owners.items() if (o == owner)]
+        free = [s for s in sav_slots if (str(s) not in owners or released(owners[str(s)]))]
+        slot = (mine + free + [None])[0]
+    if (slot is None or (owners.get(str(slot), owner) != owner
+                         and not released(owners[str(slot)]))):
+        return None
+    owners[str(slot)] = owner
+    os.makedirs(profile_dir, exist_ok=True)
+    with open(slots_path(), 'w') as f:
+        json.dump(slots, f, indent=1)
+    return slot
+
+def command_hash(commands):
+    return hashlib.sha1('\n'.join(commands).encode()).hexdigest()
+
+def instrument_id(inst):
+    """Returns the model and serial number fields of *IDN?."""
+    return ','.join(inst.query('*IDN?').strip().split(',')[1:3])
+
+def send_setup(inst, commands):
+    for cmd in commands:
+        inst.write(cmd)
+
+def no_error(inst):
+    """Checks that the instrument error queue is empty."""
+    err = inst.query(':SYSTem:ERRor?').strip()
+    return err.startswith('+0') or err.startswith('0')
+
+def save_setup(inst, test, name, commands, method='lrn', slot=None):
+    """Captures the current state of 'inst' and stores it as the profile
+    for 'commands'. With method 'sav', the state is saved in memory slot
+    'slot' (by default, one claimed with claim_slot()); if that slot belongs
+    to another profile, no profile is stored."""
+    path = profile_path(test, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if (os.path.exists(path + '.json')):
+        os.remove(path + '.json')
+    if (method == 'setup'):
+        state = inst.query_binary_values(':SYSTem:SETup?', datatype='B',
+                                         container=bytes)
+        with open(path + '.bin', 'wb') as f:
+            f.write(state)
+    elif (method == 'lrn'):
+        state = inst.query('*LRN?').strip()
+        with open(path + '.lrn', 'w') as f:
+            f.write(state)
+    elif (method == 'sav'):
+        slot = claim_slot(instrument_id(inst), test, name, slot)
+        if (slot is None):
+            print('No free memory slot for the %s profile, not saved.' % (name), flush=True)
+            return
+        inst.write('*SAV %d' % (slot))
+    else:
+        raise ValueError('Unknown setup capture method: ' + method)
+    meta = {'id': instrument_id(inst), 'hash': command_hash(commands),
+            'method': method, 'slot': slot, 'time': time.time()}
+    with open(path + '.json', 'w') as f:
+        json.dump(meta, f, indent=1)
+
+def recall_setup(inst, test, name, commands):
+    """Restores the stored profile for 'commands' in one transfer.
+    Returns False if there is no usable profile."""
+    path = profile_path(test, name)
+    try:
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        if (meta['hash'] != command_hash(commands)
+            or time.time() - meta['time'] > max_age
+            or meta['id'] != instrument_id(inst)
+            or meta['method'] not in ('setup', 'lrn', 'sav')):
+            return False
+        if (meta['method'] == 'sav'
+            and read_slots().get(meta['id'], {}).get(str(meta['slot'])) != test + '/' + name):
+            return False
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+    try:
+        inst.write('*CLS')
+        if (meta['method'] == 'setup'):
+            with open(path + '.bin', 'rb') as f:
+                state = f.read()
+            inst.write_binary_values(':SYSTem:SETup ', state, datatype='B')
+        elif (meta['method'] == 'lrn'):
+            with open(path + '.lrn') as f:
+                inst.write(f.read())
+        else:
+            inst.write('*RCL %d' % (meta['slot']))
+        return no_error(inst)
+    except OSError:
+        return False
+
+def load_setup(inst, test, name, commands, method='lrn', slot=None):
+    """Puts 'inst' in the state defined by the list of 'commands', either by
+    recalling the stored profile or, if it is stale, by sending the commands
+    explicitly (after a reset, for a scope learn block) and capturing a new
+    profile."""
+    use_profiles = (scpilog.journal is None and scpilog.replay is None)
+    if (use_profiles and recall_setup(inst, test, name, commands)):
+        print('Restored %s setup from profile.' % (name), flush=True)
+        return
+    inst.write('*CLS')
+    if (method == 'setup'):
+        inst.write('*RST')
+        inst.query('*OPC?')
+    send_setup(inst, commands)
+    if (use_profiles):
+        save_setup(inst, test, name, commands, method, slot)
@@ -0,0 +1,137 @@
+"""Specification mask checking.
+A test declares the limits its measurements must satisfy as a list of
+Limit objects. Each measured point is checked against its limits as soon as
+it is taken, and whole arrays of saved data can be checked at once when
+re-analyzing. If abort is enabled, the sweep is stopped as soon as failure is
+certain (i.e. a limit has failed at more points than it allows), so that a
+failing board does not use up any more bench time. At the end of the run,
+the verdict is written to '<test>_verdict.json'."""
+
+import json
+import time
+import threading
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+def json_num(x):
+    """Converts nan to None so that the verdict file is valid JSON."""
+    return None if isnan(x) else float(x)
+
+class Limit:
+    """Limit on quantity 'name': lo <= value <= hi for points whose
+    frequency lies between fmin and fmax. Up to 'allowed' points may fail
+    before the limit as a whole is considered to have failed."""
+
+    def __init__(self, name, lo=-inf, hi=inf, fmin=-inf, fmax=inf,
+                 allowed=0, units=''):
+        self.name = name
+        self.lo = lo
+        self.hi = hi
+        self.fmin = fmin
+        self.fmax = fmax
+        self.allowed = allowed
+        self.units = units
+
+    def describe(self):
+        if (self.lo > -inf and self.hi < inf):
+            return '%g to %g %s' % (self.lo, self.hi, self.units)
+        elif (self.lo > -inf):
+            return '>= %g %s' % (self.lo, self.units)
+        return '<= %g %s' % (self.hi, self.units)
+
+    def applies(self, f):
+        return (f >= self.fmin) & (f <= self.fmax)
+
+    def passes(self, value):
+        """Vectorized check; nan values (failed readings) do not pass."""
+        value = asarray(value, float)
+        return (value >= self.lo) & (value <= self.hi)
+
+class SpecMask:
+    """Set of limits for subsystem test 'test'. If 'abort' is True,
+    'on_abort' is called (after writing the verdict) once any limit is
+    certain to fail. Checks made on another thread (e.g. the analysis of a
+    pipelined sweep) only record the failure, and the abort is left to the
+    main thread, which calls poll() between points."""
+
+    def __init__(self, test, limits, abort=False, on_abort=None):
+        self.test = test
+        self.limits = limits
+        self.abort = abort
+        self.on_abort = on_abort
+        self.results = [{'checked': 0, 'failed': []} for lim in limits]
+        self.pending = False
+
+    def check(self, name, value, f=nan):
+        """Checks a single 'value' of quantity 'name' measured at frequency
+        'f'. Returns True if it is within all limits that apply."""
+        ok = True
+        for lim, res in zip(self.limits, self.results):
+            if (lim.name != name or not (isnan(f) or lim.applies(f))):
+                continue
+            res['checked'] += 1
+            if (not lim.passes(value)):
+                ok = False
+                res['failed'].append((json_num(f), json_num(value)))
+                where = '' if isnan(f) else ' at f=%g Hz' % (f)
+                print('  SPEC FAIL: %s = %g%s (limit %s)' % (name, value, where, lim.describe()))
+        if (not ok and self.abort and self.failed()):
+            self.pending = True
+            if (threading.current_thread() is threading.main_thread()):
+                self.poll()
+        return ok
+
+    def poll(self):
+        """Aborts the test if a check has found that failure is certain."""
+        if (self.pending):
+            self.pending = False
+            print('Failure is certain; aborting test.')
+            print('Overall spec mask result:', self.verdict())
+            if (self.on_abort is not None):
+                self.on_abort()
+
+    def record(self, name, ok):
+        """Records the outcome of a pass/fail check that has no numeric value,
+        to be declared as Limit(name, lo=1)."""
+        return self.check(name, 1.0 if ok else 0.0)
+
+    def check_array(self, name, values, f=None):
+        """Vectorized check of a whole array of 'values' (with frequencies 'f')
+        of quantity 'name', e.g. when re-analyzing saved data. Returns a
+        boolean array which is True where the values are within limits."""
+        values = asarray(values, float)
+        f = full(values.shape, nan) if (f is None) else asarray(f, float)
+        ok = ones(values.shape, bool)
+        for lim, res in zip(self.limits, self.results):
+            if (lim.name != name):
+                continue
+            sel = isnan(f) | lim.applies(f)
+            bad = sel & ~lim.passes(values)
+            res['checked'] += int(count_nonzero(sel))
+            res['failed'] += [(json_num(a), json_num(b)) for a, b in zip(f[bad], values[bad])]
+            ok &= ~bad
+        return ok
+
+    def failed(self):
+        return any([len(res['failed']) > lim.allowed
+                    for lim, res in zip(self.limits, self.results)])
+
+    def verdict(self):
+        """Writes the verdict to '<test>_verdict.json' and returns the overall
+        result ('PASS' or 'FAIL')."""
+        limits = []
+        for lim, res in zip(self.limits, self.results):
+            limits.append({'name': lim.name, 'limit': lim.describe(),
+                           'checked': res['checked'],
+                           'failed': res['failed'],
+                           'pass': len(res['failed']) <= lim.allowed})
+        result = 'FAIL' if self.failed() else 'PASS'
+        with open(self.test + '_verdict.json', 'w') as f:
+            json.dump({'test': self.test, 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'result': result, 'limits': limits}, f, indent=1)
+        return result
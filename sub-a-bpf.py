@@ -2,11 +2,13 @@
 """Subsystem A unit testing script.
 This script measures the frequency response of the pre-mixer BPF."""
 
-import pyvisa
-import time
+from sweep import Test, Sweep, Commands, Query, Digitize
 from numpy import *
-from matplotlib.pyplot import *
-import sys
+from render import render_figures
+from metrics import gain_dB
+from liveview import LiveView
+from fixturecal import stimulus_ampl, reference_setup
+import planner
 
 __author__ = 'Sean Victor Hum'
 __copyright__ = 'Copyright 2023'
@@ -14,83 +16,57 @@ __license__ = 'GPL'
 __version__ = '1.0'
 __email__ = 'sean.hum@utoronto.ca'
 
-def user_prompt():
-    str = input('Hit Enter to proceed or ! to abort:')
-    if (str == '!'):
-        print('Measurement aborted')
-        user_abort()
-
-def user_abort():
-        scope.write(':WGEN:OUTP OFF')
-        fxngen.write('OUTPut1 OFF')
-        fxngen.write('OUTPut2 OFF')
-        scope.close()
-        fxngen.close()
-        sys.exit(0)
-        
-# Open instrument connection(s)
-rm = pyvisa.ResourceManager()
+# Open instrument connection(s). Each instrument is connected the first
+# time it is used (see bench.py).
 school_ip = True
 #school_ip = False
-if (school_ip):
-    scope = rm.open_resource('TCPIP0::192.168.0.253::hislip0::INSTR')
-    fxngen = rm.open_resource('TCPIP0::192.168.0.254::5025::SOCKET')
-else:
-    scope = rm.open_resource('TCPIP0::192.168.2.253::hislip0::INSTR')
-    fxngen = rm.open_resource('TCPIP0::192.168.2.254::5025::SOCKET')
-
-# Define string terminations and timeouts
-scope.write_termination = '\n'
-scope.read_termination = '\n'
-fxngen.write_termination = '\n'
-fxngen.read_termination = '\n'
-scope.timeout = 10000           # 10s
-fxngen.timeout = 10000          # 10s
-
-# Get ID info
-scope_id = scope.query('*IDN?').strip().split(',')
-fxngen_id = fxngen.query('*IDN?').strip().split(',')
-print('Connected to oscilloscope:', scope_id[1], flush=True)
-print('Connected to function generator:', fxngen_id[1], flush=True)
-
-# Set probe scaling to 1:1
-scope.write('CHANnel1:PROBe +1.0')
-scope.write('CHANnel2:PROBe +1.0')
-
-# Setup trigger
-scope.write(':TRIG:SWEep AUTO')
-scope.write(':TRIG:EDGE:SOURce CHAN1')
-scope.write(':TRIG:EDGE:LEVel +0.0')
+test = Test('sub-a-bpf', school_ip, 'scope', 'fxngen',
+            off=[('scope', ':WGEN:OUTP OFF'), ('fxngen', 'OUTPut1 OFF'), ('fxngen', 'OUTPut2 OFF')])
+scope, fxngen = test['scope'], test['fxngen']
+
+scope_setup = [
+    # Set probe scaling to 1:1
+    'CHANnel1:PROBe +1.0',
+    'CHANnel2:PROBe +1.0',
+    # Both channels on (a reset leaves only CH1 on)
+    'CHANnel1:DISPlay ON',
+    'CHANnel2:DISPlay ON',
+    # Setup trigger
+    ':TRIG:SWEep AUTO',
+    ':TRIG:EDGE:SOURce CHAN1',
+    ':TRIG:EDGE:LEVel +0.0',
+]
+test.setup('scope', scope_setup, method='setup')
 
 #print('Trigger:', scope.query(':TRIG?'), flush=True)
 
-print('Connect your subsystem as shown in the wiring diagram and power it on.')
-print('Make sure you have de-asserted the /TXEN line (set it high)!')
-user_prompt()
+test.prompt('Connect your subsystem as shown in the wiring diagram and power it on.',
+            'Make sure you have de-asserted the /TXEN line (set it high)!')
 
 # Setup function generator on scope as stimulus
 scope.write(':WGEN:FUNC SIN')
 scope.write(':WGEN:OUTP ON')
 
-# Set waveform generator output impedance to high Z
-fxngen.write('OUTPUT1:LOAD INF')
-fxngen.write('OUTPUT2:LOAD INF')
-fxngen.write('UNIT:ANGL DEG')
-
-# Setup waveform generator
-fxngen.write('SOUR1:FUNCtion SIN')
-fxngen.write('SOUR1:VOLTage:HIGH +3.3')
-fxngen.write('SOUR1:VOLTage:LOW +0.0')
-fxngen.write('SOUR1:PHASe:SYNC')
-fxngen.write('SOUR1:PHASe +0.0')
-fxngen.write('OUTPut1 ON')
-
-fxngen.write('SOUR2:FUNCtion SIN')
-fxngen.write('SOUR2:VOLTage:HIGH +3.3')
-fxngen.write('SOUR2:VOLTage:LOW +0.0')
-fxngen.write('SOUR2:PHASe:SYNC')
-fxngen.write('SOUR2:PHASe -9.0E+01')
-fxngen.write('OUTPut2 ON')
+fxngen_setup = [
+    # Set waveform generator output impedance to high Z
+    'OUTPUT1:LOAD INF',
+    'OUTPUT2:LOAD INF',
+    'UNIT:ANGL DEG',
+    # Setup waveform generator
+    'SOUR1:FUNCtion SIN',
+    'SOUR1:VOLTage:HIGH +3.3',
+    'SOUR1:VOLTage:LOW +0.0',
+    'SOUR1:PHASe:SYNC',
+    'SOUR1:PHASe +0.0',
+    'OUTPut1 ON',
+    'SOUR2:FUNCtion SIN',
+    'SOUR2:VOLTage:HIGH +3.3',
+    'SOUR2:VOLTage:LOW +0.0',
+    'SOUR2:PHASe:SYNC',
+    'SOUR2:PHASe -9.0E+01',
+    'OUTPut2 ON',
+]
+test.setup('fxngen', fxngen_setup)
 
 # Setup acquisition
 scope.write(':TIMebase:SCAL +5.0E-04') # 500 us/div
@@ -103,62 +79,94 @@ freq = arange(N)/(N-1)*16e6 + 4e6
 offset = 1e3                    # Offset between RF and LO frequencies
 input_ampl = 50e-3              # Amplitude of wave generator output
 
+# The stimulus can be teed to a spare scope channel and measured in the same
+# acquisition as the outputs, so that the gain at each point is a ratio of
+# measured amplitudes rather than relative to 'input_ampl' (see fixturecal.py)
+ref_chan = None                 # Scope channel the stimulus is teed to, or None
+#ref_chan = 3
+
+# With a time budget, the number and placement of the frequency points and
+# the scope averaging are chosen to fit it (see planner.py)
+time_budget = None              # Sweep time (s), or None to measure 'freq'
+#time_budget = 60
+max_averages = 16               # Most averages per point (pipelined sweeps)
+
 # Set up instruments for first frequency point
 fxngen.write('SOUR1:FREQuency %e' % (14e6))
 fxngen.write('SOUR2:FREQuency %e' % (14e6))
 scope.write(':WGEN:FREQ %e' % (14e6+offset))
 scope.write(':WGEN:volt %e' % (input_ampl))
+if (ref_chan is not None):
+    scope.write(reference_setup(ref_chan, input_ampl))
+
+test.prompt('Adjust the timebase and triggering so the signals are stable.',
+            'Adjust the voltage scale on CH1 and CH2 so they are identical',
+            'and the 2 signals occupy most of the screen.')
+test.check_scales()
+
+# In a pipelined sweep, the function generator is moved on to the next
+# frequency while the results of the current point are read back from a
+# single acquisition (see pipeline.py).
+pipelined = True
+#pipelined = False
+
+# The RF and LO frequencies are stepped in tandem (see sweep.py)
+stimulus = [Commands(fxngen, 'SOUR1:FREQuency %e', 'SOUR2:FREQuency %e'),
+            Commands(scope, ':WGEN:FREQ %e', offset=offset)]
+measure = [Query(scope, ':MEAS:VPP? CHAN1', 'ampl_i'),
+           Query(scope, ':MEAS:VPP? CHAN2', 'ampl_q')]
+acquire = None
+if (ref_chan is not None):
+    # A single acquisition per point, so the stimulus is measured with the outputs
+    measure.append(Query(scope, ':MEAS:VPP? CHAN%d' % (ref_chan), 'ampl_ref'))
+    acquire = Digitize(scope)
+settle = 0.5
+acq_time = 10*2e-4              # One acquisition at the sweep timebase
+averages = 1
+if (time_budget is not None):
+    # Denser where the response of the previous run curves most
+    prior = planner.previous('bpf.txt', lambda d, p: gain_dB(d[1], d[2], asarray(p.get('stim_ampl', input_ampl))))
+    (freq, averages) = planner.fit(test, time_budget, freq[0], freq[-1], N, stimulus, measure,
+                                   Digitize(scope) if (pipelined) else acquire, settle, pipelined,
+                                   acq_time, max_averages if (pipelined) else 1, prior)
+if (averages > 1):
+    scope.write(':ACQuire:TYPE AVERage;:ACQuire:COUNt %d' % (averages))
 
 print('The following frequency points will be measured:', freq)
 
-# Initialize vectors for storing data
-ampl_i = zeros(N, float)
-ampl_q = zeros(N, float)
-#phdiff = zeros(N, float)
-
-print('Adjust the timebase and triggering so the signals are stable.')
-print('Adjust the voltage scale on CH1 and CH2 so they are identical')
-print('and the 2 signals occupy most of the screen.')
-user_prompt()
+live_view = False               # Show the curves live as they are measured
+#live_view = True
+view = LiveView('Frequency response of BPF', freq/1e6, ['Gain'],
+                'Frequency [MHz]', 'Subsystem gain [dB]', enabled=live_view)
 
-# Check the scale is identical on both channels
-scale1 = scope.query(':CHAN1:SCAL?')
-scale2 = scope.query(':CHAN2:SCAL?')
+# Stimulus amplitude at each point, from the fixture calibration if there is
+# one (see fixturecal.py), unless the stimulus is measured on 'ref_chan'
+if (ref_chan is None):
+    stim_cal = stimulus_ampl(freq+offset, input_ampl, scope.idn)
+else:
+    stim_cal = full(len(freq), input_ampl)
 
-if (scale1 != scale2):
-    print('The scales of the 2 channels do not match.')
-    user_abort()
+sweep = Sweep(test, freq, stimulus, measure, acquire=acquire, axes={'stim_cal': stim_cal},
+              settle=settle, pipelined=pipelined, acq_time=acq_time, averages=averages,
+              derived={'MHz': lambda p: p['x']/1e6,
+                       'stim': lambda p: p['stim_cal'] if (ref_chan is None) else p['ampl_ref'],
+                       'gain': lambda p: gain_dB(p['ampl_i'], p['ampl_q'], p['stim'])},
+              report='Frequency point %(n)d/%(N)d, f=%(MHz).2f MHz: %(ampl_i)f %(ampl_q)f',
+              view=view, plot=['gain'])
 
 # Frequency sweep loop
 scope.write(':TIMebase:SCAL +2.0E-04') 
-for k in range(N):
-    fxngen.write('SOUR1:FREQuency %e' % freq[k])
-    fxngen.write('SOUR2:FREQuency %e' % freq[k])
-    scope.write(':WGEN:FREQ %e' % (freq[k]+offset))
-    time.sleep(0.5)
-    #scope.write(':SINGle')
-    ampl_i[k] = float(scope.query(':MEAS:VPP? CHAN1'))
-    ampl_q[k] = float(scope.query(':MEAS:VPP? CHAN2'))
-    #phdiff[k] = float(scope.query(':MEAS:PHASe? CHAN1'))
-    print('Frequency point %d/%d, f=%.2f MHz: %f %f' % (k+1, N, freq[k]/1e6, ampl_i[k], ampl_q[k]))
+sweep.run()
+if (averages > 1):
+    scope.write(':ACQuire:TYPE NORMal')
 
 print('Done')
+sweep.close()
+test.finish()
     
-scope.write(':WGEN:OUTP OFF')
-fxngen.write('OUTPut1 OFF')
-fxngen.write('OUTPut2 OFF')
-fxngen.close()
-scope.close()
-    
-# Save and plot data
-savetxt('bpf.txt', (freq, ampl_i, ampl_q))
-
-H2 = (ampl_i/input_ampl)**2 + (ampl_q/input_ampl)**2
-
-fig, ax = subplots()
-ax.plot(freq/1e6, 10*log10(H2))
-ax.set_xlabel('Frequency [MHz]');
-ax.set_ylabel('Subsystem gain [dB]');
-ax.grid(True)
-ax.set_title('Frequency response of BPF')
-savefig('bpf.png')
+# Save data and draw plots (see render.py)
+sweep.save('bpf.txt', 'x', 'ampl_i', 'ampl_q', stim_ampl=sweep['stim'])
+
+background_render = True        # Draw the figures without waiting for them
+#background_render = False
+render_figures(['bpf.png'], background_render)
@@ -2,11 +2,14 @@
 """Subsystem A unit testing script.
 This script measures the frequency response of the pre-mixer BPF."""
 
-import pyvisa
-import time
+from sweep import Test, Sweep, Commands, Query, Digitize
 from numpy import *
-from matplotlib.pyplot import *
-import sys
+from render import render_figures
+from metrics import conversion_gain_dB, phase_difference
+from liveview import LiveView
+from fixturecal import stimulus_ampl, reference_setup
+from specmask import Limit, SpecMask
+from scheduler import schedule
 
 __author__ = 'Sean Victor Hum'
 __copyright__ = 'Copyright 2023'
@@ -14,94 +17,60 @@ __license__ = 'GPL'
 __version__ = '1.0'
 __email__ = 'sean.hum@utoronto.ca'
 
-def user_prompt():
-    str = input('Hit Enter to proceed or ! to abort:')
-    if (str == '!'):
-        print('Measurement aborted')
-        user_abort()
-
-def user_abort():
-        scope.write(':WGEN:OUTP OFF')
-        fxngen.write('OUTPut1 OFF')
-        fxngen.write('OUTPut2 OFF')
-        scope.close()
-        fxngen.close()
-        sys.exit(1)
-
-def check_scales():
-    scale1 = scope.query(':CHAN1:SCAL?')
-    scale2 = scope.query(':CHAN2:SCAL?')
-
-    if (scale1 != scale2):
-        print('The scales of the 2 channels do not match.')
-        user_abort()
-        
-# Open instrument connection(s)
-rm = pyvisa.ResourceManager()
+# Open instrument connection(s). Each instrument is connected the first
+# time it is used (see bench.py).
 school_ip = True
 #school_ip = False
-if (school_ip):
-    scope = rm.open_resource('TCPIP0::192.168.0.253::hislip0::INSTR')
-    fxngen = rm.open_resource('TCPIP0::192.168.0.254::5025::SOCKET')
-else:
-    scope = rm.open_resource('TCPIP0::192.168.2.253::hislip0::INSTR')
-    fxngen = rm.open_resource('TCPIP0::192.168.2.254::5025::SOCKET')
-
-# Define string terminations and timeouts
-scope.write_termination = '\n'
-scope.read_termination = '\n'
-fxngen.write_termination = '\n'
-fxngen.read_termination = '\n'
-scope.timeout = 10000           # 10s
-fxngen.timeout = 10000          # 10s
-
-# Get ID info
-scope_id = scope.query('*IDN?').strip().split(',')
-fxngen_id = fxngen.query('*IDN?').strip().split(',')
-print('Connected to oscilloscope:', scope_id[1], flush=True)
-print('Connected to function generator:', fxngen_id[1], flush=True)
-
-# Set probe scaling to 1:1
-scope.write('CHANnel1:PROBe +1.0')
-scope.write('CHANnel2:PROBe +1.0')
-
-# Setup trigger
-scope.write(':TRIG:SWEep AUTO')
-scope.write(':TRIG:EDGE:SOURce CHAN1')
-scope.write(':TRIG:EDGE:LEVel +0.0')
+test = Test('sub-a-mixer', school_ip, 'scope', 'fxngen',
+            off=[('scope', ':WGEN:OUTP OFF'), ('fxngen', 'OUTPut1 OFF'), ('fxngen', 'OUTPut2 OFF')])
+scope, fxngen = test['scope'], test['fxngen']
+
+scope_setup = [
+    # Set probe scaling to 1:1
+    'CHANnel1:PROBe +1.0',
+    'CHANnel2:PROBe +1.0',
+    # Both channels on (a reset leaves only CH1 on)
+    'CHANnel1:DISPlay ON',
+    'CHANnel2:DISPlay ON',
+    # Setup trigger
+    ':TRIG:SWEep AUTO',
+    ':TRIG:EDGE:SOURce CHAN1',
+    ':TRIG:EDGE:LEVel +0.0',
+]
+test.setup('scope', scope_setup, method='setup')
 
 #print('Trigger:', scope.query(':TRIG?'), flush=True)
 
-print('Connect your subsystem as shown in the wiring diagram and power it on.')
-print('Make sure you have de-asserted the /TXEN line (set it high)!')
-user_prompt()
+test.prompt('Connect your subsystem as shown in the wiring diagram and power it on.',
+            'Make sure you have de-asserted the /TXEN line (set it high)!')
 
 # Setup function generator on scope as stimulus
 scope.write(':WGEN:FUNC SIN')
 scope.write(':WGEN:FREQ 1.401E+07') # 10 kHz test
 scope.write(':WGEN:OUTP ON')
 
-# Set waveform generator output impedance to high Z
-fxngen.write('OUTPUT1:LOAD INF')
-fxngen.write('OUTPUT2:LOAD INF')
-fxngen.write('UNIT:ANGL DEG')
-
-# Setup waveform generator
-fxngen.write('SOUR1:FUNCtion SIN')
-fxngen.write('SOUR1:FREQuency +1.4E+07')
-fxngen.write('SOUR1:VOLTage:HIGH +3.3')
-fxngen.write('SOUR1:VOLTage:LOW +0.0')
-fxngen.write('SOUR1:PHASe:SYNC')
-fxngen.write('SOUR1:PHASe +0.0')
-fxngen.write('OUTPut1 ON')
-
-fxngen.write('SOUR2:FUNCtion SIN')
-fxngen.write('SOUR2:FREQuency +1.4E+07')
-fxngen.write('SOUR2:VOLTage:HIGH +3.3')
-fxngen.write('SOUR2:VOLTage:LOW +0.0')
-fxngen.write('SOUR2:PHASe:SYNC')
-fxngen.write('SOUR2:PHASe -90.0')
-fxngen.write('OUTPut2 ON')
+fxngen_setup = [
+    # Set waveform generator output impedance to high Z
+    'OUTPUT1:LOAD INF',
+    'OUTPUT2:LOAD INF',
+    'UNIT:ANGL DEG',
+    # Setup waveform generator
+    'SOUR1:FUNCtion SIN',
+    'SOUR1:FREQuency +1.4E+07',
+    'SOUR1:VOLTage:HIGH +3.3',
+    'SOUR1:VOLTage:LOW +0.0',
+    'SOUR1:PHASe:SYNC',
+    'SOUR1:PHASe +0.0',
+    'OUTPut1 ON',
+    'SOUR2:FUNCtion SIN',
+    'SOUR2:FREQuency +1.4E+07',
+    'SOUR2:VOLTage:HIGH +3.3',
+    'SOUR2:VOLTage:LOW +0.0',
+    'SOUR2:PHASe:SYNC',
+    'SOUR2:PHASe -90.0',
+    'OUTPut2 ON',
+]
+test.setup('fxngen', fxngen_setup)
 
 # Setup acquisition
 scope.write(':TIMebase:SCAL +5.0E-05') # 50! us/div
@@ -109,11 +78,10 @@ scope.write(':CHAN1:COUP AC')
 scope.write(':CHAN2:COUP AC')
 
 # Check phase shift
-print('Adjust the timebase and triggering so the signals are stable.')
-print('Adjust the voltage scale on CH1 and CH2 so they are identical')
-print('and the 2 signals occupy most of the screen.')
-user_prompt()
-check_scales()
+test.prompt('Adjust the timebase and triggering so the signals are stable.',
+            'Adjust the voltage scale on CH1 and CH2 so they are identical',
+            'and the 2 signals occupy most of the screen.')
+test.check_scales()
 
 phdiff = float(scope.query(':MEAS:PHASe? CHAN1'))
 print('Measured phase shift between I and Q for 10 kHz message signal:', phdiff, 'deg')
@@ -123,122 +91,100 @@ if (phdiff > 0):
     print('generator and oscilloscope are connected as shown in the wiring diagram.')
 else:
     print('Q is lagging I as expected.')
-print('About to initiate frequency sweep.')
-user_prompt()
+test.prompt('About to initiate frequency sweep.')
 
 # Setup multiple frequency sweeps
 N = 61
-N2 = int((N-1)/3)
-N3 = 2*N2
 fc = 14e6
 fm = logspace(3, 6, N)
 freq = fc+fm
 
+# The message frequencies are measured in three ranges, each with its own
+# timebase, and the operator re-adjusts the voltage scales when the range
+# changes. The points are grouped by range so that this happens once per
+# range, whatever the order of 'fm' (see scheduler.py).
+ranges = [(10e3, 2e-4), (100e3, 5e-5), (inf, 5e-6)] # (message frequencies below, timebase)
+fm_range = searchsorted([r[0] for r in ranges], fm, side='right')
+(order, groups) = schedule(fm_range, fm)
+
 input_ampl = 50e-3              # Amplitude of wave generator output
 
+# The stimulus can be teed to a spare scope channel and measured in the same
+# acquisition as the outputs, so that the gain at each point is a ratio of
+# measured amplitudes rather than relative to 'input_ampl' (see fixturecal.py)
+ref_chan = None                 # Scope channel the stimulus is teed to, or None
+#ref_chan = 3
+
+# Phase balance limit between I and Q
+phase_tol = 10                  # Tolerance on the -90 deg phase shift (deg)
+spec_abort = False              # Set to True to stop as soon as the spec fails
+mask = SpecMask('sub-a-mixer', [Limit('phase', lo=-90-phase_tol, hi=-90+phase_tol, units='deg')],
+                spec_abort, test.abort)
+
 print('The following message frequencies will be measured:', fm)
 
-# Initialize vectors for storing data
-ampl_i = zeros(N, float)
-ampl_q = zeros(N, float)
-phdiff = zeros(N, float)
+live_view = False               # Show the curves live as they are measured
+#live_view = True
+view = LiveView('Conversion gain', fm, ['I', 'Q'], 'Message frequency [Hz]',
+                'Conversion gain [dB]', logx=True, enabled=live_view)
 
-scope.write(':TIMebase:SCAL +2.0E-04')
+scope.write(':TIMebase:SCAL %e' % (ranges[fm_range[order[0]]][1]))
 scope.write(':WGEN:volt %e' % (input_ampl))
-scope.write(":WGEN:FREQ %e" % freq[0])
-
-print('Adjust the timebase and triggering so the signals are stable.')
-print('Adjust the voltage scale on CH1 and CH2 so they are identical')
-print('and the 2 signals occupy most of the screen.')
-user_prompt()
-check_scales()
-
-# Frequency sweep 1
-for k in range(N2):
-    scope.write(":WGEN:FREQ %e" % freq[k])
-    #scope.write(':SINGle')
-    ampl_i[k] = float(scope.query(':MEAS:VPP? CHAN1'))
-    ampl_q[k] = float(scope.query(':MEAS:VPP? CHAN2'))
-    phase1 = float(scope.query(':MEAS:PHASe? CHAN1'))
-    phase2 = float(scope.query(':MEAS:PHASe? CHAN2'))
-    phdiff[k] = phase1 - phase2
-    print('Frequency point %d/%d, f=%.4f MHz: %f %f %f' % (k+1, N, freq[k]/1e6, ampl_i[k], ampl_q[k], phdiff[k]))
-
-scope.write(':TIMebase:SCAL +5.0E-05') 
-print("Re-adjust the voltage scale (if necessary) so the 2 signals occupy most of the screen.")
-user_prompt()
-check_scales()
-
-# Frequency sweep 2
-for k in range(N2, N3):
-    scope.write(":WGEN:FREQ %e" % freq[k])
-    #scope.write(':SINGle')
-    ampl_i[k] = float(scope.query(':MEAS:VPP? CHAN1'))
-    ampl_q[k] = float(scope.query(':MEAS:VPP? CHAN2'))
-    phase1 = float(scope.query(':MEAS:PHASe? CHAN1'))
-    phase2 = float(scope.query(':MEAS:PHASe? CHAN2'))
-    phdiff[k] = phase1 - phase2
-    print('Frequency point %d/%d, f=%.4f MHz: %f %f %f' % (k+1, N, freq[k]/1e6, ampl_i[k], ampl_q[k], phdiff[k]))
-
-scope.write(':TIMebase:SCAL +5.0E-06') 
-print("Re-adjust the voltage scale (if necessary) so the 2 signals occupy most of the screen.")
-user_prompt()
-check_scales()
-
-# Frequency sweep 3
-for k in range(N3, N):
-    scope.write(":WGEN:FREQ %e" % freq[k])
-    #scope.write(':SINGle')
-    ampl_i[k] = float(scope.query(':MEAS:VPP? CHAN1'))
-    ampl_q[k] = float(scope.query(':MEAS:VPP? CHAN2'))
-    phase1 = float(scope.query(':MEAS:PHASe? CHAN1'))
-    phase2 = float(scope.query(':MEAS:PHASe? CHAN2'))
-    phdiff[k] = phase1 - phase2
-    print('Frequency point %d/%d, f=%.4f MHz: %f %f %f' % (k+1, N, freq[k]/1e6, ampl_i[k], ampl_q[k], phdiff[k]))
+scope.write(":WGEN:FREQ %e" % freq[order[0]])
+if (ref_chan is not None):
+    scope.write(reference_setup(ref_chan, input_ampl))
+
+test.prompt('Adjust the timebase and triggering so the signals are stable.',
+            'Adjust the voltage scale on CH1 and CH2 so they are identical',
+            'and the 2 signals occupy most of the screen.')
+test.check_scales()
+
+measure = [Query(scope, ':MEAS:VPP? CHAN1', 'ampl_i'),
+           Query(scope, ':MEAS:VPP? CHAN2', 'ampl_q'),
+           Query(scope, ':MEAS:PHASe? CHAN1', 'phase1'),
+           Query(scope, ':MEAS:PHASe? CHAN2', 'phase2')]
+acquire = None
+if (ref_chan is not None):
+    # A single acquisition per point, so the stimulus is measured with the outputs
+    measure.append(Query(scope, ':MEAS:VPP? CHAN%d' % (ref_chan), 'ampl_ref'))
+    acquire = Digitize(scope)
+
+# Stimulus amplitude at each point, from the fixture calibration if there is
+# one (see fixturecal.py), unless the stimulus is measured on 'ref_chan'
+if (ref_chan is None):
+    stim_cal = stimulus_ampl(freq, input_ampl, scope.idn)
+else:
+    stim_cal = full(len(freq), input_ampl)
+
+# The message frequency is swept one range at a time (see sweep.py)
+sweep = Sweep(test, fm, order=order, axes={'stim_cal': stim_cal},
+              stimulus=[Commands(scope, ':WGEN:FREQ %e', offset=fc)],
+              measure=measure, acquire=acquire,
+              derived={'MHz': lambda p: (p['x']+fc)/1e6,
+                       'phase': lambda p: phase_difference(p['phase1'], p['phase2']),
+                       'stim': lambda p: p['stim_cal'] if (ref_chan is None) else p['ampl_ref'],
+                       'gain_i': lambda p: conversion_gain_dB(p['ampl_i'], p['stim']),
+                       'gain_q': lambda p: conversion_gain_dB(p['ampl_q'], p['stim'])},
+              report='Frequency point %(n)d/%(N)d, f=%(MHz).4f MHz: %(ampl_i)f %(ampl_q)f %(phase)f',
+              view=view, plot=['gain_i', 'gain_q'], mask=mask, checks=['phase'])
+
+for (g, (k0, k1)) in enumerate(groups):
+    if (g > 0):
+        scope.write(':TIMebase:SCAL %e' % (ranges[fm_range[order[k0]]][1]))
+        test.prompt("Re-adjust the voltage scale (if necessary) so the 2 signals occupy most of the screen.")
+        test.check_scales()
+    sweep.run(k0, k1)
 
 print('Done')
+sweep.close()
+test.finish()
     
-scope.write(':WGEN:OUTP OFF')
-fxngen.write('OUTPut1 OFF')
-fxngen.write('OUTPut2 OFF')
-fxngen.close()
-scope.close()
-    
-# Save and plot data
-savetxt('iq.txt', (fm, ampl_i, ampl_q, phdiff));
-
-H2 = (ampl_i/input_ampl)**2 + (ampl_q/input_ampl)**2
-H2max = max(H2)
-
-fig, ax = subplots()
-ax.semilogx(fm, 10*log10(H2/H2max))
-ax.set_xlabel('Message frequency [Hz]');
-ax.set_ylabel('Normalized LPF transfer function [dB]');
-ax.grid(True)
-ax.set_title('Frequency response of LPF')
-savefig('lpf.png')
-
-fig, ax = subplots()
-ax.semilogx(fm, 20*log10(ampl_i/input_ampl))
-ax.semilogx(fm, 20*log10(ampl_q/input_ampl))
-ax.set_xlabel('Message frequency [Hz]');
-ax.set_ylabel('Conversion gain [dB]');
-ax.legend(('I', 'Q'))
-ax.grid(True)
-savefig('iq_compare.png')
-
-fig, ax = subplots()
-
-ax.set_xlabel('Message frequency [Hz]')
-ax.set_ylabel('Amplitude balance I/Q [dB]')
-ax.semilogx(fm, 20*log10(ampl_i/ampl_q))
-ax.grid(True)
-savefig('balance_ampl.png')
-
-fig, ax = subplots()
-ax.set_xlabel('Message frequency [Hz]')
-ax.set_ylabel('Phase shift between I and Q [deg]')
-ax.semilogx(fm, phdiff)
-ax.grid(True)
-ax.set_ylim((-200, 200))
-savefig('balance_phase.png')
+# Save data and draw plots (see render.py)
+sweep.save('iq.txt', 'x', 'ampl_i', 'ampl_q', 'phase', stim_ampl=sweep['stim'])
+
+print('Overall spec mask result:', mask.verdict())
+
+background_render = True        # Draw the figures without waiting for them
+#background_render = False
+render_figures(['lpf.png', 'iq_compare.png', 'balance_ampl.png', 'balance_phase.png'],
+               background_render)
@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 """Subsystem B unit testing script."""
 
-import pyvisa
+from sweep import Test, Sweep, Commands, Call
 import time
 from numpy import *
-from matplotlib.pyplot import *
-import sys
+from render import render_figures
+from metrics import dBV, rejection_dB
+from liveview import LiveView
+from averaging import adaptive_vrms, stop_averaging
+from specmask import Limit, SpecMask
 
 __author__ = 'Sean Victor Hum'
 __copyright__ = 'Copyright 2024'
@@ -13,87 +16,54 @@ __license__ = 'GPL'
 __version__ = '1.0'
 __email__ = 'sean.hum@utoronto.ca'
 
-def user_prompt():
-    str = input('Hit Enter to proceed or ! to abort:')
-    if (str == '!'):
-        print('Measurement aborted')
-        user_abort()
-
-def user_abort():
-        scope.write(':WGEN:OUTP OFF')
-        fxngen.write('OUTPut1 OFF')
-        fxngen.write('OUTPut2 OFF')
-        scope.close()
-        fxngen.close()
-        sys.exit(0)
-        
-def meas_prompt():
-    print('Wait for waveform to be stable and adjust vertical scale if desired.')
-    print('This can sometimes take a few seconds.')
-    str = input('Hit Enter to proceed or ! to abort:')
-    if (str == '!'):
-        print('Measurement aborted')
-        user_abort()
-
-# Open instrument connection(s)
-rm = pyvisa.ResourceManager()
+# Open instrument connection(s). Each instrument is connected the first
+# time it is used (see bench.py).
 school_ip = True
 #school_ip = False
-if (school_ip):
-    scope = rm.open_resource('TCPIP0::192.168.0.253::hislip0::INSTR')
-    fxngen = rm.open_resource('TCPIP0::192.168.0.254::5025::SOCKET')
-else:
-    scope = rm.open_resource('TCPIP0::192.168.2.253::hislip0::INSTR')
-    fxngen = rm.open_resource('TCPIP0::192.168.2.254::5025::SOCKET')
-
-# Define string terminations and timeouts
-scope.write_termination = '\n'
-scope.read_termination = '\n'
-fxngen.write_termination = '\n'
-fxngen.read_termination = '\n'
-scope.timeout = 10000           # 10s
-fxngen.timeout = 10000          # 10s
-
-# Get ID info
-scope_id = scope.query('*IDN?').strip().split(',')
-fxngen_id = fxngen.query('*IDN?').strip().split(',')
-print('Connected to oscilloscope:', scope_id[1], flush=True)
-print('Connected to function generator:', fxngen_id[1], flush=True)
-
-# Set probe scaling to 1:1
-scope.write('CHANnel1:PROBe +1.0')
-scope.write('CHANnel2:PROBe +1.0')
-
-# Setup trigger
-scope.write(':TRIG:SWEep AUTO')
-scope.write(':TRIG:EDGE:LEVel +0.0')
+test = Test('sub-b', school_ip, 'scope', 'fxngen',
+            off=[('fxngen', 'OUTPut1 OFF'), ('fxngen', 'OUTPut2 OFF')])
+scope, fxngen = test['scope'], test['fxngen']
+
+scope_setup = [
+    # Set probe scaling to 1:1
+    'CHANnel1:PROBe +1.0',
+    'CHANnel2:PROBe +1.0',
+    # Both channels on (a reset leaves only CH1 on)
+    'CHANnel1:DISPlay ON',
+    'CHANnel2:DISPlay ON',
+    # Setup trigger
+    ':TRIG:SWEep AUTO',
+    ':TRIG:EDGE:LEVel +0.0',
+]
+test.setup('scope', scope_setup, method='setup')
 
 #print('Trigger:', scope.query(':TRIG?'), flush=True)
 
-print('Connect your subsystem as shown in the wiring diagram and power it on.')
-print('If your demodulator supports both LSB and USB mode, place it in USB mode.')
-print('The desired demodulated signal should be on channel 2 of the')
-print('oscilloscope.')
-user_prompt()
-
-# Set waveform generator output impedance to high Z
-fxngen.write('OUTPUT1:LOAD INF')
-fxngen.write('OUTPUT2:LOAD INF')
-fxngen.write('UNIT:ANGL DEG')
+test.prompt('Connect your subsystem as shown in the wiring diagram and power it on.',
+            'If your demodulator supports both LSB and USB mode, place it in USB mode.',
+            'The desired demodulated signal should be on channel 2 of the',
+            'oscilloscope.')
 
-# Setup waveform generator
 drive_amplitude = 0.2          # Set to input drive amplitude required in V
-fxngen.write('SOUR1:FUNCtion SIN')
-fxngen.write('SOUR1:VOLTage:AMPL %e' % (drive_amplitude))
-fxngen.write('SOUR1:VOLTage:OFFS +0.0')
-fxngen.write('SOUR1:PHASe +0.0')
-fxngen.write('OUTPut1 ON')
-
-fxngen.write('SOUR2:FUNCtion SIN')
-fxngen.write('SOUR2:VOLTage:AMPL %e' % (drive_amplitude))
-fxngen.write('SOUR2:VOLTage:OFFS +0.0')
-fxngen.write('SOUR2:PHASe -9.0E+01')
-fxngen.write('OUTPut2 ON')
+
+fxngen_setup = [
+    # Set waveform generator output impedance to high Z
+    'OUTPUT1:LOAD INF',
+    'OUTPUT2:LOAD INF',
+    'UNIT:ANGL DEG',
+    # Setup waveform generator
+    'SOUR1:FUNCtion SIN',
+    'SOUR1:VOLTage:AMPL %e' % (drive_amplitude),
+    'SOUR1:VOLTage:OFFS +0.0',
+    'SOUR1:PHASe +0.0',
+    'OUTPut1 ON',
+    'SOUR2:FUNCtion SIN',
+    'SOUR2:VOLTage:AMPL %e' % (drive_amplitude),
+    'SOUR2:VOLTage:OFFS +0.0',
+    'SOUR2:PHASe -9.0E+01',
+    'OUTPut2 ON',
+]
+test.setup('fxngen', fxngen_setup)
 
 # Setup acquisition
 scope.write(':TIMebase:SCAL +1.0E-03') # 1 ms/div
@@ -109,6 +79,28 @@ fstop = 6100
 df = (fstop- fstart)/(N-1)
 freq = arange(N)*df + fstart
 
+# With adaptive averaging, the scope averages each point until the estimated
+# SNR of the reading reaches snr_target, instead of prompting the user to
+# wait for the waveform to become stable.
+adaptive_averaging = True
+#adaptive_averaging = False
+snr_target = 30                 # Target SNR of each reading (dB)
+max_count = 1024                # Maximum number of averages
+settle = 0.5                    # Settling time after a frequency change (s)
+
+# In interleaved mode, both sidebands are measured at each frequency in a
+# single sweep: USB first, then the phase of SOUR2 is flipped from -90 to
+# +90 degrees and LSB is measured, so the rejection ratio is known at every
+# point as it is measured, each frequency is only settled once, and slow
+# drift does not bias the comparison of the two sidebands.
+interleaved = True
+#interleaved = False
+flip_settle = 0.1               # Settling time after flipping the sideband (s)
+
+# Sideband rejection limit, checked at each point where LSB is measured
+spec_abort = False              # Set to True to stop as soon as the spec fails
+mask = SpecMask('sub-b', [Limit('rejection', lo=20, units='dB')], spec_abort, test.abort)
+
 print('The amplitude of the function generator outputs is set to: %f V.' % (drive_amplitude))
 print('The following frequency points will be measured:', freq)
 
@@ -119,98 +111,123 @@ fxngen.write('SOUR2:PHASe:SYNC')
 scope.write(':TRIG:EDGE:SOURce CHAN2')
 #print(scope.query(':TRIGger:EDGE:LEVel?'))
 
-print('USB MEASUREMENT')
-print('A 1 kHz test signal should be visible on CH1, and you should have a')
-print('strong demodulated USB signal on CH2.')
-print('Adjust the voltage scales on CH2, and/or the volume control on your')
-print('so that the CH2 voltage waveform occupies most of the screen.')
-user_prompt()
-
-# Initialize vectors for storing data
-ampl_lsb = zeros(N, float)
-ampl_usb = zeros(N, float)
-
-# # Check the scale is identical on both channels
-# scale1 = scope.query(':CHAN1:SCAL?')
-# scale2 = scope.query(':CHAN2:SCAL?')
-
-# if (scale1 != scale2):
-#     print('The scales of the 2 channels do not match.')
-#     user_abort()
-
-# USB frequency sweep loop
-for k in range(N):
-    fxngen.write('SOUR1:FREQuency %e' % freq[k])
-#    time.sleep(1)
-    fxngen.write('SOUR2:FREQuency %e' % freq[k])
-#    time.sleep(1)
-    fxngen.write('SOUR2:PHASe:SYNC')
-    meas_prompt()
-    #time.sleep(2)
-    ampl_usb[k] = float(scope.query(':MEAS:VRMS? CHAN2'))
-    print('Frequency point %d/%d, f=%.2f kHz: %f' % (k+1, N, freq[k]/1e3, ampl_usb[k]))
+test.prompt('USB MEASUREMENT',
+            'A 1 kHz test signal should be visible on CH1, and you should have a',
+            'strong demodulated USB signal on CH2.',
+            'Adjust the voltage scales on CH2, and/or the volume control on your',
+            'so that the CH2 voltage waveform occupies most of the screen.')
 
-# Set up instruments for first frequency point (LSB)
-# Set up instruments for 1 kHz test point (USB)
-fxngen.write('SOUR1:FREQuency %e' % (1e3))
-fxngen.write('SOUR2:FREQuency %e' % (1e3))
-fxngen.write('SOUR2:PHASe +9.0E+01')
-fxngen.write('SOUR2:PHASe:SYNC')
-scope.write(':TRIG:EDGE:SOURce CHAN1')
-#print(scope.query(':TRIGger:EDGE:LEVel?'))
-   
-print('\nLSB MEASUREMENT')
-print('You should now have a weak LSB signal on CH1 at 1 kHz.')
-user_prompt()
+live_view = False               # Show the curves live as they are measured
+#live_view = True
+view = LiveView('Frequency response of demodulator', freq/1e3, ['USB', 'LSB'],
+                'Frequency [kHz]', 'Output amplitude [dBV]', enabled=live_view)
 
 # Check the scale is identical on both channels
-# scale1 = scope.query(':CHAN1:SCAL?')
-# scale2 = scope.query(':CHAN2:SCAL?')
-
-# if (scale1 != scale2):
-#     print('The scales of the 2 channels do not match.')
-#     user_abort()
-
-# Frequency sweep loop
-for k in range(N):
-    fxngen.write('SOUR1:FREQuency %e' % freq[k])
-    #time.sleep(1)
-    fxngen.write('SOUR2:FREQuency %e' % freq[k])
-    #time.sleep(1)
+#test.check_scales()
+
+def prompted_vrms(p):
+    test.prompt('Wait for waveform to be stable and adjust vertical scale if desired.',
+                'This can sometimes take a few seconds.')
+    return float(scope.query(':MEAS:VRMS? CHAN2'))
+
+def demod_measure(name):
+    """Measurement of the demodulated amplitude 'name' on CH2 (see sweep.py),
+    and its part of the report."""
+    if (adaptive_averaging):
+        measure = Call(lambda p: adaptive_vrms(scope, 2, snr_target, max_count=max_count),
+                       name, 'count_' + name, 'snr_' + name, inst=scope)
+        report = ('%(' + name + ')f (%(count_' + name + ')d averages, SNR %(snr_'
+                  + name + ').1f dB)')
+    else:
+        measure = Call(prompted_vrms, name, inst=scope)
+        report = '%(' + name + ')f'
+    return measure, report
+
+def select_sideband(phase, chan):
+    """Simulates USB (phase=-90) or LSB (phase=+90) at the input, with the
+    scope triggered on channel 'chan'."""
+    fxngen.write('SOUR2:PHASe %+.1E' % (phase))
     fxngen.write('SOUR2:PHASe:SYNC')
-    meas_prompt()
-    #time.sleep(2)
-    ampl_lsb[k] = float(scope.query(':MEAS:VRMS? CHAN2'))
-    print('Frequency point %d/%d, f=%.2f kHz: %f' % (k+1, N, freq[k]/1e3, ampl_lsb[k]))
-    
+    fxngen.query('*OPC?')
+    scope.write(':TRIG:EDGE:SOURce CHAN%d' % (chan))
+
+def flip_to_lsb(p):
+    select_sideband(+90, 1)
+    if (adaptive_averaging):
+        time.sleep(flip_settle)
+    return ()
+
+if (interleaved):
+    # Single frequency sweep loop, USB then LSB at each point
+    (usb_measure, usb_report) = demod_measure('ampl_usb')
+    (lsb_measure, lsb_report) = demod_measure('ampl_lsb')
+    usb = lsb = Sweep(test, freq,
+                      stimulus=[Commands(fxngen, 'SOUR1:FREQuency %e', 'SOUR2:FREQuency %e'),
+                                Call(lambda p: select_sideband(-90, 2))],
+                      measure=[usb_measure, Call(flip_to_lsb, inst=scope), lsb_measure],
+                      settle=settle if (adaptive_averaging) else 0,
+                      derived={'kHz': lambda p: p['x']/1e3, 'usb': lambda p: dBV(p['ampl_usb']),
+                               'lsb': lambda p: dBV(p['ampl_lsb']),
+                               'rejection': lambda p: rejection_dB(p['ampl_usb'], p['ampl_lsb'])},
+                      report=('Frequency point %(n)d/%(N)d, f=%(kHz).2f kHz: USB ' + usb_report
+                              + ', LSB ' + lsb_report + ', rejection %(rejection).1f dB'),
+                      view=view, plot=['usb', 'lsb'], mask=mask, checks=['rejection'])
+    usb.run()
+else:
+    def demod_sweep(name, **kw):
+        """Sweep of the demodulated amplitude 'name' of one sideband (see sweep.py)."""
+        (measure, report) = demod_measure(name)
+        return Sweep(test, freq,
+                     stimulus=[Commands(fxngen, 'SOUR1:FREQuency %e', 'SOUR2:FREQuency %e',
+                                        'SOUR2:PHASe:SYNC')],
+                     measure=[measure], settle=settle if (adaptive_averaging) else 0,
+                     report='Frequency point %(n)d/%(N)d, f=%(kHz).2f kHz: ' + report,
+                     view=view, **kw)
+
+    # USB frequency sweep loop
+    usb = demod_sweep('ampl_usb',
+                      derived={'kHz': lambda p: p['x']/1e3, 'usb': lambda p: dBV(p['ampl_usb'])},
+                      plot=['usb'])
+    usb.run()
+
+    if (adaptive_averaging):
+        stop_averaging(scope)
+
+    # Set up instruments for 1 kHz test point (LSB)
+    fxngen.write('SOUR1:FREQuency %e' % (1e3))
+    fxngen.write('SOUR2:FREQuency %e' % (1e3))
+    fxngen.write('SOUR2:PHASe +9.0E+01')
+    fxngen.write('SOUR2:PHASe:SYNC')
+    scope.write(':TRIG:EDGE:SOURce CHAN1')
+    #print(scope.query(':TRIGger:EDGE:LEVel?'))
+
+    test.prompt('\nLSB MEASUREMENT',
+                'You should now have a weak LSB signal on CH1 at 1 kHz.')
+
+    # Check the scale is identical on both channels
+    #test.check_scales()
+
+    # Frequency sweep loop
+    lsb = demod_sweep('ampl_lsb',
+                      derived={'kHz': lambda p: p['x']/1e3, 'usb': lambda p: usb['usb'][p['k']],
+                               'lsb': lambda p: dBV(p['ampl_lsb']),
+                               'rejection': lambda p: rejection_dB(usb['ampl_usb'][p['k']], p['ampl_lsb'])},
+                      plot=['usb', 'lsb'], mask=mask, checks=['rejection'])
+    lsb.run()
+
 print('Done')
+lsb.close()
+
+if (adaptive_averaging):
+    stop_averaging(scope)
     
-fxngen.write('OUTPut1 OFF')
-fxngen.write('OUTPut2 OFF')
-fxngen.close()
-scope.close()
+test.finish()
     
-# Save and plot data
-savetxt('demod.txt', (freq, ampl_lsb, ampl_usb))
-
-fig, ax = subplots()
-ax.plot(freq/1e3, ampl_usb)
-ax.plot(freq/1e3, ampl_lsb)
-ax.set_xlabel('Frequency [kHz]');
-ax.set_ylabel('Output amplitude [V]');
-ax.grid(True)
-ax.legend(('USB', 'LSB'))
-ax.set_title('Frequency response of demodulator')
-savefig('demod.png')
-
-#rej_lsb = 20*log10(ampl_lsb / ampl_usb)
-rej_usb = 20*log10(ampl_usb / ampl_lsb)
-
-fig, ax = subplots()
-#ax.plot(freq/1e3, rej_lsb)
-ax.plot(freq/1e3, rej_usb)
-ax.set_xlabel('Frequency [kHz]');
-ax.set_ylabel('Sideband rejection ratio [dB]');
-ax.grid(True)
-ax.set_title('SSB demodulation performance')
-savefig('rejection.png')
+# Save data and draw plots (see render.py)
+savetxt('demod.txt', (freq, lsb['ampl_lsb'], usb['ampl_usb']))
+
+print('Overall spec mask result:', mask.verdict())
+
+background_render = True        # Draw the figures without waiting for them
+#background_render = False
+render_figures(['demod.png', 'rejection.png'], background_render)
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 """Subsystem C script the tests CAT command functionality."""
 
+import scpilog                  # Session recording/replay (see scpilog.py)
+import timeline                 # Run timeline tracing (see timeline.py)
 import time
 import sys
+from specmask import Limit, SpecMask
 
 __author__ = 'Sean Victor Hum'
 __copyright__ = 'Copyright 2023'
@@ -17,7 +20,7 @@ def user_prompt():
         user_abort()
 
 def user_abort():
-        scope.close()
+        ser.close()
         sys.exit(0)
 
 def checkcat(cmd, query, expected):
@@ -31,7 +34,7 @@ def checkcat(cmd, query, expected):
         print('  Result: PASS')
     else:
         print('  Result: FAIL')
-        globalpass = False
+    mask.record(query, cmd == response)
 
 def checkcatq(query, expected):
     """Like checkcat() but no preceding set command."""
@@ -42,19 +45,27 @@ def checkcatq(query, expected):
         print('  Result: PASS')
     else:
         print('  Result: FAIL')
-        globalfail = True
+    mask.record(query, expected == response)
 
+comport = None                  # Found automatically (see catport.py)
 #comport = 'COM3'
 #comport = 'COM10'
-comport = 'COM11'
+#comport = 'COM11'
+baudrate = 9600
 
-globalpass = True               # Unless proven otherwise
+# Every CAT check must pass
+spec_abort = False              # Set to True to stop at the first failed check
+mask = SpecMask('sub-c-cat', [Limit(q, lo=1) for q in
+                              ('FA;', 'TX;', 'AI;', 'ID;', 'MD0;', 'SH0;', 'NA0;', 'IF;', 'ST;')],
+                spec_abort, user_abort)
 
 # Try to load serial library and initialize serial port
 try:
     import serial
-    ser = serial.Serial(port=comport, baudrate=9600, timeout=1)
-    #ser = serial.Serial(port=comport, baudrate=115200, timeout=1)
+    if (comport is None):
+        import catport
+        (comport, baudrate) = catport.find_port()
+    ser = serial.Serial(port=comport, baudrate=baudrate, timeout=1)
     ser.close()
 except ImportError:
     print('pyserial not installed')
@@ -102,9 +113,5 @@ checkcat('ST1;', 'ST;', 'ST1;')
 checkcat('ST0;', 'ST;', 'ST0;')
 
 ser.close()
-print('\nOverall CAT test result: ', end='')
-if (globalpass):
-    print('PASS')
-else:
-    print('FAIL')
+print('\nOverall CAT test result:', mask.verdict())
     
@@ -1,11 +1,13 @@
 #!/usr/bin/env python
 """Subsystem C unit testing script."""
 
-import pyvisa
+from sweep import Test, Sweep, Call, Query
 import time
 from numpy import *
-from matplotlib.pyplot import *
 import sys
+from render import render_figures
+from liveview import LiveView
+from specmask import Limit, SpecMask
 
 __author__ = 'Stewart Pearson and Sean Victor Hum'
 __copyright__ = 'Copyright 2023'
@@ -13,23 +15,18 @@ __license__ = 'GPL'
 __version__ = '1.0'
 __email__ = 'sean.hum@utoronto.ca'
 
-def user_prompt():
-    str = input('Hit Enter to proceed or ! to abort:')
-    if (str == '!'):
-        print('Measurement aborted')
-        user_abort()
-
-def user_abort():
-        scope.close()
-        sys.exit(0)
-
-comport = 'COM3'
+comport = None                  # Found automatically (see catport.py)
+#comport = 'COM3'
 #comport = 'COM10'
+baudrate = 9600
 
 # Try to load serial library and initialize serial port
 try:
     import serial
-    ser = serial.Serial(port=comport, baudrate=9600, timeout=1)
+    if (comport is None):
+        import catport
+        (comport, baudrate) = catport.find_port()
+    ser = serial.Serial(port=comport, baudrate=baudrate, timeout=1)
     ser.close()
 except ImportError:
     print('pyserial not installed')
@@ -43,49 +40,45 @@ except serial.SerialException:
 # Open serial port
 ser.open()  
     
-# Open instrument connection(s)
-rm = pyvisa.ResourceManager()
+# Open instrument connection(s). Each instrument is connected the first
+# time it is used (see bench.py).
 school_ip = True
 #school_ip = False
-if (school_ip):
-    scope = rm.open_resource('TCPIP0::192.168.0.253::hislip0::INSTR')
-else:
-    scope = rm.open_resource('TCPIP0::192.168.2.253::hislip0::INSTR')
-
-# Define string terminations and timeouts
-scope.write_termination = '\n'
-scope.read_termination = '\n'
-scope.timeout = 10000           # 10s
-
-# Get ID info
-scope_id = scope.query('*IDN?').strip().split(',')
-print('Connected to oscilloscope:', scope_id[1], flush=True)
-
-# Set probe scaling to 1:1
-scope.write('CHANnel1:PROBe +1.0')
-scope.write('CHANnel2:PROBe +1.0')
-
-# Set vertical scale
-scope.write(':CHANnel1:SCALe +1.0') 
-scope.write(':CHANnel2:SCALe +1.0') 
-
-# Set coupling
-scope.write(':CHANnel1:COUPling AC') 
-scope.write(':CHANnel2:COUPling AC') 
-
-# Set up scope timebase and measurements
-scope.write('TIMebase:MODE MAIN')
-scope.write('TIMebase:REFerence CENTer')
-scope.write(':MEASure:CLEAr')
-
-# Setup trigger
-scope.write(':TRIG:SWEep AUTO')
-scope.write(':TRIG:EDGE:LEVel +0.0')
-scope.write('TRIGger:EDGE:SLOPe POSITIVE')
-scope.write('TRIGger:EDGE:COUPling AC')
-
-print('Connect your subsystem as shown in the wiring diagram and power it on.')
-user_prompt()
+test = Test('sub-c', school_ip, 'scope')
+scope = test['scope']
+
+scope_setup = [
+    # Set probe scaling to 1:1
+    'CHANnel1:PROBe +1.0',
+    'CHANnel2:PROBe +1.0',
+    # Both channels on (a reset leaves only CH1 on)
+    'CHANnel1:DISPlay ON',
+    'CHANnel2:DISPlay ON',
+    # Set vertical scale
+    ':CHANnel1:SCALe +1.0',
+    ':CHANnel2:SCALe +1.0',
+    # Set coupling
+    ':CHANnel1:COUPling AC',
+    ':CHANnel2:COUPling AC',
+    # Set up scope timebase and measurements
+    'TIMebase:MODE MAIN',
+    'TIMebase:REFerence CENTer',
+    ':MEASure:CLEAr',
+    # Setup trigger
+    ':TRIG:SWEep AUTO',
+    ':TRIG:EDGE:LEVel +0.0',
+    'TRIGger:EDGE:SLOPe POSITIVE',
+    'TRIGger:EDGE:COUPling AC',
+]
+test.setup('scope', scope_setup, method='setup')
+
+# Phase difference limit between LO_0 and LO_90
+phase_tol = 10                  # Tolerance on the -90 deg phase shift (deg)
+spec_abort = False              # Set to True to stop as soon as the spec fails
+mask = SpecMask('sub-c', [Limit('phase', lo=-90-phase_tol, hi=-90+phase_tol, units='deg')],
+                spec_abort, test.abort)
+
+test.prompt('Connect your subsystem as shown in the wiring diagram and power it on.')
 
 # Frequency sweep
 N = 17
@@ -110,38 +103,48 @@ phdiff = float(scope.query(':MEAS:PHASe? CHAN2'))
 if (phdiff > 0):
     print('WARNING: The phase difference seems to be backwards (LO_90 leads LO_0 when it should lag). This should be corrected.')
     
-user_prompt()
+test.prompt()
 
 scope.write('TIMebase:SCALe +500E-09')
-# Initialize vectors for storing data
-meas_freq_0 = zeros(N, float)
-meas_freq_90 = zeros(N, float)
-phdiff = zeros(N, float)
-
-# Frequency sweep loop
-for k in range(N):
-    print('Frequency point %d/%d, f=%.2f MHz' % (k+1, N, freq[k]/1e6))
-    sercmd = 'FA%09d;' % (int(freq[k]))
+live_view = False               # Show the curves live as they are measured
+#live_view = True
+view = LiveView('Phase of Subsystem C', freq/1e6, ['LO_90 - LO_0'],
+                'Command frequency [MHz]', 'Phase shift [deg]', enabled=live_view)
+
+def set_frequency(p):
+    """Sets the frequency of the subsystem through the CAT interface."""
+    print('Frequency point %d/%d, f=%.2f MHz' % (p['n'], p['N'], p['x']/1e6))
+    sercmd = 'FA%09d;' % (int(p['x']))
     ser.write(serial.to_bytes(sercmd.encode()))
     fa_query = 'FA;'
     ser.write(serial.to_bytes(fa_query.encode()))
     response =ser.readline().decode('UTF-8')
     print('  CAT response: ' + response)
-    scope.write('TRIGger:SOURce CHANnel1')
-    time.sleep(0.5)
-    meas_freq_0[k] = float(scope.query('MEASure:COUNter? CHANnel1'))
-    scope.write('TRIGger:SOURce CHANnel2')
+
+def counter(chan):
+    """Frequency counter reading on channel 'chan', triggering on that channel."""
+    scope.write('TRIGger:SOURce CHANnel%d' % (chan))
     time.sleep(0.5)
-    meas_freq_90[k] = float(scope.query('MEASure:COUNter? CHANnel2'))
-    phdiff[k] = float(scope.query(':MEAS:PHASe? CHAN2'))
-    print('  Measured frequency:', meas_freq_0[k], 'Hz / ', meas_freq_90[k], 'Hz')
-    print('  Phase difference:', phdiff[k], 'deg')
-    
+    return float(scope.query('MEASure:COUNter? CHANnel%d' % (chan)))
+
+# Frequency sweep (see sweep.py)
+sweep = Sweep(test, freq,
+              stimulus=[Call(set_frequency)],
+              measure=[Call(lambda p: counter(1), 'meas_freq_0', inst=scope),
+                       Call(lambda p: counter(2), 'meas_freq_90', inst=scope),
+                       Query(scope, ':MEAS:PHASe? CHAN2', 'phase')],
+              report=('  Measured frequency: %(meas_freq_0)s Hz /  %(meas_freq_90)s Hz\n'
+                      '  Phase difference: %(phase)s deg'),
+              view=view, plot=['phase'], mask=mask, checks=['phase'])
+
+# Frequency sweep loop
+sweep.run()
+
+sweep.close()
 scope.close()
 
 print('TX/RX SWITCH TEST')
-print('About to initiate TX/RX switch test.')
-user_prompt()
+test.prompt('About to initiate TX/RX switch test.')
 
 print('Entering transmit mode')
 tx_set = 'TX1;'
@@ -165,36 +168,11 @@ print('Receive mode set. Check that /TXEN = 3.3V and there is continuity between
 ser.close()
 print('Done')
     
-# Save and plot data
-savetxt('freq.txt', (freq, meas_freq_0, meas_freq_90))
-
-fig, ax = subplots()
-ax.plot(freq/1e6, meas_freq_0/1e6)
-ax.plot(freq/1e6, meas_freq_90/1e6)
-ax.set_xlabel('Command frequency [MHz]');
-ax.set_ylabel('Actual frequency [MHz]');
-ax.grid(True)
-ax.legend(('LO_0', 'LO_90'))
-ax.set_title('Frequency output of Subsystem C')
-savefig('freq.png')
-
-freq_error_0 = meas_freq_0 - freq;
-freq_error_90 = meas_freq_90 - freq;
-
-fig, ax = subplots()
-ax.plot(freq/1e6, freq_error_0)
-ax.plot(freq/1e6, freq_error_90)
-ax.set_xlabel('Command frequency [MHz]');
-ax.set_ylabel('Frequency error [Hz]');
-ax.grid(True)
-ax.legend(('LO_0', 'LO_90'))
-ax.set_title('Frequency error of Subsystem C')
-savefig('freq_error.png')
-
-fig, ax = subplots()
-ax.plot(freq/1e6, phdiff)
-ax.set_xlabel('Command frequency [MHz]');
-ax.set_ylabel('Phase shift [deg]');
-ax.grid(True)
-ax.set_title('Phase of Subsystem C')
-savefig('phase.png')
+# Save data and draw plots (see render.py)
+sweep.save('freq.txt', 'x', 'meas_freq_0', 'meas_freq_90', 'phase')
+
+print('Overall spec mask result:', mask.verdict())
+
+background_render = True        # Draw the figures without waiting for them
+#background_render = False
+render_figures(['freq.png', 'freq_error.png', 'phase.png'], background_render)
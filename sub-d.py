@@ -2,11 +2,12 @@
 """Subsystem D unit testing script.
 This script measures the frequency response of the modulator."""
 
-import pyvisa
-import time
+from sweep import Test, Sweep, Commands, Query, Digitize
 from numpy import *
-from matplotlib.pyplot import *
-import sys
+from render import render_figures
+from metrics import conversion_gain_dB
+from liveview import LiveView
+from fixturecal import stimulus_ampl, reference_setup
 
 __author__ = 'Sean Victor Hum'
 __copyright__ = 'Copyright 2025'
@@ -14,56 +15,30 @@ __license__ = 'GPL'
 __version__ = '1.0'
 __email__ = 'sean.hum@utoronto.ca'
 
-def user_prompt():
-    str = input('Hit Enter to proceed or ! to abort:')
-    if (str == '!'):
-        print('Measurement aborted')
-        user_abort()
-
-def user_abort():
-        scope.write(':WGEN:OUTP OFF')
-        scope.close()
-        sys.exit(1)
-
-def check_scales():
-    scale1 = scope.query(':CHAN1:SCAL?')
-    scale2 = scope.query(':CHAN2:SCAL?')
-
-    if (scale1 != scale2):
-        print('The scales of the 2 channels do not match.')
-        user_abort()
-        
-# Open instrument connection(s)
-rm = pyvisa.ResourceManager()
+# Open instrument connection(s). Each instrument is connected the first
+# time it is used (see bench.py).
 school_ip = True
 #school_ip = False
-if (school_ip):
-    scope = rm.open_resource('TCPIP0::192.168.0.253::hislip0::INSTR')
-else:
-    scope = rm.open_resource('TCPIP0::192.168.2.253::hislip0::INSTR')
-
-# Define string terminations and timeouts
-scope.write_termination = '\n'
-scope.read_termination = '\n'
-scope.timeout = 10000           # 10s
-
-# Get ID info
-scope_id = scope.query('*IDN?').strip().split(',')
-print('Connected to oscilloscope:', scope_id[1], flush=True)
-
-# Set probe scaling to 1:1
-scope.write('CHANnel1:PROBe +1.0')
-scope.write('CHANnel2:PROBe +1.0')
-
-# Setup trigger
-scope.write(':TRIG:SWEep AUTO')
-scope.write(':TRIG:EDGE:SOURce CHAN1')
-scope.write(':TRIG:EDGE:LEVel +0.0')
+test = Test('sub-d', school_ip, 'scope', off=[('scope', ':WGEN:OUTP OFF')])
+scope = test['scope']
+
+scope_setup = [
+    # Set probe scaling to 1:1
+    'CHANnel1:PROBe +1.0',
+    'CHANnel2:PROBe +1.0',
+    # Both channels on (a reset leaves only CH1 on)
+    'CHANnel1:DISPlay ON',
+    'CHANnel2:DISPlay ON',
+    # Setup trigger
+    ':TRIG:SWEep AUTO',
+    ':TRIG:EDGE:SOURce CHAN1',
+    ':TRIG:EDGE:LEVel +0.0',
+]
+test.setup('scope', scope_setup, method='setup')
 
 #print('Trigger:', scope.query(':TRIG?'), flush=True)
 
-print('Connect your subsystem as shown in the wiring diagram and power it on.')
-user_prompt()
+test.prompt('Connect your subsystem as shown in the wiring diagram and power it on.')
 
 # Setup function generator on scope as stimulus
 scope.write(':WGEN:FUNC SIN')
@@ -76,11 +51,10 @@ scope.write(':CHAN1:COUP AC')
 scope.write(':CHAN2:COUP AC')
 
 # Check phase shift
-print('Adjust the timebase and triggering so the signals are stable.')
-print('Adjust the voltage scale on CH1 and CH2 so they are identical')
-print('and the 2 signals occupy most of the screen.')
-user_prompt()
-check_scales()
+test.prompt('Adjust the timebase and triggering so the signals are stable.',
+            'Adjust the voltage scale on CH1 and CH2 so they are identical',
+            'and the 2 signals occupy most of the screen.')
+test.check_scales()
 
 phdiff = float(scope.query(':MEAS:PHASe? CHAN1'))
 print('Measured phase shift between I and Q for 1 kHz message signal:', phdiff, 'deg')
@@ -99,71 +73,68 @@ freq = arange(N)*100 + 100
 
 input_ampl = 0.316*sqrt(2)              # Amplitude of wave generator output
 
+# The stimulus can be teed to a spare scope channel and measured in the same
+# acquisition as the outputs, so that the gain at each point is a ratio of
+# measured amplitudes rather than relative to 'input_ampl' (see fixturecal.py)
+ref_chan = None                 # Scope channel the stimulus is teed to, or None
+#ref_chan = 3
+
 print('The following message frequencies will be measured:', freq)
 
-# Initialize vectors for storing data
-ampl_i = zeros(N, float)
-ampl_q = zeros(N, float)
-phdiff = zeros(N, float)
+live_view = False               # Show the curves live as they are measured
+#live_view = True
+view = LiveView('Modulator response', freq, ['I', 'Q'], 'Message frequency [Hz]',
+                '|I|, |Q| [dB]', enabled=live_view)
 
 scope.write(':TIMebase:SCAL +1.0E-03')
 scope.write(':WGEN:volt %e' % (input_ampl))
 scope.write(":WGEN:FREQ %e" % freq[0])
-
-print('Adjust the triggering so the signals are stable.')
-print('Adjust the voltage scale on CH1 and CH2 so they are identical')
-print('and the 2 signals occupy most of the screen.')
-user_prompt()
-check_scales()
+if (ref_chan is not None):
+    scope.write(reference_setup(ref_chan, input_ampl))
+
+test.prompt('Adjust the triggering so the signals are stable.',
+            'Adjust the voltage scale on CH1 and CH2 so they are identical',
+            'and the 2 signals occupy most of the screen.')
+test.check_scales()
+
+measure = [Query(scope, ':MEAS:VPP? CHAN1', 'ampl_i'),
+           Query(scope, ':MEAS:VPP? CHAN2', 'ampl_q'),
+           Query(scope, ':MEAS:PHASe? CHAN1', 'phase')]
+acquire = None
+if (ref_chan is not None):
+    # A single acquisition per point, so the stimulus is measured with the outputs
+    measure.append(Query(scope, ':MEAS:VPP? CHAN%d' % (ref_chan), 'ampl_ref'))
+    acquire = Digitize(scope)
+
+# Stimulus amplitude at each point, from the fixture calibration if there is
+# one (see fixturecal.py), unless the stimulus is measured on 'ref_chan'
+if (ref_chan is None):
+    stim_cal = stimulus_ampl(freq, input_ampl, scope.idn)
+else:
+    stim_cal = full(len(freq), input_ampl)
+
+# Frequency sweep (see sweep.py)
+sweep = Sweep(test, freq, axes={'stim_cal': stim_cal},
+              stimulus=[Commands(scope, ':WGEN:FREQ %e')],
+              measure=measure, acquire=acquire,
+              derived={'kHz': lambda p: p['x']/1e3,
+                       'stim': lambda p: p['stim_cal'] if (ref_chan is None) else p['ampl_ref'],
+                       'gain_i': lambda p: conversion_gain_dB(p['ampl_i'], p['stim']),
+                       'gain_q': lambda p: conversion_gain_dB(p['ampl_q'], p['stim'])},
+              report='Frequency point %(n)d/%(N)d, f=%(kHz).4f kHz: %(ampl_i)f %(ampl_q)f %(phase)f',
+              view=view, plot=['gain_i', 'gain_q'])
 
 # Frequency sweep 1
-for k in range(N):
-    scope.write(":WGEN:FREQ %e" % freq[k])
-    #scope.write(':SINGle')
-    ampl_i[k] = float(scope.query(':MEAS:VPP? CHAN1'))
-    ampl_q[k] = float(scope.query(':MEAS:VPP? CHAN2'))
-    phdiff[k] = float(scope.query(':MEAS:PHASe? CHAN1'))
-    print('Frequency point %d/%d, f=%.4f kHz: %f %f %f' % (k+1, N, freq[k]/1e3, ampl_i[k], ampl_q[k], phdiff[k]))
+sweep.run()
 
 print('Done')
+sweep.close()
+test.finish()
     
-scope.write(':WGEN:OUTP OFF')
-scope.close()
-    
-# Save and plot data
-savetxt('mod_iq.txt', (freq, ampl_i, ampl_q, phdiff));
-
-# H2 = (ampl_i/input_ampl)**2 + (ampl_q/input_ampl)**2
-# H2max = max(H2)
-
-# fig, ax = subplots()
-# ax.plot(freq, 10*log10(H2/H2max))
-# ax.set_xlabel('Message frequency [Hz]');
-# ax.set_ylabel('Normalized modulator transfer function [dB]');
-# ax.grid(True)
-# savefig('mod_bode.png')
-
-fig, ax = subplots()
-ax.plot(freq, 20*log10(ampl_i/input_ampl))
-ax.semilogx(freq, 20*log10(ampl_q/input_ampl))
-ax.set_xlabel('Message frequency [Hz]');
-ax.set_ylabel('|I|, |Q| [dB]');
-ax.legend(('I', 'Q'))
-ax.grid(True)
-savefig('mod_iq_compare.png')
-
-fig, ax = subplots()
-
-ax.set_xlabel('Message frequency [Hz]')
-ax.set_ylabel('Amplitude balance I/Q [dB]')
-ax.plot(freq, 20*log10(ampl_i/ampl_q))
-ax.grid(True)
-savefig('mod_balance_ampl.png')
-
-fig, ax = subplots()
-ax.set_xlabel('Message frequency [Hz]')
-ax.set_ylabel('Phase shift between I and Q [deg]')
-ax.plot(freq, phdiff)
-ax.grid(True)
-ax.set_ylim((-200, 200))
-savefig('mod_balance_phase.png')
+# Save data and draw plots (see render.py)
+sweep.save('mod_iq.txt', 'x', 'ampl_i', 'ampl_q', 'phase', stim_ampl=sweep['stim'])
+
+background_render = True        # Draw the figures without waiting for them
+#background_render = False
+render_figures(['mod_iq_compare.png', 'mod_balance_ampl.png', 'mod_balance_phase.png'],
+               background_render)
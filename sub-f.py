@@ -1,11 +1,16 @@
 #!/usr/bin/env python
 """Subsystem E unit testing script."""
 
-import pyvisa
+from sweep import Test, Sweep, Commands, Call
 import time
 from numpy import *
-from matplotlib.pyplot import *
-import sys
+from render import save_params, render_figures
+from metrics import dB, rf_power, harmonic_power, efficiency, thd
+from liveview import LiveView
+from pipeline import digitize
+from waveform import read_raw, scale
+from supplylog import SupplyLogger
+from specmask import Limit, SpecMask
 
 __author__ = 'Sean Victor Hum'
 __copyright__ = 'Copyright 2023'
@@ -13,58 +18,54 @@ __license__ = 'GPL'
 __version__ = '1.0'
 __email__ = 'sean.hum@utoronto.ca'
 
-def user_prompt():
-    str = input('Hit Enter to proceed or ! to abort:')
-    if (str == '!'):
-        print('Measurement aborted')
-        fxngen.write('OUTPut1 OFF')
-        fxngen.write('OUTPut2 OFF')
-        scope.close()
-        supply.close()
-        fxngen.close()
-        sys.exit(1)
-
-# Open instrument connection(s)
-rm = pyvisa.ResourceManager()
+def measure_harmonics(f0, settle=1):
+    """Reads the FFT amplitudes (dBV) of the first 5 harmonics of 'f0' using
+    the two scope markers. Harmonics outside the FFT span are returned as nan."""
+    A_dBV = zeros(5, float)
+    for n in range(0, 5, 2):
+        scope.write(':MARKer:X1P %e' % ((n+1)*f0))
+        if (n < 4):
+            scope.write(':MARKer:X2P %e' % ((n+2)*f0))
+        time.sleep(settle)
+        A_dBV[n] = float(scope.query(':MARK:Y1P?'))
+        if (n < 4):
+            A_dBV[n+1] = float(scope.query(':MARK:Y2P?'))
+    A_dBV[arange(1, 6)*f0 > fft_fmax] = nan
+    return A_dBV
+
+def fft_harmonics(f0, width=2):
+    """Reads the FFT of the current acquisition once and returns the
+    amplitudes (dBV) of the first 5 harmonics of 'f0', each the peak within
+    'width' bins of the harmonic. Harmonics outside the FFT span are
+    returned as nan."""
+    (raw, pre) = read_raw(scope, 'FFT', 'WORD')
+    A = scale(raw, pre)
+    k = rint((arange(1, 6)*f0 - pre.xorigin)/pre.xincrement + pre.xreference).astype(int)
+    (lo, hi) = (clip(k - width, 0, len(A)), clip(k + width + 1, 0, len(A)))
+    A_dBV = array([A[a:b].max() if (b > a) else nan for (a, b) in zip(lo, hi)], float)
+    A_dBV[arange(1, 6)*f0 > fft_fmax] = nan
+    return A_dBV
+
+# Open instrument connection(s). Each instrument is connected the first
+# time it is used (see bench.py).
 school_ip = True
 #school_ip = False
-if (school_ip):
-    scope = rm.open_resource('TCPIP0::192.168.0.253::hislip0::INSTR')
-    supply = rm.open_resource('TCPIP0::192.168.0.251::5025::SOCKET')
-    fxngen = rm.open_resource('TCPIP0::192.168.0.254::5025::SOCKET')
-else:
-    scope = rm.open_resource('TCPIP0::192.168.2.253::hislip0::INSTR')
-    supply = rm.open_resource('TCPIP0::192.168.2.251::5025::SOCKET')
-    fxngen = rm.open_resource('TCPIP0::192.168.2.254::5025::SOCKET')
-
-# Define string terminations and timeouts
-scope.write_termination = '\n'
-scope.read_termination = '\n'
-fxngen.write_termination = '\n'
-fxngen.read_termination = '\n'
-supply.write_termination = '\n'
-supply.read_termination = '\n'
-scope.timeout = 10000           # 10s
-supply.timeout = 10000          # 10s
-
-# Get ID info
-scope_id = scope.query('*IDN?').strip().split(',')
-fxngen_id = fxngen.query('*IDN?').strip().split(',')
-supply_id = supply.query('*IDN?').strip().split(',')
-print('Connected to oscilloscope:', scope_id[1], flush=True)
-print('Connected to function generator:', fxngen_id[1], flush=True)
-print('Connected to power supply:', supply_id[1], flush=True)
+test = Test('sub-f', school_ip, 'scope', 'supply', 'fxngen',
+            off=[('fxngen', 'OUTPut1 OFF'), ('fxngen', 'OUTPut2 OFF')])
+scope, supply, fxngen = test['scope'], test['supply'], test['fxngen']
 
 ## SCOPE
 
-# Set probe scaling to 1:1
-scope.write('CHANnel1:PROBe +1.0')
-scope.write('CHANnel2:PROBe +1.0')
-
-# Setup trigger
-scope.write(':TRIG:SWEep AUTO')
-scope.write(':TRIG:EDGE:SOURce CHAN1')
-scope.write(':TRIG:EDGE:LEVel +0.0')
+scope_setup = [
+    # Set probe scaling to 1:1
+    'CHANnel1:PROBe +1.0',
+    'CHANnel2:PROBe +1.0',
+    # Setup trigger
+    ':TRIG:SWEep AUTO',
+    ':TRIG:EDGE:SOURce CHAN1',
+    ':TRIG:EDGE:LEVel +0.0',
+]
+test.setup('scope', scope_setup, method='setup')
 
 #print('Trigger:', scope.query(':TRIG?'), flush=True)
 
@@ -80,31 +81,35 @@ print()
 
 drive_amplitude = 1.0          # Set to input drive amplitude required (Vpp)
 
-# Set waveform generator output impedance to high Z
-fxngen.write('OUTPUT1:LOAD INF')
-fxngen.write('OUTPUT2:LOAD INF')
-fxngen.write('UNIT:ANGL DEG')
-
-# Setup waveform generator
-fxngen.write('SOUR1:FUNCtion SIN')
-fxngen.write('SOUR1:FREQuency %e' % (14e6))
-fxngen.write('SOUR1:VOLTage %e' % (drive_amplitude))
-fxngen.write('SOUR1:VOLTage:OFFSet +0.0')
-fxngen.write('SOUR1:PHASe:SYNC')
-fxngen.write('SOUR1:PHASe +0.0')
-#fxngen.write('OUTPut1 ON')
-
-fxngen.write('SOUR2:FUNCtion SIN')
-fxngen.write('SOUR2:FREQuency %e' % (14e6))
-fxngen.write('SOUR2:VOLTage %e' % (drive_amplitude))
-fxngen.write('SOUR2:VOLTage:OFFSet +0.0')
-fxngen.write('SOUR2:PHASe:SYNC')
-fxngen.write('OUTPut2:POL INV')
-#fxngen.write('OUTPut2 ON')
-
-print('Connect your subsystem as shown in the wiring diagram and power it on.')
-print('Make sure you have asserted the /TXEN line (set it low)!')
-user_prompt()
+# RF output power limit for the nominal 1 Vpp drive
+spec_abort = False              # Set to True to stop as soon as the spec fails
+mask = SpecMask('sub-f', [Limit('P1', lo=1.0, units='W')], spec_abort, test.abort)
+
+fxngen_setup = [
+    # Set waveform generator output impedance to high Z
+    'OUTPUT1:LOAD INF',
+    'OUTPUT2:LOAD INF',
+    'UNIT:ANGL DEG',
+    # Setup waveform generator
+    'SOUR1:FUNCtion SIN',
+    'SOUR1:FREQuency %e' % (14e6),
+    'SOUR1:VOLTage %e' % (drive_amplitude),
+    'SOUR1:VOLTage:OFFSet +0.0',
+    'SOUR1:PHASe:SYNC',
+    'SOUR1:PHASe +0.0',
+    #'OUTPut1 ON',
+    'SOUR2:FUNCtion SIN',
+    'SOUR2:FREQuency %e' % (14e6),
+    'SOUR2:VOLTage %e' % (drive_amplitude),
+    'SOUR2:VOLTage:OFFSet +0.0',
+    'SOUR2:PHASe:SYNC',
+    'OUTPut2:POL INV',
+    #'OUTPut2 ON',
+]
+test.setup('fxngen', fxngen_setup)
+
+test.prompt('Connect your subsystem as shown in the wiring diagram and power it on.',
+            'Make sure you have asserted the /TXEN line (set it low)!')
 
 # Turn on power supply (not necessary)
 #supply.write('OUTP ON, (@2)')
@@ -124,11 +129,10 @@ scope.write(':CHAN1:COUP AC')
 scope.write(':CHAN1:DISP ON')
 scope.write(':FFT:DISP OFF')
 
-print('Adjust the timebase and triggering so the signals are stable.')
-print('You may adjust the operating frequency if you wish (default: 14 MHz).')
-print('Adjust the voltage scale on CH1 so that it is stable and the')
-print('signal occupies most of the screen.')
-user_prompt()
+test.prompt('Adjust the timebase and triggering so the signals are stable.',
+            'You may adjust the operating frequency if you wish (default: 14 MHz).',
+            'Adjust the voltage scale on CH1 so that it is stable and the',
+            'signal occupies most of the screen.')
 
 # Query power supply and scope for single point measurement
 V = float(supply.query('VOLT? (@2)'))
@@ -142,16 +146,14 @@ print('Current draw (active):', Iactive, 'A')
 print('DC power consumption:', Pactive, 'W')
 print('RF RMS voltage output:', Vrms, 'Vrms')
 
-print('About to initiate FFT analysis.')
-user_prompt()
-
-A_dBV = zeros(5, float)         # Vector to store first 5 harmonic amplitudes
+test.prompt('About to initiate FFT analysis.')
 
 # Setup FFT
+fft_fmax = 75e6                 # Highest frequency covered by the FFT
 scope.write(':CHAN1:DISP OFF')
 scope.write(':FFT:DISP ON')
-scope.write(':FFT:CENT 37.5 MHz')
-scope.write(':FFT:SPAN 75 MHz')
+scope.write(':FFT:CENT %e' % (fft_fmax/2))
+scope.write(':FFT:SPAN %e' % (fft_fmax))
 scope.write(':FFT:SOUR CHAN1')
 scope.write(':TIMebase:SCAL +1.0E-06') # 1 us/div
 scope.write(':MARKer:X1Y1source FFT')
@@ -163,47 +165,28 @@ f0 = float(fxngen.query('SOUR1:FREQ?'))
 print('Source frequency set to:', f0/1e6, 'MHz')
 
 # Measure harmonics
-scope.write(':MARKer:X1P %e' % (f0))
-scope.write(':MARKer:X2P %e' % (2*f0))
-time.sleep(1)
-A_dBV[0] = float(scope.query(':MARK:Y1P?'))
-A_dBV[1] = float(scope.query(':MARK:Y2P?'))
-
-scope.write(':MARKer:X1P %e' % (3*f0))
-scope.write(':MARKer:X2P %e' % (4*f0))
-time.sleep(1)
-A_dBV[2] = float(scope.query(':MARK:Y1P?'))
-A_dBV[3] = float(scope.query(':MARK:Y2P?'))
-
-scope.write(':MARKer:X1P %e' % (5*f0))
-time.sleep(1)
-A_dBV[4] = float(scope.query(':MARK:Y1P?'))
+A_dBV = measure_harmonics(f0)
 
 # Calculate power spectrum
 n = arange(1, 6)
-Pcoeffs = (10**(A_dBV/20))**2/50
-P_dBW = 10*log10(Pcoeffs)
+Pcoeffs = harmonic_power(A_dBV)
+P_dBW = dB(Pcoeffs)
 print('Measured harmonics (dBV):', A_dBV)
 
 P1 = Pcoeffs[0]
 print('RF power output at %.1f MHz: %f W' % (f0/1e6, P1))
-eff = P1/Pactive
+eff = efficiency(P1, Pactive)
 
-if (P1 < 1.0):
+if (not mask.check('P1', P1, f0)):
     print('Warning: RF output power < 1 W for 1 Vpp input signal!')
 
 print('DC-to-RF power conversion efficiency:', eff*100, '%')
 
 # Calculate THD
-A = 10**(A_dBV/20)
-A2 = A**2
-numerator = sqrt(sum(A2[1:]))
-denominator = A[0]
-THD = numerator/denominator
+THD = thd(A_dBV)
 print('Total harmonic distortion:', THD*100, '%')
 
-print('About to initiate frequency sweep.')
-user_prompt()
+test.prompt('About to initiate frequency sweep.')
 
 # Restore display
 scope.write(':CHAN1:DISP ON')
@@ -213,61 +196,96 @@ scope.write(':TIMebase:SCAL +5.0E-08') # 5 us/div
 # Frequency sweep
 N = 41                          # Number of frequency points 
 freq = arange(N)/(N-1)*14e6 + 4e6 # Array of frequency points
-Vout = zeros(N, float)
+
+live_view = False               # Show the curves live as they are measured
+#live_view = True
+view = LiveView('PA Frequency Response for Vin = %.1f Vpp' % (drive_amplitude), freq/1e6,
+                ['Pout'], 'Frequency [MHz]', 'RF output power [dBW]', enabled=live_view)
+
+# Harmonics and supply current can also be measured at every frequency point.
+# The harmonics are taken from the FFT of the stopped acquisition of each
+# point, read once as a trace, so there is no marker to move or wait for.
+# The supply current is logged in the background for the whole sweep and
+# averaged over the time each point spends on its harmonic measurement.
+sweep_harmonics = True
+#sweep_harmonics = False
+
+if (sweep_harmonics):
+    scope.write(':FFT:DISP ON')
+    logger = SupplyLogger(supply)
+    logger.start()
+
+# In a pipelined sweep, the function generator is moved on to the next
+# frequency while the harmonics of the current point are read back from a
+# single acquisition (see pipeline.py). The supply current is then averaged
+# over the second half of the settling time and the acquisition.
+pipelined = True
+#pipelined = False
+settle = 1                      # Settling time after a frequency change (s)
+
+def acquire(p):
+    """Captures point 'p' and reads the output voltage, then captures the
+    FFT if the harmonics are measured. Returns the voltage and the interval
+    over which the supply current is averaged."""
+    t_start = time.monotonic() - settle/2
+    digitize(scope)
+    Vout = float(scope.query(':MEAS:VRMS? CHAN1'))
+    if (sweep_harmonics):
+        scope.write(':TIMebase:SCAL +1.0E-06')
+        digitize(scope)
+    return Vout, t_start, time.monotonic()
+
+def readback(p):
+    if (sweep_harmonics):
+        A = fft_harmonics(p['x'])
+        scope.write(':TIMebase:SCAL +5.0E-08')
+        return A
+
+# Frequency sweep (see sweep.py)
+sweep = Sweep(test, freq,
+              stimulus=[Commands(fxngen, 'SOUR1:FREQuency %e', 'SOUR1:PHASe:SYNC',
+                                 'SOUR1:PHASe +0.0', 'SOUR2:FREQuency %e',
+                                 'SOUR2:PHASe:SYNC', 'OUTPut2:POL INV')],
+              acquire=Call(acquire, 'Vout', 't_start', 't_stop', inst=scope),
+              measure=[Call(readback, 'A', inst=scope)],
+              settle=settle, pipelined=pipelined,
+              derived={'MHz': lambda p: p['x']/1e6,
+                       'Pout': lambda p: dB(rf_power(p['Vout']))},
+              report='Frequency = %(MHz)f MHz, V = %(Vout)f Vrms',
+              view=view, plot=['Pout'])
 
 print('Measuring frequency response...')
-for k in range(N):
-    fxngen.write('SOUR1:FREQuency %e' % (freq[k]))
-    fxngen.write('SOUR1:PHASe:SYNC')
-    fxngen.write('SOUR1:PHASe +0.0')
-    fxngen.write('SOUR2:FREQuency %e' % (freq[k]))
-    fxngen.write('SOUR2:PHASe:SYNC')
-    fxngen.write('OUTPut2:POL INV')
-    time.sleep(1)
-    Vout[k] = float(scope.query(':MEAS:VRMS? CHAN1'))
-    print('Frequency = %f MHz, V = %f Vrms' % (freq[k]/1e6, Vout[k]))
+sweep.run()
 print('Done')
+sweep.close()
+
+if (sweep_harmonics):
+    logger.stop()
+    scope.write(':FFT:DISP OFF')
     
 # Turn of waveform generator and close connections
-fxngen.write('OUTPut1 OFF')
-fxngen.write('OUTPut2 OFF')
-
-scope.close()
-supply.close()
-fxngen.close()
+test.finish()
 
-# Save and plot data
-Prf = Vout**2/50
+# Save data and draw plots (see render.py)
+Prf = rf_power(sweep['Vout'])
 savetxt('pout.txt', (freq, Prf))
 savetxt('spectrum.txt', (n, Pcoeffs))
-
-# Plot Pout vs frequency (dBW)
-fig, ax = subplots()
-ax.plot(freq/1e6, 10*log10(Prf))
-ax.set_xlabel('Frequency [MHz]')
-ax.set_ylabel('RF output power [dBW]')
-ax.grid(True)
-ax.set_title('PA Frequency Response for Vin = %.1f Vpp' % (drive_amplitude))
-savefig('pout_dBW.png')
-
-# Plot Pout vs frequency (W)
-fig, ax = subplots()
-ax.plot(freq/1e6, Prf)
-# plot(freq/1e6, 20*log10(ampl_q/50e-3))
-ax.set_xlabel('Frequency [MHz]')
-ax.set_ylabel('RF output power [W]')
-ax.set_yscale('log')
-ax.set_ylim((1e-3, 10))
-ax.grid(True)
-ax.set_title('PA Frequency Response for Vin = %.1f Vpp' % (drive_amplitude))
-savefig('pout.png')
-
-# Plot output spectrum
-fig, ax = subplots()
-#ax.stem(n, Pcoeffs, use_line_collection=True)
-ax.stem(n, Pcoeffs)
-ax.set_ylabel('RF output power [W]')
-ax.set_yscale('log')
-ax.grid(True)
-ax.set_title('PA Output Spectrum: f = %.1f MHz, eff=%.1f %%, THD=%.1f %%' % (f0/1e6, eff*100, THD*100))
-savefig('spectrum.png')
+save_params('pout.txt', drive_amplitude=drive_amplitude)
+save_params('spectrum.txt', f0=f0, eff=eff, THD=THD)
+plots = ['pout_dBW.png', 'pout.png', 'spectrum.png']
+
+if (sweep_harmonics):
+    Idc = logger.mean_current(sweep['t_start'], sweep['t_stop'])
+    A_sweep = sweep['A']
+    P1_sweep = harmonic_power(A_sweep[:, 0])
+    eff_sweep = efficiency(P1_sweep, V*Idc)
+    THD_sweep = thd(A_sweep)
+    savetxt('harmonics.txt', (freq, Idc, P1_sweep, eff_sweep, THD_sweep))
+    save_params('harmonics.txt', drive_amplitude=drive_amplitude)
+    plots += ['eff.png', 'thd.png']
+
+print('Overall spec mask result:', mask.verdict())
+
+background_render = True        # Draw the figures without waiting for them
+#background_render = False
+render_figures(plots, background_render)
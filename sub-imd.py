@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""Two-tone intermodulation testing script.
+This script measures the linearity of Subsystem A or the PA with two closely
+spaced tones: at each of a few drive levels, the input and output are
+captured once, and the fundamentals and their IM3 and IM5 products are
+extracted from the capture (see twotone.py). The third-order intercept
+point is then estimated from the levels measured."""
+
+from sweep import Test, Sweep, Commands, Call
+import time
+from numpy import *
+from render import render_figures
+from metrics import tone_power_dBm, imd_dBc, oip3_dBm, intercept_dBm, slope
+from pipeline import digitize
+from waveform import read_raw, scale
+from wavearchive import Archive
+import twotone
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+# Open instrument connection(s). Each instrument is connected the first
+# time it is used (see bench.py).
+school_ip = True
+#school_ip = False
+test = Test('sub-imd', school_ip, 'scope', 'fxngen',
+            off=[('scope', ':WGEN:OUTP OFF'), ('fxngen', 'OUTPut1 OFF'), ('fxngen', 'OUTPut2 OFF')])
+scope, fxngen = test['scope'], test['fxngen']
+
+scope_setup = [
+    # Set probe scaling to 1:1
+    'CHANnel1:PROBe +1.0',
+    'CHANnel2:PROBe +1.0',
+    # Setup trigger
+    ':TRIG:SWEep AUTO',
+    ':TRIG:EDGE:SOURce CHAN2',
+    ':TRIG:EDGE:LEVel +0.0',
+]
+test.setup('scope', scope_setup, method='setup')
+
+# The two tones come from the two channels of the function generator, or
+# from the scope wave generator (f1) and channel 1 of the function
+# generator (f2), and are combined with a tee at the input of the subsystem.
+tone_source = 'fxngen'
+#tone_source = 'wgen'
+
+fc = 14e6                       # Centre frequency of the two tones
+spacing = 100e3                 # Spacing of the two tones
+f1 = fc - spacing/2
+f2 = fc + spacing/2
+levels = array([0.05, 0.1, 0.2, 0.4]) # Amplitude of each tone (Vpp)
+settle = 0.2                    # Settling time after a level change (s)
+points = 100000                 # Points in each capture
+
+# The raw captures can be kept in an archive, to look into a bad result
+# after the fact (see wavearchive.py)
+keep_waveforms = True
+#keep_waveforms = False
+archive_file = 'waveforms.m3w'
+run = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+test.prompt('Connect the two tones to the input of your subsystem through a tee',
+            'as shown in the wiring diagram, and power it on.',
+            'The subsystem output should be on CH1, and its input on CH2.')
+
+fxngen_setup = [
+    # Set waveform generator output impedance to high Z
+    'OUTPUT1:LOAD INF',
+    'OUTPUT2:LOAD INF',
+    # Setup waveform generator
+    'SOUR1:FUNCtion SIN',
+    'SOUR1:FREQuency %e' % (f1 if (tone_source == 'fxngen') else f2),
+    'SOUR1:VOLTage %e' % (levels[0]),
+    'SOUR1:VOLTage:OFFSet +0.0',
+    'OUTPut1 ON',
+]
+if (tone_source == 'fxngen'):
+    fxngen_setup += [
+        'SOUR2:FUNCtion SIN',
+        'SOUR2:FREQuency %e' % (f2),
+        'SOUR2:VOLTage %e' % (levels[0]),
+        'SOUR2:VOLTage:OFFSet +0.0',
+        'OUTPut2 ON',
+    ]
+    stimulus = [Commands(fxngen, 'SOUR1:VOLTage %e', 'SOUR2:VOLTage %e')]
+else:
+    scope.write(':WGEN:FUNC SIN')
+    scope.write(':WGEN:FREQ %e' % (f1))
+    scope.write(':WGEN:VOLT %e' % (levels[0]))
+    scope.write(':WGEN:OUTP ON')
+    stimulus = [Commands(fxngen, 'SOUR1:VOLTage %e'), Commands(scope, ':WGEN:VOLT %e')]
+test.setup('fxngen', fxngen_setup)
+
+# Setup acquisition: the capture must hold enough cycles of the difference
+# frequency to resolve the products (see twotone.py), and be sampled fast
+# enough for the highest IM5 product.
+timebase = 2*twotone.min_bins/spacing/10
+scope.write(':TIMebase:SCAL %e' % (timebase))
+scope.write(':CHAN1:COUP DC')
+scope.write(':CHAN2:COUP DC')
+scope.write(':CHAN1:DISP ON')
+scope.write(':CHAN2:DISP ON')
+scope.write(':ACQuire:TYPE NORMal')
+
+print('Tones at %.3f and %.3f MHz, levels (Vpp per tone):' % (f1/1e6, f2/1e6), levels)
+
+test.prompt('Adjust the voltage scales on CH1 and CH2 for the largest drive level',
+            'so that neither signal clips.')
+
+archive = Archive(archive_file, 'a') if (keep_waveforms) else None
+
+def capture(p):
+    """Captures the output and input once, and returns the amplitudes of
+    the products in both."""
+    digitize(scope)
+    v = []
+    for chan in (1, 2):
+        (raw, pre) = read_raw(scope, chan, 'WORD', points)
+        if (archive is not None):
+            archive.write(run, p['k'], chan, raw, pre)
+        v.append(scale(raw, pre))
+    (A, f) = twotone.analyze(vstack(v), pre.xincrement, f1, f2)
+    return A[0], A[1]
+
+def fund(P):
+    return mean(P[..., :2], axis=-1)
+
+# Drive level sweep (see sweep.py)
+sweep = Sweep(test, levels, stimulus=stimulus,
+              measure=[Call(capture, 'A_out', 'A_in', inst=scope)], settle=settle,
+              derived={'P_out': lambda p: tone_power_dBm(p['A_out']),
+                       'Pin': lambda p: fund(tone_power_dBm(p['A_in'])),
+                       'Pout': lambda p: fund(p['P_out']),
+                       'P_im3': lambda p: amax(p['P_out'][2:4]),
+                       'P_im5': lambda p: amax(p['P_out'][4:6]),
+                       'im3': lambda p: imd_dBc(p['P_im3'], p['Pout']),
+                       'im5': lambda p: imd_dBc(p['P_im5'], p['Pout']),
+                       'oip3': lambda p: oip3_dBm(p['Pout'], p['P_im3'])},
+              report=('Level %(n)d/%(N)d, %(x).3f Vpp: Pin %(Pin).1f dBm, Pout %(Pout).1f dBm, '
+                      'IM3 %(im3).1f dBc, IM5 %(im5).1f dBc, OIP3 %(oip3).1f dBm'))
+
+sweep.run()
+print('Done')
+sweep.close()
+test.finish()
+if (archive is not None):
+    archive.close()
+    print('Raw captures kept in %s as run %s' % (archive_file, run))
+
+# Intercept points fitted over the levels measured. The IM3 products should
+# rise 3 dB for every dB of drive; a lower slope means the smallest levels
+# are in the noise floor or the largest ones are compressing.
+(iip3, oip3) = intercept_dBm(sweep['Pin'], sweep['Pout'], sweep['P_im3'])
+print('Slope of fundamentals: %.2f dB/dB, IM3: %.2f dB/dB'
+      % (slope(sweep['Pin'], sweep['Pout']), slope(sweep['Pin'], sweep['P_im3'])))
+print('IIP3: %.1f dBm, OIP3: %.1f dBm' % (iip3, oip3))
+
+# Save data and draw plots (see render.py)
+sweep.save('imd.txt', 'x', 'Pin', 'Pout', 'P_im3', 'P_im5', f1=f1, f2=f2)
+
+background_render = True        # Draw the figures without waiting for them
+#background_render = False
+render_figures(['imd.png'], background_render)
@@ -0,0 +1,61 @@
+"""Background power supply logger.
+Samples the supply current in a separate thread while a sweep is running,
+so that the DC power drawn at each frequency point can be recovered
+afterwards from the time stamps of the samples."""
+
+import threading
+import time
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+class SupplyLogger(threading.Thread):
+    """Polls the output current of 'channel' on 'supply' every 'interval'
+    seconds until stop() is called. Nothing else may talk to the supply
+    while the logger is running, since VISA sessions are not thread-safe.
+    If a reading fails, logging stops and the error is reported by stop()."""
+
+    def __init__(self, supply, channel=2, interval=0.05):
+        threading.Thread.__init__(self, daemon=True)
+        self.supply = supply
+        self.channel = channel
+        self.interval = interval
+        self.t = []
+        self.curr = []
+        self.done = threading.Event()
+        self.error = None
+
+    def run(self):
+        while not self.done.is_set():
+            try:
+                I = float(self.supply.query('MEAS:CURR? CH%d' % (self.channel)))
+            except Exception as e:
+                self.error = e
+                return
+            self.t.append(time.monotonic())
+            self.curr.append(I)
+            self.done.wait(self.interval)
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        if (self.error is not None):
+            print('WARNING: supply current logging stopped after %d samples (%s: %s);'
+                  % (len(self.t), type(self.error).__name__, self.error))
+            print('the DC power of the points measured after that is unknown.')
+
+    def mean_current(self, t0, t1):
+        """Returns the mean current of all samples taken between the times
+        in 't0' and 't1' (scalars or arrays of time.monotonic() values).
+        Intervals containing no samples give nan."""
+        t = array(self.t)
+        csum = concatenate(([0.0], cumsum(self.curr)))
+        i0 = searchsorted(t, t0, side='left')
+        i1 = searchsorted(t, t1, side='right')
+        n = i1 - i0
+        with errstate(invalid='ignore', divide='ignore'):
+            return where(n > 0, (csum[i1] - csum[i0])/n, nan)
@@ -0,0 +1,340 @@
+"""Declarative sweep engine shared by the subsystem test scripts.
+A test script describes its sweep rather than writing out the loop: the
+points of the sweep (one or more stimulus axes), the stimulus backends that
+apply a point to the instruments, the measurement backends that read the
+results, the quantities derived from them, and what to print, plot live and
+check against the spec mask at each point. The engine then runs the loop,
+so settling, command batching and caching, and pipelined dispatch (see
+pipeline.py) apply to every test in the same way. Test holds the common
+parts of every script: the instruments, operator prompts and shutdown.
+
+Stimulus backends have an 'inst' attribute (the instrument they program, or
+None) and an apply(point) method. Measurement backends have an 'inst'
+attribute, a tuple 'names' of the quantities they return and a read(point)
+method returning their values. A point is a dictionary holding the index k,
+the point number n (from 1) and the number of points N, the value of each
+axis (the main axis is called 'x'), and the values measured and derived so
+far at that point.
+
+If the session with an instrument is lost during a point, the point is
+measured again once the instrument has been reconnected and its setup
+restored (see bench.py), up to 'point_retries' times. Stimulus backends
+may have a reset() method, called before a point is retried, that forgets
+anything they remember about the state of the instrument.
+
+Before a sweep runs, its duration is predicted from the backends and the
+measured latency of the instruments, and afterwards the prediction is
+checked against the actual time (see planner.py). The points may be
+measured in a different order from the one given (e.g. grouped by scope
+range; see scheduler.py), but their results are always kept in the order
+given."""
+
+import sys
+import time
+from numpy import *
+from bench import open_instruments, SessionLost
+from setups import load_setup
+from pipeline import pipelined_sweep, digitize
+from render import save_params
+from timeline import span
+import planner
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+point_retries = 3               # Times a point is retried after a lost session
+
+class Test:
+    """Instruments 'names' of subsystem test 'name' and the interaction with
+    the operator. 'off' lists the (instrument name, command) pairs that make
+    the bench safe (outputs off) when the test finishes or is aborted."""
+
+    def __init__(self, name, school_ip, *names, off=()):
+        self.name = name
+        insts = open_instruments(school_ip, *names)
+        self.insts = dict(zip(names, insts if (len(names) > 1) else [insts]))
+        self.off = off
+
+    def __getitem__(self, name):
+        return self.insts[name]
+
+    def setup(self, name, commands, method='lrn'):
+        """Configures instrument 'name' with the setup list 'commands' (see
+        setups.py)."""
+        inst = self.insts[name]
+        load_setup(inst, self.name, name, commands, method)
+        inst.baseline(lambda: load_setup(inst, self.name, name, commands, method))
+
+    def prompt(self, *lines):
+        """Prints 'lines' and waits for the operator, who may abort the test."""
+        for line in lines:
+            print(line)
+        str = input('Hit Enter to proceed or ! to abort:')
+        if (str == '!'):
+            print('Measurement aborted')
+            self.abort()
+
+    def check_scales(self, chan1=1, chan2=2, inst='scope'):
+        """Aborts the test unless the two scope channels have the same scale."""
+        scale1 = self.insts[inst].query(':CHAN%d:SCAL?' % (chan1))
+        scale2 = self.insts[inst].query(':CHAN%d:SCAL?' % (chan2))
+        if (scale1 != scale2):
+            print('The scales of the 2 channels do not match.')
+            self.abort()
+
+    def finish(self):
+        """Turns the outputs off and closes the instruments."""
+        for (name, cmd) in self.off:
+            self.insts[name].write(cmd)
+        for inst in self.insts.values():
+            inst.close()
+
+    def abort(self):
+        self.finish()
+        sys.exit(1)
+
+## Stimulus backends
+
+class Commands:
+    """Sends the SCPI commands 'templates' to 'inst', formatted with the value
+    of axis 'axis' times 'scale' plus 'offset' (templates without a % field
+    are sent as they are). The commands are sent as a single message, and
+    not at all if the message is the same as for the previous point. The
+    message ends with *OPC?, so that the stimulus is known to be complete
+    (and a lost session is noticed) before the point is measured."""
+
+    def __init__(self, inst, *templates, axis='x', scale=1, offset=0):
+        self.inst = inst
+        self.templates = templates
+        self.axis = axis
+        self.scale = scale
+        self.offset = offset
+        self.last = None
+
+    def apply(self, point):
+        x = point[self.axis]*self.scale + self.offset
+        cmds = [(t % (x) if ('%' in t) else t).lstrip(':') for t in self.templates]
+        msg = ':' + ';:'.join(cmds)
+        if (msg != self.last):
+            self.inst.write(msg)
+            self.inst.query('*OPC?')
+            self.last = msg
+
+    def reset(self):
+        self.last = None
+
+## Measurement backends
+
+class Query:
+    """Reads the numeric response of 'inst' to query 'cmd' as quantity 'name'."""
+
+    def __init__(self, inst, cmd, name):
+        self.inst = inst
+        self.cmd = cmd
+        self.names = (name,)
+
+    def read(self, point):
+        return (float(self.inst.query(self.cmd)),)
+
+class Digitize:
+    """Takes a single acquisition on the scope 'inst'. Measurements read
+    after it all come from the same acquisition."""
+    names = ()
+
+    def __init__(self, inst):
+        self.inst = inst
+
+    def read(self, point):
+        digitize(self.inst)
+        return ()
+
+class Call:
+    """Stimulus or measurement done by the function 'func' of the point,
+    using instrument 'inst'. As a measurement, 'func' returns the value of
+    each quantity in 'names' (or the value itself, if there is only one)."""
+
+    def __init__(self, func, *names, inst=None):
+        self.func = func
+        self.names = names
+        self.inst = inst
+
+    def apply(self, point):
+        self.func(point)
+
+    def read(self, point):
+        r = self.func(point)
+        return r if (len(self.names) != 1) else (r,)
+
+## Sweep engine
+
+def grid(**axes):
+    """Returns the points of a sweep over every combination of the values in
+    'axes', the last axis varying fastest, as a dictionary of equal-length
+    arrays for Sweep."""
+    values = meshgrid(*axes.values(), indexing='ij')
+    return {name: v.ravel() for (name, v) in zip(axes, values)}
+
+class Sweep:
+    """Sweep of 'test' over the points 'x' (main axis) and 'axes' (further
+    axes, e.g. from grid()), applying the backends in 'stimulus', waiting
+    'settle' seconds, and reading the backends in 'measure'. If given,
+    'acquire' is read first, while the stimulus is held.
+
+    At each point the quantities in 'derived' (functions of the point) are
+    calculated, 'report' is printed (a % format string over the point), the
+    quantities in 'plot' are sent to LiveView 'view', and each quantity in
+    'checks' is checked against the limit of the same name in spec mask
+    'mask' (if the mask aborts the test, it does so between points, on the
+    main thread). If 'pipelined' is True, the sweep is run with pipelined_sweep():
+    each point is captured with a single acquisition on the measurement
+    instrument, and stimulus backends using other instruments are applied in
+    parallel with the readback. Each acquisition lasts 'acq_time' seconds
+    and is averaged 'averages' times, for the prediction of the duration of
+    the sweep (see planner.py). The points are measured in the order of
+    their indices in 'order', if given."""
+
+    def __init__(self, test, x, stimulus, measure, acquire=None, settle=0,
+                 derived={}, report=None, view=None, plot=(), mask=None,
+                 checks=(), pipelined=False, axes={}, acq_time=0, averages=1,
+                 order=None):
+        self.test = test
+        self.axes = dict(axes)
+        self.axes['x'] = asarray(x)
+        self.N = len(self.axes['x'])
+        self.order = arange(self.N) if (order is None) else asarray(order)
+        self.stimulus = stimulus
+        self.measure = measure
+        self.inst = measure[0].inst
+        self.acquire = acquire
+        if (pipelined and acquire is None):
+            self.acquire = Digitize(self.inst)
+        self.settle = settle
+        self.derived = derived
+        self.report = report
+        self.view = view
+        self.plot = plot
+        self.mask = mask
+        self.checks = checks
+        self.pipelined = pipelined
+        self.acq_time = acq_time
+        self.averages = averages
+        self.data = {}
+        self.done = 0               # Points analyzed, in the order measured
+        self.retries = {}
+
+    def __getitem__(self, name):
+        """Returns the values of axis or quantity 'name' at every point."""
+        return self.axes[name] if (name in self.axes) else self.data[name]
+
+    def point(self, k):
+        p = {'k': k, 'n': k+1, 'N': self.N}
+        for name in self.axes:
+            p[name] = self.axes[name][k]
+        for (name, values) in list(self.data.items()):
+            p[name] = values[k]
+        return p
+
+    def store(self, k, names, values):
+        for (name, v) in zip(names, values):
+            if (v is None):
+                continue
+            if (name not in self.data):
+                self.data[name] = full((self.N,) + shape(v), nan)
+            self.data[name][k] = v
+
+    def apply(self, k, sync=None):
+        """Applies the stimulus of point k, using only the backends on the
+        measurement instrument if 'sync' is True, or only the others if False."""
+        p = self.point(k)
+        for s in self.stimulus:
+            if (sync is None or (s.inst is self.inst) == sync):
+                s.apply(p)
+
+    def take(self, k):
+        if (self.mask is not None):
+            self.mask.poll()
+        if (self.acquire is not None):
+            self.store(k, self.acquire.names, self.acquire.read(self.point(k)))
+
+    def readback(self, k):
+        p = self.point(k)
+        return [(m.names, m.read(p)) for m in self.measure]
+
+    def analyze(self, k, results):
+        with span('compute', 'point %d' % (k+1)):
+            for (names, values) in results:
+                self.store(k, names, values)
+            p = self.point(k)
+            for (name, f) in self.derived.items():
+                p[name] = f(p)
+                self.store(k, [name], [p[name]])
+            if (self.report is not None):
+                print(self.report % p)
+            if (self.view is not None):
+                self.view.update(k, *[p[name] for name in self.plot])
+            for name in self.checks:
+                self.mask.check(name, p[name], p['x'])
+        self.done += 1
+
+    def recover(self, k, error):
+        """Prepares to measure point k again after 'error' (SessionLost), or
+        raises it if the point has been retried too often."""
+        self.retries[k] = self.retries.get(k, 0) + 1
+        if (self.retries[k] > point_retries):
+            raise error
+        print('%s; measuring point %d again' % (error, k+1), flush=True)
+        for s in self.stimulus:
+            if (hasattr(s, 'reset')):
+                s.reset()
+
+    def measure_point(self, k):
+        while True:
+            try:
+                self.apply(k)
+                time.sleep(self.settle)
+                self.take(k)
+                return self.readback(k)
+            except SessionLost as e:
+                self.recover(k, e)
+
+    def run(self, k0=0, k1=None):
+        """Measures the points k0 to k1-1 of 'order' (by default, all of them)."""
+        k1 = self.N if (k1 is None) else k1
+        t_point = planner.predict(self, k1 - k0)
+        t0 = time.monotonic()
+        if (self.pipelined):
+            # After a lost session, restart from the first point not analyzed
+            self.done = k0
+            while (self.done < k1):
+                order = self.order[self.done:k1]
+                try:
+                    pipelined_sweep(len(order), self.settle,
+                                    lambda i: self.take(order[i]),
+                                    lambda i: self.readback(order[i]),
+                                    lambda i: self.apply(order[i], False),
+                                    lambda i: self.apply(order[i], True),
+                                    lambda i, r: self.analyze(order[i], r))
+                except SessionLost as e:
+                    self.recover(self.order[self.done], e)
+            if (self.mask is not None):
+                self.mask.poll()
+        else:
+            for k in self.order[k0:k1]:
+                self.analyze(k, self.measure_point(k))
+        if (self.acquire is not None):
+            self.inst.write(':RUN')
+        planner.check(self, t_point, time.monotonic() - t0, k1 - k0)
+
+    def close(self):
+        if (self.view is not None):
+            self.view.close()
+
+    def save(self, path, *names, **params):
+        """Saves the quantities 'names' as rows of text file 'path', with
+        'params' for plotting (see render.py)."""
+        savetxt(path, [self[name] for name in names])
+        if (params):
+            save_params(path, **params)
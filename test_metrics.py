@@ -0,0 +1,98 @@
+"""Checks of the derived quantities in metrics.py.
+Run with pytest. Each function is checked against values worked out by
+hand, for invalid readings (which must give nan, without warnings), and
+for scalar, sweep and batched (runs x points) inputs."""
+
+import warnings
+from numpy import (array, arange, full, nan, inf, isnan, isclose, allclose, array_equal,
+                   ndim, sqrt, log10, errstate, random)
+import metrics
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+invalid = [0, -1, nan, inf, metrics.no_result]
+
+def no_warnings(f, *args):
+    """Returns f(*args), failing if it raises any numpy warning."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        with errstate(all='raise'):
+            return f(*args)
+
+def test_clean_masks_invalid_readings():
+    assert array_equal(isnan(metrics.clean(invalid + [0.5])), [True]*5 + [False])
+    # Phases and frequency errors may be zero or negative
+    x = metrics.clean([0, -45, metrics.no_result, nan], positive=False)
+    assert array_equal(x[:2], [0, -45]) and isnan(x[2:]).all()
+
+def test_gain_dB():
+    # 1 V out of each of I and Q for a 1 V stimulus: 10 log10(2)
+    assert isclose(metrics.gain_dB(1, 1, 1), 10*log10(2))
+    assert isnan(metrics.gain_dB(0.1, 0, 0.05))
+    assert isclose(metrics.gain_dB(0.1, 0.1, 0.05), 10*log10(8))
+    for bad in invalid:
+        assert isnan(no_warnings(metrics.gain_dB, bad, 0.1, 0.05))
+        assert isnan(no_warnings(metrics.gain_dB, 0.1, 0.1, bad))
+
+def test_conversion_gain_and_balance():
+    assert isclose(metrics.conversion_gain_dB(0.5, 0.05), 20)
+    assert isclose(metrics.balance_dB(0.2, 0.1), 20*log10(2))
+    assert isnan(no_warnings(metrics.balance_dB, 0.2, 0))
+    assert metrics.phase_difference(-45, 45) == -90
+
+def test_normalized_dB():
+    x = array([[-3, 0, -10], [nan, nan, nan], [nan, 2, 1]])
+    n = no_warnings(metrics.normalized_dB, x)
+    assert array_equal(n[0], [-3, 0, -10])
+    assert isnan(n[1]).all()
+    assert isnan(n[2, 0]) and array_equal(n[2, 1:], [0, -1])
+
+def test_rejection_dB():
+    assert isclose(metrics.rejection_dB(1, 0.01), 40)
+    assert isnan(no_warnings(metrics.rejection_dB, 1, metrics.no_result))
+
+def test_freq_error():
+    assert isclose(metrics.freq_error(14.0001e6, 14e6), 100)
+    assert isnan(metrics.freq_error(metrics.no_result, 14e6))
+
+def test_pa_power_efficiency_thd():
+    # 10 V peak into 50 ohms: 2 W; harmonics at 0 dBV: 1/50 W
+    assert isclose(metrics.rf_power(10), 2)
+    assert isclose(metrics.harmonic_power(0), 1/50)
+    assert isclose(metrics.efficiency(2, 4), 0.5)
+    assert isnan(no_warnings(metrics.efficiency, 2, 0))
+    # Second and third harmonics 20 and 40 dB below the fundamental
+    A = [0, -20, -40, nan, nan]
+    assert isclose(metrics.thd(A), sqrt(0.1**2 + 0.01**2))
+    assert isnan(metrics.thd([nan, -20, -40, nan, nan]))
+
+def test_two_tone():
+    # 1 V peak into 50 ohms: 10 mW = 10 dBm
+    assert isclose(metrics.tone_power_dBm(1), 10)
+    assert metrics.imd_dBc(-40, 0) == -40
+    assert metrics.oip3_dBm(0, -40) == 20
+    # Ideal third-order amplifier with 10 dB gain and an IIP3 of 10 dBm
+    Pin = array([-30, -20, -10])
+    (iip, oip) = metrics.intercept_dBm(Pin, Pin + 10, 3*Pin - 2*10 + 10)
+    assert isclose(iip, 10) and isclose(oip, 20)
+    assert isclose(metrics.slope(Pin, 3*Pin + [0, nan, 0]), 3)
+
+def test_shapes():
+    # Scalars give scalars, and batches keep their (runs x points) shape
+    assert ndim(metrics.gain_dB(0.1, 0.1, 0.05)) == 0
+    rng = random.default_rng(1)
+    ampl = rng.uniform(0.01, 1, (4, 6))
+    g = metrics.gain_dB(ampl, ampl, 0.05)
+    assert g.shape == (4, 6)
+    assert allclose(g[2], [metrics.gain_dB(a, a, 0.05) for a in ampl[2]])
+    # A stimulus per point broadcasts over the runs
+    assert metrics.conversion_gain_dB(ampl, full(6, 0.05)).shape == (4, 6)
+    # The last axis runs over the harmonics or the drive levels
+    A = -20*rng.uniform(0, 3, (4, 6, 5))
+    assert metrics.thd(A).shape == (4, 6)
+    assert metrics.slope(arange(5.0), A).shape == (4, 6)
+    assert all([s.shape == (4, 6) for s in metrics.intercept_dBm(arange(5.0), A, 3*A)])
@@ -0,0 +1,220 @@
+"""Run timeline tracing.
+When the environment variable M3_TRACE is set to a file name, the time a
+test script spends in each of the following is recorded as a span, from
+start to finish of the run:
+- operator: waiting for the operator to answer a prompt (input());
+- sleep: fixed waits (time.sleep());
+- instrument: VISA I/O with each instrument;
+- serial: I/O on the CAT serial port;
+- render: handing the figures over to render.py;
+- compute: analysis of each sweep point (see sweep.py).
+At the end of the run, the spans are written to that file as a timeline in
+the Chrome trace event format (which can be opened in chrome://tracing or
+https://ui.perfetto.dev), and a summary of where the wall time of the run
+went is printed. Time on the main thread not spent in any span is counted
+as 'script'; spans on other threads (pipelined sweeps, the live view)
+overlap the main thread and are summarized separately.
+
+When M3_TRACE is not set, nothing is wrapped and tracing costs nothing."""
+
+import os
+import sys
+import json
+import time
+import builtins
+import threading
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+tracer = None                   # Tracer of this run, if any
+
+categories = ['operator', 'sleep', 'instrument', 'serial', 'render', 'compute']
+
+class Tracer:
+    def __init__(self, path):
+        self.path = path
+        self.t0 = time.perf_counter()
+        self.spans = []             # (category, name, start, end, thread)
+        self.threads = {}
+
+    def add(self, cat, name, t0, t1):
+        tid = threading.get_ident()
+        if (tid not in self.threads):
+            self.threads[tid] = threading.current_thread().name
+        self.spans.append((cat, name, t0, t1, tid))
+
+    def exclusive(self):
+        """Returns the time of each span less that of the spans nested in it."""
+        excl = [t1 - t0 for (cat, name, t0, t1, tid) in self.spans]
+        order = sorted(range(len(self.spans)), key=lambda i: (self.spans[i][4], self.spans[i][2], -self.spans[i][3]))
+        stack = []
+        for i in order:
+            (cat, name, t0, t1, tid) = self.spans[i]
+            while (stack and (self.spans[stack[-1]][4] != tid or self.spans[stack[-1]][3] <= t0)):
+                stack.pop()
+            if (stack):
+                excl[stack[-1]] -= t1 - t0
+            stack.append(i)
+        return excl
+
+    def write(self):
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                   'args': {'name': name}} for (tid, name) in self.threads.items()]
+        for (cat, name, t0, t1, tid) in self.spans:
+            events.append({'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': round((t0 - self.t0)*1e6, 1), 'dur': round((t1 - t0)*1e6, 1)})
+        with open(self.path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                       'otherData': {'script': os.path.basename(sys.argv[0])}}, f)
+
+    def summary(self):
+        wall = time.perf_counter() - self.t0
+        main = threading.main_thread().ident
+        fg = dict.fromkeys(categories, 0.0)
+        bg = dict.fromkeys(categories, 0.0)
+        count = dict.fromkeys(categories, 0)
+        for (span, t) in zip(self.spans, self.exclusive()):
+            (fg if (span[4] == main) else bg)[span[0]] += t
+            count[span[0]] += 1
+        print('Run timeline (%s): wall time %.2f s' % (self.path, wall))
+        for cat in categories:
+            if (count[cat] > 0):
+                print('  %-12s %9.3f s %5.1f %%  (%d spans)' % (cat, fg[cat], 100*fg[cat]/wall, count[cat]))
+        other = wall - sum(fg.values())
+        print('  %-12s %9.3f s %5.1f %%' % ('script', other, 100*other/wall))
+        if (sum(bg.values()) > 0):
+            print('  Overlapped on other threads: ' +
+                  ', '.join(['%s %.3f s' % (cat, bg[cat]) for cat in categories if (bg[cat] > 0)]))
+
+    def finish(self):
+        self.write()
+        self.summary()
+
+class Span:
+    """Records the time spent in a 'with' block as a span."""
+
+    def __init__(self, cat, name):
+        self.cat = cat
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        tracer.add(self.cat, self.name, self.t0, time.perf_counter())
+
+class NoSpan:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+no_span = NoSpan()
+
+def span(cat, name):
+    """Returns a context manager that records a span if tracing is on."""
+    return no_span if (tracer is None) else Span(cat, name)
+
+def traced(cat, name, f):
+    """Returns function 'f', recording each call as a span."""
+    def call(*args, **kw):
+        t0 = time.perf_counter()
+        try:
+            return f(*args, **kw)
+        finally:
+            tracer.add(cat, name, t0, time.perf_counter())
+    return call
+
+## VISA instruments
+
+class TracedResource:
+    """Passes operations through to the resource 'inst' of instrument 'dev',
+    recording each as a span."""
+
+    def __init__(self, inst, dev):
+        self.inst = inst
+        self.dev = dev
+
+    def op(self, op, arg, *args, **kw):
+        t0 = time.perf_counter()
+        try:
+            return getattr(self.inst, op)(*args, **kw)
+        finally:
+            tracer.add('instrument', '%s %s' % (self.dev, str(arg)[:80]), t0, time.perf_counter())
+
+    def write(self, cmd):
+        return self.op('write', cmd, cmd)
+
+    def read(self):
+        return self.op('read', 'read')
+
+    def query(self, cmd):
+        return self.op('query', cmd, cmd)
+
+    def read_bytes(self, count, **kw):
+        return self.op('read_bytes', 'read %d bytes' % (count), count, **kw)
+
+    def read_into(self, view):
+        import waveform
+        with span('instrument', '%s read %d bytes' % (self.dev, len(view))):
+            return waveform.read_into(self.inst, view)
+
+    def query_binary_values(self, cmd, **kw):
+        return self.op('query_binary_values', cmd, cmd, **kw)
+
+    def write_binary_values(self, cmd, values, **kw):
+        return self.op('write_binary_values', cmd, cmd, values, **kw)
+
+    def __getattr__(self, attr):
+        return getattr(self.inst, attr)
+
+## CAT serial port
+
+def traced_serial(Serial):
+    """Returns a subclass of pyserial's Serial that records its I/O."""
+    class TracedSerial(Serial):
+        def __init__(self, *args, **kw):
+            t0 = time.perf_counter()
+            try:
+                Serial.__init__(self, *args, **kw)
+            finally:
+                tracer.add('serial', 'open', t0, time.perf_counter())
+
+        def write(self, data):
+            return traced('serial', 'write %s' % (bytes(data).decode(errors='replace')),
+                          Serial.write)(self, data)
+
+        def readline(self, *args):
+            return traced('serial', 'readline', Serial.readline)(self, *args)
+
+        def read(self, size=1):
+            return traced('serial', 'read', Serial.read)(self, size)
+    return TracedSerial
+
+def start():
+    """Starts tracing if M3_TRACE is set."""
+    global tracer
+    if (not os.environ.get('M3_TRACE')):
+        return
+    import atexit
+    tracer = Tracer(os.environ['M3_TRACE'])
+    atexit.register(tracer.finish)
+    builtins.input = traced('operator', 'input', builtins.input)
+    time.sleep = traced('sleep', 'sleep', time.sleep)
+    serial = sys.modules.get('serial')
+    if (serial is None):
+        try:
+            import serial
+        except ImportError:
+            pass
+    if (serial is not None):
+        serial.Serial = traced_serial(serial.Serial)
+    print('Tracing run timeline to', os.environ['M3_TRACE'], flush=True)
+
+start()
@@ -0,0 +1,72 @@
+"""Two-tone intermodulation analysis.
+Estimates the amplitudes of the two fundamentals and of their third- and
+fifth-order intermodulation products from a single capture of the output of
+a subsystem driven by two closely spaced tones f1 < f2:
+  f1, f2                   fundamentals
+  2f1-f2, 2f2-f1           IM3
+  3f1-2f2, 3f2-2f1         IM5
+The capture is windowed (4-term Blackman-Harris, whose sidelobes are
+92 dB down, so that products far below the fundamentals are not buried
+in leakage) and transformed with a single real FFT. Each product is found as
+the highest bin within 'search' bins of its nominal frequency, and its
+amplitude and frequency are refined by fitting a parabola to the log
+magnitude of that bin and its neighbours, which keeps the error from the
+frequency falling between bins to a few hundredths of a dB. Everything is
+done on whole arrays: captures can be stacked along the leading axes (e.g.
+one per drive level) and all products of all captures are estimated at once.
+
+The products must be at least 'min_bins' FFT bins apart, i.e. the capture
+must last at least min_bins/(f2 - f1)."""
+
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+names = ['f1', 'f2', 'im3_lo', 'im3_hi', 'im5_lo', 'im5_hi']
+search = 2                      # Bins either side of the nominal frequency searched
+min_bins = 10                   # Minimum spacing of the products (bins)
+
+def products(f1, f2):
+    """Returns the frequencies of the products in 'names' for tones f1, f2."""
+    return array([f1, f2, 2*f1 - f2, 2*f2 - f1, 3*f1 - 2*f2, 3*f2 - 2*f1])
+
+def window(n):
+    """4-term Blackman-Harris window of 'n' points."""
+    x = 2*pi*arange(n)/n
+    return 0.35875 - 0.48829*cos(x) + 0.14128*cos(2*x) - 0.01168*cos(3*x)
+
+def spectrum(v, dt):
+    """Returns the peak amplitude spectrum of the captures 'v' (samples along
+    the last axis, spaced 'dt'), and the bin spacing."""
+    n = shape(v)[-1]
+    w = window(n)
+    S = abs(fft.rfft(v*w, axis=-1))*(2/w.sum())
+    return S, 1/(n*dt)
+
+def peaks(S, df, freqs):
+    """Returns the amplitude and frequency of the peak of spectrum 'S' (bins
+    along the last axis, spaced 'df') near each frequency in 'freqs'."""
+    freqs = asarray(freqs, float)
+    nbins = shape(S)[-1]
+    k0 = clip(rint(freqs/df).astype(int), search + 1, nbins - search - 2)
+    cols = k0[:, newaxis] + arange(-search, search+1)
+    near = S[..., cols]                     # (..., products, 2*search+1)
+    k = k0 + argmax(near, axis=-1) - search
+    with errstate(divide='ignore'):
+        (a, b, c) = [20*log10(take_along_axis(S, k + d, axis=-1)) for d in (-1, 0, 1)]
+    curv = a - 2*b + c
+    p = where(curv < 0, 0.5*(a - c)/where(curv < 0, curv, -1), 0)
+    return 10**((b - 0.25*(a - c)*p)/20), (k + p)*df
+
+def analyze(v, dt, f1, f2):
+    """Returns the amplitudes (V peak) and measured frequencies of the products
+    in 'names' for captures 'v' of a subsystem driven with tones f1 and f2."""
+    (S, df) = spectrum(v, dt)
+    if (abs(f2 - f1) < min_bins*df):
+        raise ValueError('Capture too short to resolve tones %g Hz apart (needs %g s)'
+                         % (abs(f2 - f1), min_bins/abs(f2 - f1)))
+    return peaks(S, df, products(f1, f2))
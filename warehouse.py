@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+"""Results warehouse for the measurements of many test runs.
+Collects the data files written by the test scripts (bpf.txt, iq.txt,
+demod.txt, freq.txt, mod_iq.txt, pout.txt, spectrum.txt, harmonics.txt, and
+any <subsystem>.npz file of result arrays over a 'freq' array), from any
+number of run directories, into a single
+columnar store that can be queried across the whole corpus, e.g. to find
+the boards that missed 20 dB of sideband rejection at 5 kHz:
+    python warehouse.py ingest runs/
+    python warehouse.py query rej_usb --at 5e3 --below 20
+or to summarize a quantity over frequency or per board, bench or date:
+    python warehouse.py stats gain_dB --by board
+
+Each data file is one run. The bench, board and date of a run are taken
+from the path of its directory (see 'path_pattern'), the date otherwise from
+the spec verdict written alongside it or from the time the file was written,
+and the plotting parameters saved with the file are kept with the run. The
+files are read in parallel by a pool of worker processes.
+
+The store is a directory holding one .npy file per column (run, frequency,
+value), with the rows of each quantity of each subsystem stored together
+and sorted by frequency, so that a query only reads the rows of one
+quantity and finds a frequency range by bisection. The run table (runs.json)
+holds the subsystem, bench, board, date and parameters of each run. The
+columns are memory-mapped rather than read when the store is opened."""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from numpy import *
+from render import load_data
+import metrics
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+store_dir = 'warehouse'         # Default location of the store
+
+# Fields taken from the path of a run directory, relative to the directory
+# being ingested: named groups 'bench', 'board' and 'date' (YYYY-MM-DD)
+path_pattern = r'(?P<bench>[^/]+)/(?P<board>[^/]+)'
+
+def stim_ampl(p, default):
+    return asarray(p.get('stim_ampl', default))
+
+# Data file: (subsystem, name of each row, derived quantities). The first
+# row is the frequency axis; the derived quantities are functions of the
+# rows (by name) and of the plotting parameters, as plotted by render.py
+# (see metrics.py).
+layouts = {
+    'bpf.txt': ('sub-a-bpf', ('freq', 'ampl_i', 'ampl_q'), {
+        'gain_dB': lambda d, p: metrics.gain_dB(d['ampl_i'], d['ampl_q'], stim_ampl(p, 50e-3))}),
+    'iq.txt': ('sub-a-mixer', ('freq', 'ampl_i', 'ampl_q', 'phase'), {
+        'balance_dB': lambda d, p: metrics.balance_dB(d['ampl_i'], d['ampl_q'])}),
+    'demod.txt': ('sub-b', ('freq', 'ampl_lsb', 'ampl_usb'), {
+        'rej_usb': lambda d, p: metrics.rejection_dB(d['ampl_usb'], d['ampl_lsb'])}),
+    'freq.txt': ('sub-c', ('freq', 'meas_freq_0', 'meas_freq_90', 'phase'), {
+        'freq_error_0': lambda d, p: metrics.freq_error(d['meas_freq_0'], d['freq']),
+        'freq_error_90': lambda d, p: metrics.freq_error(d['meas_freq_90'], d['freq'])}),
+    'mod_iq.txt': ('sub-d', ('freq', 'ampl_i', 'ampl_q', 'phase'), {
+        'balance_dB': lambda d, p: metrics.balance_dB(d['ampl_i'], d['ampl_q'])}),
+    'pout.txt': ('sub-f', ('freq', 'Prf'), {
+        'Prf_dBW': lambda d, p: metrics.dB(d['Prf'])}),
+    # The spectrum is indexed by the frequency of each harmonic
+    'spectrum.txt': ('sub-f', ('n', 'Pcoeffs'), {
+        'freq': lambda d, p: d['n']*p.get('f0', nan)}),
+    'harmonics.txt': ('sub-f', ('freq', 'Idc', 'P1', 'eff', 'THD'), {}),
+}
+
+## Ingest
+
+def run_fields(path, root):
+    """Returns the bench, board and date of the run in file 'path'."""
+    rel = os.path.relpath(os.path.dirname(os.path.abspath(path)), os.path.abspath(root))
+    m = re.search(path_pattern, rel.replace(os.sep, '/'))
+    fields = m.groupdict() if (m) else {}
+    date = fields.get('date')
+    if (date is None):
+        for f in sorted(os.listdir(os.path.dirname(os.path.abspath(path)))):
+            if (f.endswith('_verdict.json')):
+                try:
+                    with open(os.path.join(os.path.dirname(path), f)) as v:
+                        date = json.load(v)['time'][:10]
+                    break
+                except (OSError, ValueError, KeyError):
+                    pass
+    if (date is None):
+        date = time.strftime('%Y-%m-%d', time.localtime(os.path.getmtime(path)))
+    return fields.get('bench') or '', fields.get('board') or '', date
+
+def read_run(path, root='.'):
+    """Reads one data file and returns its run record and its quantities
+    (a dictionary of equal-length arrays, including 'freq'), or None if the
+    file cannot be read."""
+    name = os.path.basename(path)
+    try:
+        if (name.endswith('.npz')):
+            with load(path) as f:
+                data = {k: asarray(f[k], float) for k in f.files}
+            params = {}
+            subsystem = os.path.splitext(name)[0]
+            if ('freq' not in data):
+                return None
+            n = len(data['freq'])
+            data = {k: v for (k, v) in data.items() if (v.shape == (n,))}
+        else:
+            subsystem, rows, derived = layouts[name]
+            raw, params = load_data(path)
+            raw = atleast_2d(raw)
+            data = {k: raw[i] for (i, k) in enumerate(rows[:len(raw)])}
+            with errstate(divide='ignore', invalid='ignore'):
+                for (k, f) in derived.items():
+                    try:
+                        data[k] = asarray(f(data, params), float)*ones(raw.shape[1])
+                    except KeyError:
+                        pass
+    except (OSError, ValueError):
+        return None
+    bench, board, date = run_fields(path, root)
+    run = {'path': os.path.abspath(path), 'subsystem': subsystem,
+           'bench': bench, 'board': board, 'date': date, 'params': params}
+    return run, data
+
+def find_files(roots):
+    """Returns the data files under the directories 'roots', with the root
+    each was found under."""
+    found = []
+    for root in roots:
+        for (d, dirs, files) in os.walk(root):
+            dirs[:] = [x for x in dirs if (x not in ('setups', store_dir))]
+            for f in sorted(files):
+                if (f in layouts or (f.endswith('.npz') and not d.endswith('fixturecal'))):
+                    found.append((os.path.join(d, f), root))
+    return found
+
+def read_file(item):
+    return read_run(*item)
+
+def ingest(roots, path=store_dir, workers=None):
+    """Reads every data file under the directories 'roots' (in parallel)
+    and writes the store to directory 'path'. Returns the number of runs."""
+    files = find_files(roots)
+    runs = []
+    groups = {}                 # 'subsystem/quantity': [(run, freq, values)]
+    with ProcessPoolExecutor(workers) as pool:
+        for r in pool.map(read_file, files, chunksize=16):
+            if (r is None):
+                continue
+            run, data = r
+            k = len(runs)
+            runs.append(run)
+            for (q, values) in data.items():
+                if (q != 'freq'):
+                    groups.setdefault(run['subsystem'] + '/' + q, []).append((k, data['freq'], values))
+
+    index = {}
+    cols = {'run': [], 'freq': [], 'value': []}
+    n = 0
+    for key in sorted(groups):
+        run = concatenate([full(len(f), k, int32) for (k, f, v) in groups[key]])
+        freq = concatenate([f for (k, f, v) in groups[key]])
+        value = concatenate([v for (k, f, v) in groups[key]])
+        order = lexsort((run, freq))
+        for (c, x) in zip(('run', 'freq', 'value'), (run, freq, value)):
+            cols[c].append(x[order])
+        index[key] = (n, n + len(order))
+        n += len(order)
+
+    os.makedirs(path, exist_ok=True)
+    for (c, parts) in cols.items():
+        dt = int32 if (c == 'run') else float64
+        save(os.path.join(path, c + '.npy'), concatenate(parts) if (parts) else zeros(0, dt))
+    with open(os.path.join(path, 'runs.json'), 'w') as f:
+        json.dump({'runs': runs, 'index': index}, f)
+    return len(runs)
+
+## Queries
+
+class Warehouse:
+    """The store in directory 'path'."""
+
+    def __init__(self, path=store_dir):
+        with open(os.path.join(path, 'runs.json')) as f:
+            meta = json.load(f)
+        self.runs = meta['runs']
+        self.index = meta['index']
+        self.cols = {c: load(os.path.join(path, c + '.npy'), mmap_mode='r')
+                     for c in ('run', 'freq', 'value')}
+        self.fields = {}
+        for field in ('subsystem', 'bench', 'board', 'date'):
+            self.fields[field] = array([r[field] for r in self.runs], dtype=str)
+
+    def quantities(self):
+        """Returns the names of the quantities stored, as 'subsystem/quantity'."""
+        return sorted(self.index)
+
+    def keys(self, quantity, subsystem=None):
+        return [k for k in self.index
+                if (k.split('/')[1] == quantity and (subsystem is None or k.split('/')[0] == subsystem))]
+
+    def run_mask(self, subsystem=None, bench=None, board=None, since=None, until=None):
+        """Returns a boolean array selecting the runs that match."""
+        ok = ones(len(self.runs), bool)
+        for (field, value) in (('subsystem', subsystem), ('bench', bench), ('board', board)):
+            if (value is not None):
+                ok &= self.fields[field] == value
+        if (since is not None):
+            ok &= self.fields['date'] >= since
+        if (until is not None):
+            ok &= self.fields['date'] <= until
+        return ok
+
+    def values(self, quantity, fmin=None, fmax=None, **filters):
+        """Returns the run indices, frequencies and values of 'quantity'
+        between 'fmin' and 'fmax', over the runs selected by 'filters' (see
+        run_mask())."""
+        ok = self.run_mask(**filters)
+        parts = []
+        for key in self.keys(quantity, filters.get('subsystem')):
+            (i0, i1) = self.index[key]
+            freq = self.cols['freq'][i0:i1]
+            if (fmin is not None):
+                i0 += searchsorted(freq, fmin, 'left')
+            if (fmax is not None):
+                i1 = self.index[key][0] + searchsorted(freq, fmax, 'right')
+            run = asarray(self.cols['run'][i0:i1])
+            keep = ok[run]
+            parts.append((run[keep], asarray(self.cols['freq'][i0:i1])[keep],
+                          asarray(self.cols['value'][i0:i1])[keep]))
+        if (not parts):
+            return zeros(0, int32), zeros(0), zeros(0)
+        return tuple(concatenate(x) for x in zip(*parts))
+
+    def at(self, quantity, freq, tol=0.05, **filters):
+        """Returns the run indices and values of 'quantity' at frequency
+        'freq' (within a relative tolerance 'tol'), one per run."""
+        df = abs(freq)*tol
+        run, f, v = self.values(quantity, freq - df, freq + df, **filters)
+        # Keep the point nearest 'freq' in each run
+        order = lexsort((abs(f - freq), run))
+        run, v = run[order], v[order]
+        first = ones(len(run), bool)
+        first[1:] = run[1:] != run[:-1]
+        return run[first], v[first]
+
+    def matrix(self, quantity, runs=None, **filters):
+        """Returns the runs, the frequencies and an array (runs x
+        frequencies) of the values of 'quantity', with nan where a run has
+        no value, for batch analysis (see metrics.py). If 'runs' is given,
+        the rows are for those runs, in that order, so that the matrices of
+        several quantities can be combined."""
+        run, f, v = self.values(quantity, **filters)
+        if (runs is None):
+            runs = unique(run)
+        freqs, col = unique(f, return_inverse=True)
+        row = full(len(self.runs), -1)
+        row[runs] = arange(len(runs))
+        m = full((len(runs), len(freqs)), nan)
+        keep = row[run] >= 0
+        m[row[run[keep]], col[keep]] = v[keep]
+        return runs, freqs, m
+
+    def stats(self, quantity, by='freq', fmin=None, fmax=None, **filters):
+        """Returns the groups (values of the frequency, or of the run field
+        'by') and the count, mean, standard deviation, minimum and maximum
+        of 'quantity' in each, ignoring invalid values."""
+        run, f, v = self.values(quantity, fmin, fmax, **filters)
+        good = isfinite(v)
+        run, f, v = run[good], f[good], v[good]
+        key = f if (by == 'freq') else self.fields[by][run]
+        groups, g = unique(key, return_inverse=True)
+        n = bincount(g, minlength=len(groups))
+        mean = bincount(g, v, len(groups))/n
+        std = sqrt(maximum(bincount(g, v*v, len(groups))/n - mean**2, 0))
+        vmin = full(len(groups), inf)
+        vmax = full(len(groups), -inf)
+        minimum.at(vmin, g, v)
+        maximum.at(vmax, g, v)
+        return groups, n, mean, std, vmin, vmax
+
+## Command line
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Results warehouse')
+    parser.add_argument('--store', default=store_dir, help='directory of the store')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('ingest', help='build the store from run directories')
+    p.add_argument('roots', nargs='+')
+    p.add_argument('--workers', type=int)
+    sub.add_parser('list', help='list the quantities stored')
+    for name in ('query', 'stats'):
+        p = sub.add_parser(name)
+        p.add_argument('quantity')
+        for field in ('subsystem', 'bench', 'board', 'since', 'until'):
+            p.add_argument('--' + field)
+        p.add_argument('--fmin', type=float)
+        p.add_argument('--fmax', type=float)
+        if (name == 'query'):
+            p.add_argument('--at', type=float, help='frequency of the point to report')
+            p.add_argument('--below', type=float, help='only report values below this')
+            p.add_argument('--above', type=float, help='only report values above this')
+        else:
+            p.add_argument('--by', default='freq', choices=('freq', 'subsystem', 'bench', 'board', 'date'))
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    if (args.cmd == 'ingest'):
+        n = ingest(args.roots, args.store, args.workers)
+        print('%d runs ingested into %s in %.2f s' % (n, args.store, time.perf_counter() - t0))
+        return
+    ws = Warehouse(args.store)
+    if (args.cmd == 'list'):
+        for key in ws.quantities():
+            (i0, i1) = ws.index[key]
+            print('%-28s %9d points' % (key, i1 - i0))
+        return
+    filters = {f: getattr(args, f) for f in ('subsystem', 'bench', 'board', 'since', 'until')}
+    if (args.cmd == 'query'):
+        if (args.at is not None):
+            run, v = ws.at(args.quantity, args.at, **filters)
+            f = full(len(run), args.at)
+        else:
+            run, f, v = ws.values(args.quantity, args.fmin, args.fmax, **filters)
+        keep = ones(len(v), bool)
+        if (args.below is not None):
+            keep &= v < args.below
+        if (args.above is not None):
+            keep &= v > args.above
+        for (k, fk, vk) in zip(run[keep], f[keep], v[keep]):
+            r = ws.runs[k]
+            print('%-12s %-10s %-12s %-10s %12.6g %12.6g  %s'
+                  % (r['subsystem'], r['bench'], r['board'], r['date'], fk, vk, r['path']))
+        print('%d of %d values (%.3f s)' % (keep.sum(), len(v), time.perf_counter() - t0))
+    else:
+        groups, n, mean, std, vmin, vmax = ws.stats(args.quantity, args.by, args.fmin, args.fmax, **filters)
+        print('%-14s %7s %12s %12s %12s %12s' % (args.by, 'count', 'mean', 'std', 'min', 'max'))
+        for row in zip(groups, n, mean, std, vmin, vmax):
+            print('%-14s %7d %12.6g %12.6g %12.6g %12.6g' % row)
+        print('%d values in %d groups (%.3f s)' % (n.sum(), len(groups), time.perf_counter() - t0))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
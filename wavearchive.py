@@ -0,0 +1,207 @@
+"""Compressed archive of raw scope captures.
+Keeps the raw ADC codes of every capture behind the measured points (as
+read by waveform.read_raw()), so that a failure can be debugged after the
+fact, in a single archive file per bench. Each record is one channel of one
+capture, identified by (run, point, channel), and is stored with its
+preamble so it can be converted back to volts.
+
+A record is split into chunks of 'chunk_points' samples, each compressed on
+its own with a stdlib codec (zlib, bz2 or lzma) after delta encoding: each
+code is replaced by its difference from the previous one (modulo 2^8 or
+2^16, so the encoding is exact), which is small for an oversampled signal
+and compresses far better than the codes themselves. For WORD captures the
+high and low bytes of the differences are stored as separate planes, so
+the high bytes, which are nearly all 0x00 or 0xFF, compress to almost
+nothing.
+
+The file is a sequence of records, each a JSON header (with the length of
+each chunk) followed by its chunks, and ends with an index of every record
+(its header and the offset of its first chunk) and a footer pointing to the
+index. Reading a record, or part of one, only reads and decompresses the
+chunks it covers. Records are added by opening the archive in 'a' mode; the
+index is rewritten when the archive is closed, and if that never happened
+(the script crashed), it is rebuilt from the record headers when the
+archive is next opened.
+
+Usage: python wavearchive.py archive.m3w [run point channel output.npy]
+With only the archive, lists its records; otherwise saves the time axis and
+voltages of one record to a .npy file (two rows)."""
+
+import os
+import sys
+import bz2
+import json
+import lzma
+import zlib
+import struct
+from numpy import *
+from waveform import Preamble, scale, time_axis
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+chunk_points = 1 << 18          # Samples in each compressed chunk
+codec = 'zlib'                  # Compression of the chunks
+#codec = 'lzma'
+#codec = 'bz2'
+level = 6                       # Compression level (zlib and bz2)
+
+codecs = {
+    'zlib': (lambda b: zlib.compress(b, level), zlib.decompress),
+    'bz2': (lambda b: bz2.compress(b, level), bz2.decompress),
+    'lzma': (lambda b: lzma.compress(b, preset=level), lzma.decompress),
+    'none': (bytes, bytes),
+}
+
+record_magic = b'M3WR'
+index_magic = b'M3WI'
+footer = struct.Struct('<4sQ')  # Index magic, offset of the index
+
+def key(run, point, chan):
+    return '%s/%d/%d' % (run, point, chan)
+
+def encode(codes, delta=True):
+    """Returns the delta-encoded, byte-planed bytes of 'codes'."""
+    if (delta):
+        codes = diff(codes, prepend=codes.dtype.type(0))
+    if (codes.dtype.itemsize > 1):
+        codes = codes.view(uint8).reshape(-1, codes.dtype.itemsize).T
+    return ascontiguousarray(codes).tobytes()
+
+def decode(data, dtype, delta=True):
+    """Inverse of encode()."""
+    planes = frombuffer(data, uint8)
+    if (dtype.itemsize > 1):
+        planes = ascontiguousarray(planes.reshape(dtype.itemsize, -1).T)
+    codes = planes.view(dtype).ravel()
+    return cumsum(codes, dtype=dtype) if (delta) else codes.copy()
+
+class Archive:
+    """Archive file 'path', opened for reading ('r'), for adding records
+    ('a') or as a new archive ('w')."""
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.mode = mode
+        if (mode == 'w' or (mode == 'a' and not os.path.exists(path))):
+            self.f = open(path, 'w+b')
+            self.index = {}
+            self.end = 0
+        else:
+            self.f = open(path, 'rb' if (mode == 'r') else 'r+b')
+            (self.index, self.end) = self.read_index()
+        self.dirty = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_index(self):
+        """Returns the index and the offset at which it starts, rebuilding
+        it from the records if the archive was not closed properly."""
+        size = self.f.seek(0, os.SEEK_END)
+        if (size >= footer.size):
+            self.f.seek(size - footer.size)
+            (magic, offset) = footer.unpack(self.f.read(footer.size))
+            if (magic == index_magic and offset < size):
+                self.f.seek(offset)
+                return json.loads(self.f.read(size - footer.size - offset)), offset
+        return self.scan()
+
+    def scan(self):
+        """Rebuilds the index from the record headers."""
+        index = {}
+        pos = 0
+        self.f.seek(0)
+        while True:
+            head = self.f.read(8)
+            if (len(head) < 8 or head[:4] != record_magic):
+                break
+            (n,) = struct.unpack('<I', head[4:])
+            try:
+                rec = json.loads(self.f.read(n))
+            except ValueError:
+                break
+            rec['offset'] = pos + 8 + n
+            end = rec['offset'] + sum(rec['chunks'])
+            if (self.f.seek(0, os.SEEK_END) < end):
+                break
+            index[rec['key']] = rec
+            pos = self.f.seek(end)
+        print('Rebuilt index of %s: %d records' % (self.path, len(index)))
+        return index, pos
+
+    def keys(self):
+        """Returns the (run, point, channel) of every record."""
+        return [(rec['run'], rec['point'], rec['chan']) for rec in self.index.values()]
+
+    def write(self, run, point, chan, raw, pre, delta=True):
+        """Adds channel 'chan' of the capture of 'point' in 'run': the raw
+        codes 'raw' (uint8 or uint16) with preamble 'pre'."""
+        raw = asarray(raw)
+        compress = codecs[codec][0]
+        blobs = [compress(encode(raw[k:k+chunk_points], delta))
+                 for k in range(0, len(raw), chunk_points)]
+        rec = {'key': key(run, point, chan), 'run': run, 'point': int(point), 'chan': int(chan),
+               'dtype': raw.dtype.str, 'points': len(raw), 'preamble': list(pre),
+               'codec': codec, 'delta': delta, 'chunk_points': chunk_points,
+               'chunks': [len(b) for b in blobs]}
+        head = json.dumps(rec).encode()
+        self.f.seek(self.end)
+        self.f.write(record_magic + struct.pack('<I', len(head)) + head)
+        rec['offset'] = self.f.tell()
+        for b in blobs:
+            self.f.write(b)
+        self.f.truncate()
+        self.end = self.f.tell()
+        self.index[rec['key']] = rec
+        self.dirty = True
+
+    def read(self, run, point, chan, start=0, stop=None):
+        """Returns the raw codes start:stop of a record and its preamble,
+        decompressing only the chunks they lie in."""
+        rec = self.index[key(run, point, chan)]
+        stop = rec['points'] if (stop is None or stop > rec['points']) else stop
+        dt = dtype(rec['dtype'])
+        decompress = codecs[rec['codec']][1]
+        n = rec['chunk_points']
+        offsets = rec['offset'] + concatenate(([0], cumsum(rec['chunks'])))
+        out = empty(stop - start if (stop > start) else 0, dt)
+        for c in range(start // n, -(-stop // n) if (stop > start) else 0):
+            self.f.seek(int(offsets[c]))
+            codes = decode(decompress(self.f.read(rec['chunks'][c])), dt, rec['delta'])
+            lo = start if (start > c*n) else c*n
+            hi = stop if (stop < c*n + len(codes)) else c*n + len(codes)
+            out[lo - start:hi - start] = codes[lo - c*n:hi - c*n]
+        return out, Preamble(*rec['preamble'])
+
+    def waveform(self, run, point, chan, start=0, stop=None):
+        """Returns the voltages start:stop of a record and its preamble."""
+        (raw, pre) = self.read(run, point, chan, start, stop)
+        return scale(raw, pre), pre
+
+    def close(self):
+        if (self.dirty):
+            self.f.seek(self.end)
+            self.f.write(json.dumps(self.index).encode())
+            self.f.write(footer.pack(index_magic, self.end))
+            self.f.truncate()
+            self.dirty = False
+        self.f.close()
+
+if __name__ == '__main__':
+    with Archive(sys.argv[1]) as archive:
+        if (len(sys.argv) == 2):
+            for (run, point, chan) in archive.keys():
+                rec = archive.index[key(run, point, chan)]
+                print('%s point %d CH%d: %d points, %.1f%% of raw size'
+                      % (run, point, chan, rec['points'],
+                         100*sum(rec['chunks'])/(rec['points']*dtype(rec['dtype']).itemsize)))
+        else:
+            (v, pre) = archive.waveform(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+            save(sys.argv[5], vstack([time_axis(pre, len(v)), v]))
@@ -0,0 +1,140 @@
+"""Binary waveform transfer from the oscilloscope.
+Reads the raw samples of a channel in BYTE (8-bit) or WORD (16-bit) format
+as an IEEE 488.2 definite-length block. The block is read in chunks of
+'chunk_size' bytes straight into a preallocated NumPy buffer of the right
+size (see read_into()), rather than being assembled in memory first and
+then converted. The preamble scaling is then applied in a single pass into
+one float32 array (or into an array supplied by the caller). Captures
+larger than 'spill_threshold' are held in memory-mapped files in
+'spill_dir' instead of in memory.
+
+The preamble of an InfiniiVision scope has the fields
+format, type, points, count, xincrement, xorigin, xreference, yincrement,
+yorigin, yreference; sample n has time (n - xreference)*xincrement + xorigin
+and voltage (code - yreference)*yincrement + yorigin."""
+
+import tempfile
+from collections import namedtuple
+from numpy import *
+
+__author__ = 'Sean Victor Hum'
+__copyright__ = 'Copyright 2025'
+__license__ = 'GPL'
+__version__ = '1.0'
+__email__ = 'sean.hum@utoronto.ca'
+
+chunk_size = 1 << 20            # Size of each read from the instrument (bytes)
+spill_threshold = 64 << 20      # Captures larger than this (bytes) are memory-mapped
+spill_dir = None                # Directory for memory-mapped captures (None: system temp)
+
+formats = {'BYTE': dtype(uint8), 'WORD': dtype('<u2')}
+
+Preamble = namedtuple('Preamble', 'format type points count xincrement xorigin '
+                      'xreference yincrement yorigin yreference')
+
+def configure(scope, chan, fmt='BYTE', points=None):
+    """Selects channel 'chan' (or a source such as 'FFT' or 'MATH') as the
+    waveform source, in format 'fmt' ('BYTE' or 'WORD'), with 'points' points
+    (None: all points in memory). Sources other than a channel only have the
+    points on screen."""
+    channel = isinstance(chan, (int, integer))
+    scope.write(':WAVeform:SOURce %s' % ('CHAN%d' % (chan) if (channel) else chan))
+    scope.write(':WAVeform:FORMat %s' % (fmt))
+    scope.write(':WAVeform:BYTeorder LSBFirst')
+    scope.write(':WAVeform:UNSigned 1')
+    scope.write(':WAVeform:POINts:MODE %s' % ('RAW' if (channel) else 'NORMal'))
+    scope.write(':WAVeform:POINts %s' % ('MAXimum' if (points is None) else points))
+
+def preamble(scope):
+    fields = [float(x) for x in scope.query(':WAVeform:PREamble?').split(',')]
+    return Preamble(*[int(x) for x in fields[:4]], *fields[4:])
+
+def spill_array(shape, dtype):
+    """Returns an uninitialized array backed by a temporary file, which is
+    deleted when the array is no longer used."""
+    f = tempfile.TemporaryFile(dir=spill_dir)
+    return memmap(f, dtype, 'w+', shape=shape)
+
+def allocate(shape, dtype, spill=None):
+    """Returns an uninitialized array, memory-mapped if 'spill' is True or,
+    when 'spill' is None, if it is larger than 'spill_threshold'."""
+    if (spill is None):
+        spill = prod(shape)*dtype.itemsize > spill_threshold
+    return spill_array(shape, dtype) if (spill) else empty(shape, dtype)
+
+def block_header(scope):
+    """Reads the header of a definite-length block and returns its length."""
+    head = scope.read_bytes(2)
+    if (head[:1] != b'#' or head[1:2] in (b'0', b'')):
+        raise IOError('Expected a definite-length block, received %r' % (head))
+    return int(scope.read_bytes(int(head[1:2])))
+
+def read_into(scope, view):
+    """Reads len(view) bytes from 'scope' into the writable buffer 'view'.
+    A resource with its own read_into() (e.g. SocketResource, see
+    rawsocket.py) receives them directly into 'view', as does a pyvisa
+    session on a VISA library called through ctypes (e.g. NI-VISA or the
+    Keysight IO Libraries), with viRead(). Otherwise (e.g. pyvisa-py, or
+    the broker) the bytes returned by read_bytes() are copied into 'view'."""
+    reader = getattr(scope, 'read_into', None)
+    if (reader is not None):
+        return reader(view)
+    visalib = getattr(scope, 'visalib', None)
+    if (hasattr(getattr(visalib, 'lib', None), 'viRead')):
+        from ctypes import c_char, c_uint32, byref
+        from pyvisa.constants import StatusCode
+        (n, count) = (0, c_uint32())
+        with scope.ignore_warning(StatusCode.success_device_not_present,
+                                  StatusCode.success_max_count_read):
+            while (n < len(view)):
+                buf = (c_char*(len(view) - n)).from_buffer(view[n:])
+                visalib.lib.viRead(scope.session, buf, len(buf), byref(count))
+                n += count.value
+        return n
+    data = scope.read_bytes(len(view))
+    view[:len(data)] = data
+    return len(data)
+
+def read_block(scope, cmd, dtype, spill=None):
+    """Sends query 'cmd' and reads the definite-length block it returns into
+    a new array of 'dtype'."""
+    scope.write(cmd)
+    n = block_header(scope)
+    raw = allocate((n // dtype.itemsize,), dtype, spill)
+    buf = memoryview(raw).cast('B')
+    pos = 0
+    while (pos < n):
+        pos += read_into(scope, buf[pos:pos+chunk_size if (n - pos > chunk_size) else n])
+    scope.read_bytes(1)         # Message terminator
+    return raw
+
+def scale(raw, pre, out=None):
+    """Converts the sample codes in 'raw' to voltages using preamble 'pre'.
+    The voltages are written into 'out' if given, or otherwise into a new
+    array (float32, which is ample for 16-bit samples)."""
+    if (out is None):
+        out = allocate(raw.shape, dtype(float32),
+                       True if (isinstance(raw, memmap)) else None)
+    subtract(raw, float32(pre.yreference), out=out, casting='unsafe')
+    out *= float32(pre.yincrement)
+    out += float32(pre.yorigin)
+    return out
+
+def time_axis(pre, n=None):
+    """Returns the sample times of a capture with preamble 'pre'."""
+    n = pre.points if (n is None) else n
+    return (arange(n) - pre.xreference)*pre.xincrement + pre.xorigin
+
+def read_raw(scope, chan, fmt='BYTE', points=None, spill=None):
+    """Reads the current acquisition of channel 'chan' and returns the raw
+    sample codes and the preamble (see wavearchive.py to keep them)."""
+    configure(scope, chan, fmt, points)
+    pre = preamble(scope)
+    return read_block(scope, ':WAVeform:DATA?', formats[fmt], spill), pre
+
+def read_waveform(scope, chan, fmt='BYTE', points=None, spill=None):
+    """Reads the current acquisition of channel 'chan' and returns the
+    voltages and the preamble. The time axis can be obtained from the
+    preamble with time_axis()."""
+    (raw, pre) = read_raw(scope, chan, fmt, points, spill)
+    return scale(raw, pre), pre